@@ -1,9 +1,19 @@
 from .config import settings
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 import redis.asyncio as redis_async
 
-# Centralized clients for the application
-qdrant_client = QdrantClient(url=f"http://{settings.QDRANT_HOST}:6333")
+# Centralized clients for the application, every vector db call is awaited
+if settings.VECTOR_STORE_BACKEND == "local":
+    # qdrant_client's embedded mode: brute-force search in this process, persisted under the path if one is set
+    qdrant_client = AsyncQdrantClient(path=settings.LOCAL_VECTOR_STORE_PATH) if settings.LOCAL_VECTOR_STORE_PATH else AsyncQdrantClient(location=":memory:")
+else:
+    # one gRPC channel shared by all requests
+    qdrant_client = AsyncQdrantClient(
+        host=settings.QDRANT_HOST,
+        port=settings.QDRANT_PORT,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+    )
 
 # async redis client used across routes
 redis_client = redis_async.Redis(host=settings.REDIS_HOST, port=6379, db=0, decode_responses=True)
@@ -15,11 +15,20 @@ class Settings(BaseSettings):
 
     REDIS_HOST: str = "localhost"
     QDRANT_HOST: str = "localhost"
+    QDRANT_PORT: int = 6333
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = True
+    VECTOR_STORE_BACKEND: str = "qdrant"
+    LOCAL_VECTOR_STORE_PATH: str | None = None
 
     CHUNK_SIZE: int = 800
     OVERLAP: int = 100
+    INGEST_FILE_CONCURRENCY: int = 4
+    INGEST_EMBED_BATCH_CHUNKS: int = 256
     SENTENCE_TRANSFORMER_MODEL_NAME: str = "all-MiniLM-L6-v2"
 
+    COLLECTION_CATALOG_LOCAL_TTL: float = 5.0
+
     ALLOW_ORIGINS: List[str] = ["http://localhost:5173"]
 
     class Config:
@@ -8,8 +8,10 @@ import logging
 import asyncio
 import aiofiles
 import math
+import shutil
 
-from backend.routes.utils.file_processing import get_model, process_pdf_file, process_txt_file, embed_chunks
+from backend.routes.utils.file_processing import get_model, process_pdf_file, process_txt_file, embed_chunks, extract_chunks, make_points
+from backend.routes.utils.collection_catalog import collection_names, collection_exists, record_collection
 from backend.models.messages import SuccessfulMessage, UnsuccessfulResponse
 from backend.models.uploading import ChunkedUploadMetadata, ChunkDataInfo
 from qdrant_client.http.models import VectorParams, Distance
@@ -67,7 +69,22 @@ def merge_chunks(file_extention: str, chunks_dir: str, merged_file_name = None,
                     merged_file.write(block)
     return merged_path
 
-def upload_file(file_path: str):
+def read_file_points(file_path: str, collection_name: str):
+    is_pdf = file_path.lower().endswith('.pdf')
+    is_txt = file_path.lower().endswith('.txt')
+    
+    with open(file_path, 'rb') as f:
+        if is_txt:
+            return process_txt_file(f, os.path.basename(file_path), collection_name)
+        elif is_pdf:
+            return process_pdf_file(f, os.path.basename(file_path), collection_name)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type for '{os.path.basename(file_path)}'. Only {SUPPORTED_FILE_TYPES} supported."
+            )
+
+async def upload_file(file_path: str):
     collection_name = Path(file_path).stem
         
     # create collection
@@ -76,7 +93,7 @@ def upload_file(file_path: str):
     if dimension is None:
         raise HTTPException(status_code=500, detail="Model embedding dimension is None.")
     
-    client.create_collection(
+    await client.create_collection(
         collection_name=collection_name,
         vectors_config=VectorParams(
             size=dimension,
@@ -84,25 +101,15 @@ def upload_file(file_path: str):
         )
     )
     
-    # embedd file contents
-    is_pdf = file_path.lower().endswith('.pdf')
-    is_txt = file_path.lower().endswith('.txt')
+    # embedd file contents, off the event loop
+    loop = asyncio.get_running_loop()
+    points = await loop.run_in_executor(None, read_file_points, file_path, collection_name)
     
-    with open(file_path, 'rb') as f:
-        if is_txt:
-            points = process_txt_file(f, os.path.basename(file_path), collection_name)
-        elif is_pdf:
-            points = process_pdf_file(f, os.path.basename(file_path), collection_name)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type for '{os.path.basename(file_path)}'. Only {SUPPORTED_FILE_TYPES} supported."
-            )
-    
-    client.upsert(
+    await client.upsert(
         collection_name=collection_name,
         points=points
     )
+    record_collection(collection_name)
     
     return SuccessfulMessage(
         status_code=200, 
@@ -118,77 +125,118 @@ def scan_for_non_uploaded_chunks(metadata: ChunkedUploadMetadata):
             
     return missing_chunk_indexs
 
+async def ingest_files(files: List[UploadFile]) -> List[dict]:
+    """
+    Ingest several files as a pipeline instead of one after another:
+    - files are read and chunked concurrently (bounded by INGEST_FILE_CONCURRENCY)
+    - chunks of several files are packed into one embedding call
+    - a group's collection creation and upsert run while the next group is embedded
+    Every file gets its own result, a failing file does not abort the others.
+    """
+    loop = asyncio.get_running_loop()
+    # a copy, names reserved by this request must not leak into the process cache
+    existing_collection_names = set(await collection_names())
+    semaphore = asyncio.Semaphore(settings.INGEST_FILE_CONCURRENCY)
+    results: dict[int, dict] = {}
+
+    async def prepare(index: int, f: UploadFile):
+        async with semaphore:
+            if not f.filename:
+                raise ValueError("Uploaded file is missing a filename.")
+            collection_name = Path(f.filename).stem
+            if collection_name in existing_collection_names:
+                raise ValueError(f"Collection '{collection_name}' already exists.")
+            existing_collection_names.add(collection_name)
+
+            is_pdf = f.content_type == "application/pdf" or f.filename.lower().endswith(".pdf")
+            is_txt = f.content_type == "text/plain" or f.filename.lower().endswith(".txt")
+            if not is_pdf and not is_txt:
+                raise ValueError("Unsupported file type. Only PDF and TXT files are supported.")
+
+            chunks = await loop.run_in_executor(None, extract_chunks, f.file, is_pdf)
+            return index, f.filename, collection_name, chunks
+
+    async def upsert(index: int, filename: str, collection_name: str, chunks: list, embeddings):
+        try:
+            points = make_points(chunks, embeddings, filename, collection_name)
+            await client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=embeddings.shape[1], distance=Distance.COSINE),
+            )
+            await client.upsert(collection_name=collection_name, points=points)
+            record_collection(collection_name)
+            results[index] = {"file": filename, "collection": collection_name, "chunks": len(points), "status": "ok"}
+        except Exception as e:
+            results[index] = {"file": filename, "collection": collection_name, "status": "failed", "error": str(e)}
+
+    async def embed_group(group: list):
+        chunks = [chunk for _, _, _, file_chunks in group for chunk in file_chunks]
+        try:
+            embeddings = await loop.run_in_executor(None, embed_chunks, chunks)
+        except Exception as e:
+            for index, filename, collection_name, _ in group:
+                results[index] = {"file": filename, "collection": collection_name, "status": "failed", "error": str(e)}
+            return
+        offset = 0
+        for index, filename, collection_name, file_chunks in group:
+            upserts.append(asyncio.create_task(
+                upsert(index, filename, collection_name, file_chunks, embeddings[offset:offset + len(file_chunks)])
+            ))
+            offset += len(file_chunks)
+
+    prepare_tasks = [asyncio.create_task(prepare(i, f)) for i, f in enumerate(files)]
+    upserts: list[asyncio.Task] = []
+    group: list = []
+    group_size = 0
+
+    for task in asyncio.as_completed(prepare_tasks):
+        try:
+            prepared = await task
+        except Exception:
+            # reported from the task's exception below
+            continue
+        group.append(prepared)
+        group_size += len(prepared[3])
+        if group_size >= settings.INGEST_EMBED_BATCH_CHUNKS:
+            await embed_group(group)
+            group, group_size = [], 0
+    if group:
+        await embed_group(group)
+    await asyncio.gather(*upserts)
+
+    for i, (f, task) in enumerate(zip(files, prepare_tasks)):
+        if i not in results and task.exception() is not None:
+            results[i] = {"file": f.filename, "status": "failed", "error": str(task.exception())}
+
+    return [results[i] for i in range(len(files))]
+
 @route.post("/upload")
 async def upload_files(files: List[UploadFile]):
     """
     Upload files and create separate collections for each based on filename
     Collection name will be the filename (without .pdf extension)
-    Returns error if any collection already exists
+    Files whose collection already exists are reported as failed in the per-file results
     """
 
-    # Get existing collections once
-    existing_collections = client.get_collections().collections
-    existing_collection_names = [c.name for c in existing_collections]
-
-    results = []
-
-    for f in files:
-        if not f.filename:
-            raise HTTPException(status_code=400, detail="Uploaded file is missing a filename.")
-        collection_name = Path(f.filename).stem
-        
-        # Check if collection already exists
-        if collection_name in existing_collection_names:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Collection '{collection_name}' already exists."
-            )
-        
-        # Create collection for this file
-        model = get_model()
-        dimension = model.get_sentence_embedding_dimension()
-        if dimension is None:
-            raise HTTPException(status_code=500, detail="Model embedding dimension is None.")
-
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=dimension,
-                distance=Distance.COSINE,
-            ),
-        )
-        
-        is_pdf = (
-            f.content_type == "application/pdf"
-            or (f.filename and f.filename.lower().endswith(".pdf"))
-        )
-        is_txt = (
-            f.content_type == "text/plain" or (f.filename and f.filename.lower().endswith(".txt"))
-        )
-        
-        if is_txt:
-            points = process_txt_file(f.file, f.filename, collection_name)
-        elif is_pdf:
-            points = process_pdf_file(f.file, f.filename, collection_name)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type for '{f.filename}'. Only PDF and TXT files are supported."
-            )
-        
-        client.upsert(
-            collection_name=collection_name,
-            points=points
-        )
-        
-        existing_collection_names.append(collection_name)
-        results.append(f"'{f.filename}' -> collection '{collection_name}' ({len(points)} chunks)")
+    results = await ingest_files(files)
+    processed = [r for r in results if r["status"] == "ok"]
+    summary = [f"'{r['file']}' -> collection '{r['collection']}' ({r['chunks']} chunks)" for r in processed]
 
     return SuccessfulMessage(
-        status_code=200,
-        detail=f"Successfully processed {len(files)} files: {', '.join(results)}",
+        status_code=200 if len(processed) == len(results) else 207,
+        detail=f"Successfully processed {len(processed)} of {len(files)} files: {', '.join(summary)}",
+        payload={"results": results},
     )
     
+@route.get("/collections")
+async def list_collections():
+    names = await collection_names()
+    return SuccessfulMessage(
+        status_code=200,
+        detail=f"{len(names)} collections",
+        payload={"collections": [{"name": name} for name in sorted(names)]},
+    )
+
 @route.get("/upload/instr")
 async def upload_instructions():
     return SuccessfulMessage(
@@ -218,8 +266,7 @@ async def upload_init(req: Request):
 
     collection_name = Path(file_name).stem
 
-    existing_collections = client.get_collections().collections
-    if collection_name in [c.name for c in existing_collections]:
+    if await collection_exists(collection_name):
         raise HTTPException(status_code=400, detail=f"Collection '{collection_name}' already exists.")
 
     metadata = ChunkedUploadMetadata(
@@ -363,19 +410,15 @@ async def complete_upload(req: Request):
                 payload={"missing_indexes": missing_indexs},
             )
     
-        try:
-            chunks_dir = str(PROJECT_ROOT / "uploads" / f"{Path(metadata.file_name).stem}_{redis_uuid}")
-            ext = metadata.file_name.split(".")[-1]
-            merged_chunks_file_path = merge_chunks(file_extention=ext, chunks_dir=chunks_dir)
-            result = upload_file(merged_chunks_file_path)
-
-            # Cleanup
-            for chunk in metadata.chunk_metadata:
-                os.remove(chunk.file_path)
-            os.remove(merged_chunks_file_path)
-
-            await redis_client.delete(redis_uuid)
-
-            return result
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    chunks_dir = str(PROJECT_ROOT / "uploads" / f"{Path(metadata.file_name).stem}_{redis_uuid}")
+    try:
+        ext = metadata.file_name.split(".")[-1]
+        merged_chunks_file_path = merge_chunks(file_extention=ext, chunks_dir=chunks_dir)
+        return await upload_file(merged_chunks_file_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    finally:
+        # chunks and the merged file are removed whether or not ingestion succeeded,
+        # a failed session cannot be resumed
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+        await redis_client.delete(redis_uuid)
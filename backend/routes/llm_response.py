@@ -44,7 +44,7 @@ async def get_chat_completions(request: Request):
                                     data_obj["choices"][0].get("delta")):
                                     
                                     content = data_obj["choices"][0]["delta"].get("content")
-                                    if content and content.strip():
+                                    if content:
                                         content_received = True
                                         yield content
                             except json.JSONDecodeError:
@@ -0,0 +1,32 @@
+"""
+Names of the Qdrant collections, cached per process for
+COLLECTION_CATALOG_LOCAL_TTL seconds, so uploads do not list the collections
+on every request. The shared catalog with point counts and documents belongs to
+new_backend, this backend only reads Qdrant and never writes its Redis keys.
+"""
+import time
+
+from backend.clients import qdrant_client as client
+from backend.config import settings
+
+_names: set[str] | None = None
+_loaded_at = 0.0
+
+
+async def collection_names() -> set[str]:
+    global _names, _loaded_at
+    if _names is None or time.monotonic() - _loaded_at >= settings.COLLECTION_CATALOG_LOCAL_TTL:
+        response = await client.get_collections()
+        _names = {c.name for c in response.collections}
+        _loaded_at = time.monotonic()
+    return _names
+
+
+async def collection_exists(collection_name: str) -> bool:
+    return collection_name in await collection_names()
+
+
+def record_collection(collection_name: str):
+    """Adds a collection this process created, before the next listing shows it."""
+    if _names is not None:
+        _names.add(collection_name)
@@ -69,6 +69,40 @@ def embed_chunks(chunks):
     return embeddings.astype("float32")
 
 
+def make_points(chunked_text, embedded_chunks, filename: str, collection_name: str):
+    points = []
+    for i, (vect, text_chunk) in enumerate(zip(embedded_chunks, chunked_text)):
+        points.append(
+            PointStruct(
+                id=i,  # Start from 0 for each new collection
+                vector=vect,
+                payload={
+                    "text": text_chunk,
+                    "source": filename,
+                    "document": collection_name
+                }
+            )
+        )
+    return points
+
+
+def extract_chunks(file_stream, is_pdf: bool):
+    """
+    Read a TXT or PDF file stream and return its text chunks without embedding them,
+    so chunks of several files can be embedded together.
+    """
+    if not is_pdf:
+        return chunk_text(file_stream.read().decode('utf-8'))
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        shutil.copyfileobj(file_stream, tmp)
+        temp_pdf_path = tmp.name
+    try:
+        return chunk_text(extract_text(temp_pdf_path))
+    finally:
+        os.unlink(temp_pdf_path)
+
+
 def process_pdf_file(pdf_file_stream, filename: str, collection_name: str):
     """
     Process a PDF file stream and return points ready for vector database insertion.
@@ -93,21 +127,7 @@ def process_pdf_file(pdf_file_stream, filename: str, collection_name: str):
         embedded_chunks = embed_chunks(chunked_text)
         
         # Create points for vector database
-        points = []
-        for i, (vect, text_chunk) in enumerate(zip(embedded_chunks, chunked_text)):
-            points.append(
-                PointStruct(
-                    id=i,  # Start from 0 for each new collection
-                    vector=vect,
-                    payload={
-                        "text": text_chunk,
-                        "source": filename,  # Use the passed filename
-                        "document": collection_name
-                    }
-                )
-            )
-        
-        return points
+        return make_points(chunked_text, embedded_chunks, filename, collection_name)
         
     finally:
         # Clean up temporary file
@@ -134,21 +154,7 @@ def process_txt_file(txt_file_stream, filename: str, collection_name: str):
         embedded_chunks = embed_chunks(chunked_text)
         
         # Create points for vector database
-        points = []
-        for i, (vect, text_chunk) in enumerate(zip(embedded_chunks, chunked_text)):
-            points.append(
-                PointStruct(
-                    id=i,  # Start from 0 for each new collection
-                    vector=vect,
-                    payload={
-                        "text": text_chunk,
-                        "source": filename,
-                        "document": collection_name
-                    }
-                )
-            )
-        
-        return points
+        return make_points(chunked_text, embedded_chunks, filename, collection_name)
         
     except Exception as e:
         logger.error(f"Error processing TXT file {filename}: {e}")
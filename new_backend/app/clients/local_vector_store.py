@@ -0,0 +1,513 @@
+from qdrant_client.http.models import (
+    CollectionDescription,
+    CollectionsResponse,
+    CountResult,
+    Distance,
+    FusionQuery,
+    NearestQuery,
+    PointIdsList,
+    PointStruct,
+    Prefetch,
+    QueryResponse,
+    Record,
+    ScoredPoint,
+    SearchParams,
+    SparseVector,
+    UpdateResult,
+    UpdateStatus,
+    VectorParams,
+)
+from config.config import settings
+from functools import partial
+from pathlib import Path
+from typing import Iterable, List
+import numpy as np
+import threading
+import asyncio
+import logging
+import shutil
+import json
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+# rank constant of reciprocal rank fusion, score = sum(1 / (RRF_K + rank))
+RRF_K = 60
+
+
+def _reject_unsupported(method: str, kwargs: dict):
+    # a filter or threshold silently dropped would return results Qdrant would not
+    unsupported = sorted(name for name, value in kwargs.items() if value is not None)
+    if unsupported:
+        raise ValueError(f"The local vector store does not support {', '.join(unsupported)} in {method}")
+
+
+class _DenseIndex:
+    def __init__(self, dimension: int, distance: Distance, file_path: Path | None) -> None:
+        if distance not in (Distance.COSINE, Distance.DOT, Distance.EUCLID):
+            raise ValueError(f"Distance {distance} is not supported by the local vector store")
+        self.dimension = dimension
+        self.distance = distance
+        self.__file_path = file_path
+        self.__hnsw = None
+        self.__matrix: np.ndarray | None = None
+        self.__deleted: set[int] = set()
+        self.matrix = self._allocate(1024)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self.__matrix is None:
+            # closed, the file is mapped again on first use
+            self.__matrix = self._allocate(self.__capacity)
+        return self.__matrix
+
+    @matrix.setter
+    def matrix(self, matrix: np.ndarray):
+        self.__matrix = matrix
+        self.__capacity = len(matrix)
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if self.__file_path is None:
+            return np.zeros((capacity, self.dimension), dtype=np.float32)
+        size = capacity * self.dimension * 4
+        if not self.__file_path.exists() or self.__file_path.stat().st_size < size:
+            with open(self.__file_path, "ab") as f:
+                f.truncate(size)
+        return np.memmap(self.__file_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _grow(self, rows: int):
+        capacity = len(self.matrix)
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        if self.__file_path is None:
+            matrix = self._allocate(capacity)
+            matrix[:len(self.matrix)] = self.matrix
+            self.matrix = matrix
+        else:
+            self.matrix.flush()
+            self.__matrix = None
+            self.matrix = self._allocate(capacity)
+
+    def prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if self.distance == Distance.COSINE:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray, size: int):
+        self._grow(size)
+        vectors = self.prepare(vectors)
+        self.matrix[rows] = vectors
+        if self.__hnsw is not None:
+            self._hnsw_add(rows, vectors)
+        elif hnswlib is not None and size >= settings.LOCAL_VECTOR_STORE_HNSW_THRESHOLD:
+            self._hnsw_build(size)
+
+    def delete(self, rows: Iterable[int]):
+        # rows are never reused, a deleted one is only left out of searches
+        for row in rows:
+            self.__deleted.add(row)
+            if self.__hnsw is not None:
+                self.__hnsw.mark_deleted(row)
+
+    def flush(self):
+        if isinstance(self.__matrix, np.memmap):
+            self.__matrix.flush()
+
+    def close(self):
+        self.flush()
+        if isinstance(self.__matrix, np.memmap):
+            # dropping the last reference unmaps the file
+            self.__matrix = None
+
+    def _hnsw_build(self, size: int):
+        space = {Distance.COSINE: "ip", Distance.DOT: "ip", Distance.EUCLID: "l2"}[self.distance]
+        self.__hnsw = hnswlib.Index(space=space, dim=self.dimension)
+        self.__hnsw.init_index(max_elements=max(size * 2, 1024), M=settings.LOCAL_VECTOR_STORE_HNSW_M, ef_construction=200)
+        self.__hnsw.set_ef(settings.LOCAL_VECTOR_STORE_HNSW_EF)
+        self._hnsw_add(np.arange(size), self.matrix[:size])
+        for row in self.__deleted:
+            self.__hnsw.mark_deleted(row)
+
+    def _hnsw_add(self, rows: np.ndarray, vectors: np.ndarray):
+        required = int(rows.max()) + 1
+        if required > self.__hnsw.get_max_elements():
+            self.__hnsw.resize_index(required * 2)
+        self.__hnsw.add_items(vectors, rows)
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        vectors = self.matrix[rows]
+        if self.distance == Distance.EUCLID:
+            return np.linalg.norm(vectors - query, axis=1)
+        return vectors @ query
+
+    def search(self, query, size: int, limit: int, candidates: np.ndarray | None = None, exact: bool = False) -> List[tuple[int, float]]:
+        query = self.prepare(query)[0]
+        ascending = self.distance == Distance.EUCLID
+
+        live = size - len(self.__deleted)
+        if candidates is None and self.__hnsw is not None and not exact and limit < live:
+            labels, distances = self.__hnsw.knn_query(query, k=limit)
+            rows = labels[0].astype(np.int64)
+            return [(int(row), float(score)) for row, score in zip(rows, self._scores(query, rows))]
+
+        rows = np.arange(size) if candidates is None else candidates
+        if self.__deleted:
+            rows = rows[~np.isin(rows, np.fromiter(self.__deleted, dtype=np.int64))]
+        if len(rows) == 0:
+            return []
+        scores = self._scores(query, rows)
+        order_scores = scores if ascending else -scores
+        if limit < len(rows):
+            top = np.argpartition(order_scores, limit)[:limit]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(order_scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+class _SparseIndex:
+    def __init__(self) -> None:
+        self.__vectors: dict[int, SparseVector] = {}
+        self.__postings: dict[int, dict[int, float]] = {}
+
+    def write(self, row: int, vector: SparseVector):
+        self.delete(row)
+        self.__vectors[row] = vector
+        for index, value in zip(vector.indices, vector.values):
+            self.__postings.setdefault(index, {})[row] = value
+
+    def delete(self, row: int):
+        previous = self.__vectors.pop(row, None)
+        if previous is not None:
+            for index in previous.indices:
+                self.__postings.get(index, {}).pop(row, None)
+
+    def search(self, query: SparseVector, limit: int, candidates: np.ndarray | None = None) -> List[tuple[int, float]]:
+        allowed = None if candidates is None else set(candidates.tolist())
+        scores: dict[int, float] = {}
+        for index, weight in zip(query.indices, query.values):
+            for row, value in self.__postings.get(index, {}).items():
+                if allowed is None or row in allowed:
+                    scores[row] = scores.get(row, 0.0) + weight * value
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class _Collection:
+    def __init__(self, name: str, vectors_config: dict, sparse_names: List[str], directory: Path | None) -> None:
+        self.name = name
+        self.vectors_config = vectors_config
+        self.sparse_names = sparse_names
+        self.directory = directory
+        self.ids: List = []
+        self.rows: dict = {}
+        self.payloads: List[dict] = []
+        self.dense = {
+            vector_name: _DenseIndex(params["size"], Distance(params["distance"]), directory / f"dense.{vector_name or 'default'}.f32" if directory else None)
+            for vector_name, params in vectors_config.items()
+        }
+        self.sparse = {vector_name: _SparseIndex() for vector_name in sparse_names}
+
+    def _vectors(self, point: PointStruct) -> dict:
+        if isinstance(point.vector, dict):
+            return point.vector
+        return {"": point.vector}
+
+    def upsert(self, points: List[PointStruct], log: bool = True):
+        records = []
+        dense_rows = {vector_name: ([], []) for vector_name in self.dense}
+        for point in points:
+            row = self.rows.get(point.id)
+            if row is None:
+                row = len(self.ids)
+                self.rows[point.id] = row
+                self.ids.append(point.id)
+                self.payloads.append({})
+            self.payloads[row] = point.payload or {}
+
+            vectors = self._vectors(point)
+            for vector_name, vector in vectors.items():
+                if vector_name in self.dense:
+                    dense_rows[vector_name][0].append(row)
+                    dense_rows[vector_name][1].append(vector)
+                elif vector_name in self.sparse:
+                    self.sparse[vector_name].write(row, vector)
+                else:
+                    raise ValueError(f"Collection {self.name} has no vector named '{vector_name}'")
+
+            if log and self.directory is not None:
+                records.append({
+                    "id": point.id,
+                    "row": row,
+                    "payload": self.payloads[row],
+                    "sparse": {
+                        vector_name: [list(vectors[vector_name].indices), list(vectors[vector_name].values)]
+                        for vector_name in self.sparse if vector_name in vectors
+                    },
+                })
+
+        for vector_name, (rows, vectors) in dense_rows.items():
+            if rows:
+                self.dense[vector_name].write(np.asarray(rows), np.asarray(vectors, dtype=np.float32), len(self.ids))
+
+        if records:
+            # dense rows are flushed before the log line that makes them visible on reload
+            for index in self.dense.values():
+                index.flush()
+            with open(self.directory / "points.jsonl", "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def is_live(self, row: int) -> bool:
+        # a deleted point keeps its row, an id upserted again after its delete gets a new one
+        return self.rows.get(self.ids[row]) == row
+
+    def delete(self, ids: Iterable, log: bool = True):
+        rows = []
+        for point_id in ids:
+            row = self.rows.pop(point_id, None)
+            if row is None:
+                continue
+            self.payloads[row] = {}
+            for index in self.sparse.values():
+                index.delete(row)
+            rows.append(row)
+        for index in self.dense.values():
+            index.delete(rows)
+
+        if rows and log and self.directory is not None:
+            with open(self.directory / "points.jsonl", "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"id": self.ids[row], "row": row, "deleted": True}) + "\n" for row in rows))
+
+    def close(self):
+        for index in self.dense.values():
+            index.close()
+
+    def load(self):
+        log_path = self.directory / "points.jsonl"
+        if not log_path.exists():
+            return
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("deleted"):
+                    self.delete([record["id"]], log=False)
+                    continue
+                row = record["row"]
+                if row == len(self.ids):
+                    self.ids.append(record["id"])
+                    self.payloads.append({})
+                self.rows[record["id"]] = row
+                self.payloads[row] = record["payload"]
+                for vector_name, (indices, values) in record["sparse"].items():
+                    self.sparse[vector_name].write(row, SparseVector(indices=indices, values=values))
+        for index in self.dense.values():
+            index._grow(len(self.ids))
+            if hnswlib is not None and len(self.ids) >= settings.LOCAL_VECTOR_STORE_HNSW_THRESHOLD:
+                index._hnsw_build(len(self.ids))
+
+
+class LocalVectorStore:
+    """
+    In-process stand-in for QdrantClient, for small deployments and tests.
+
+    Dense vectors live in one float32 matrix per vector name (a memory-mapped
+    file when a path is given, a plain array otherwise) and are searched by
+    brute force; once a collection grows past LOCAL_VECTOR_STORE_HNSW_THRESHOLD
+    and hnswlib is installed, an HNSW index answers the unfiltered queries.
+    Payloads and sparse vectors are kept in memory and, with a path, replayed
+    from an append-only points.jsonl on start.
+
+    Implements the subset of the QdrantClient API used by this app: no
+    payload filters, score thresholds or payload indexes, a call that asks for
+    them raises ValueError. Points are deleted by id only. The store is not
+    shared between processes, run a single worker with it.
+    """
+
+    def __init__(self, path: str | None = settings.LOCAL_VECTOR_STORE_PATH) -> None:
+        self.__path = Path(path) if path else None
+        self.__collections: dict[str, _Collection] = {}
+        self.__lock = threading.RLock()
+        self.__logger = logging.getLogger(__name__)
+
+        if self.__path is not None:
+            self.__path.mkdir(parents=True, exist_ok=True)
+            for config_path in sorted(self.__path.glob("*/collection.json")):
+                config = json.loads(config_path.read_text(encoding="utf-8"))
+                collection = _Collection(config["name"], config["vectors"], config["sparse_vectors"], config_path.parent)
+                collection.load()
+                self.__collections[collection.name] = collection
+            self.__logger.info(f"Loaded {len(self.__collections)} collections from {self.__path}")
+
+    def _collection(self, collection_name: str) -> _Collection:
+        collection = self.__collections.get(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} not found")
+        return collection
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self.__collections
+
+    def vector_names(self, collection_name: str) -> List[str]:
+        return list(self._collection(collection_name).vectors_config)
+
+    def get_collections(self) -> CollectionsResponse:
+        return CollectionsResponse(collections=[CollectionDescription(name=name) for name in self.__collections])
+
+    def create_collection(self, collection_name: str, vectors_config: VectorParams | dict, sparse_vectors_config: dict | None = None, **kwargs) -> bool:
+        with self.__lock:
+            if collection_name in self.__collections:
+                raise ValueError(f"Collection {collection_name} already exists")
+
+            if isinstance(vectors_config, VectorParams):
+                vectors_config = {"": vectors_config}
+            vectors = {name: {"size": params.size, "distance": Distance(params.distance).value} for name, params in vectors_config.items()}
+            sparse_names = list(sparse_vectors_config or {})
+
+            directory = None
+            if self.__path is not None:
+                directory = self.__path / collection_name
+                directory.mkdir(parents=True, exist_ok=True)
+            collection = _Collection(collection_name, vectors, sparse_names, directory)
+            if directory is not None:
+                config = {"name": collection_name, "vectors": vectors, "sparse_vectors": sparse_names}
+                (directory / "collection.json").write_text(json.dumps(config), encoding="utf-8")
+            self.__collections[collection_name] = collection
+            return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self.__lock:
+            collection = self.__collections.pop(collection_name, None)
+            if collection is None:
+                return False
+            collection.close()
+            if collection.directory is not None:
+                shutil.rmtree(collection.directory, ignore_errors=True)
+            return True
+
+    def close(self, **kwargs):
+        # the log is appended and closed per upsert, only the dense matrices are still mapped
+        with self.__lock:
+            for collection in self.__collections.values():
+                collection.close()
+
+    def upsert(self, collection_name: str, points: List[PointStruct], wait: bool = True, **kwargs) -> UpdateResult:
+        _reject_unsupported("upsert", kwargs)
+        with self.__lock:
+            self._collection(collection_name).upsert(list(points))
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name: str, points_selector: PointIdsList | List, wait: bool = True, **kwargs) -> UpdateResult:
+        _reject_unsupported("delete", kwargs)
+        if isinstance(points_selector, PointIdsList):
+            points_selector = points_selector.points
+        elif not isinstance(points_selector, (list, tuple)):
+            raise ValueError("The local vector store deletes points by id only, not by filter")
+        with self.__lock:
+            self._collection(collection_name).delete(points_selector)
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    def upload_points(self, collection_name: str, points: Iterable[PointStruct], batch_size: int = 64, **kwargs):
+        batch = []
+        for point in points:
+            batch.append(point)
+            if len(batch) >= batch_size:
+                self.upsert(collection_name, batch)
+                batch = []
+        if batch:
+            self.upsert(collection_name, batch)
+
+    def count(self, collection_name: str, exact: bool = True, **kwargs) -> CountResult:
+        _reject_unsupported("count", kwargs)
+        return CountResult(count=len(self._collection(collection_name).rows))
+
+    def scroll(self, collection_name: str, limit: int = 10, offset: int | None = None, with_payload: bool = True, **kwargs) -> tuple[List[Record], int | None]:
+        _reject_unsupported("scroll", kwargs)
+        # offsets are row numbers here, not point ids as in Qdrant
+        with self.__lock:
+            collection = self._collection(collection_name)
+            rows = []
+            row = offset or 0
+            while row < len(collection.ids) and len(rows) < limit:
+                if collection.is_live(row):
+                    rows.append(row)
+                row += 1
+            records = [Record(id=collection.ids[row], payload=collection.payloads[row] if with_payload else None) for row in rows]
+            return records, row if row < len(collection.ids) else None
+
+    def _query(self, collection: _Collection, query, using: str | None, prefetch, limit: int, candidates: np.ndarray | None = None, exact: bool = False) -> List[tuple[int, float]]:
+        if isinstance(query, NearestQuery):
+            query = query.nearest
+
+        if prefetch is not None:
+            prefetches = prefetch if isinstance(prefetch, list) else [prefetch]
+            results = [self._query(collection, p.query, p.using, p.prefetch, p.limit or limit, candidates, exact) for p in prefetches]
+            if isinstance(query, FusionQuery):
+                fused: dict[int, float] = {}
+                for result in results:
+                    for rank, (row, _) in enumerate(result):
+                        fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+                return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+            candidates = np.unique(np.asarray([row for result in results for row, _ in result], dtype=np.int64))
+
+        if isinstance(query, FusionQuery):
+            raise ValueError("Fusion queries need at least one prefetch")
+
+        using = using or ""
+        if isinstance(query, SparseVector):
+            if using not in collection.sparse:
+                raise ValueError(f"Collection {collection.name} has no sparse vector named '{using}'")
+            return collection.sparse[using].search(query, limit, candidates)
+
+        if using not in collection.dense:
+            raise ValueError(f"Collection {collection.name} has no dense vector named '{using}'")
+        return collection.dense[using].search(query, len(collection.ids), limit, candidates, exact)
+
+    def query_points(
+        self,
+        collection_name: str,
+        query=None,
+        using: str | None = None,
+        prefetch: Prefetch | List[Prefetch] | None = None,
+        limit: int = 10,
+        with_payload: bool = True,
+        search_params: SearchParams | None = None,
+        **kwargs,
+    ) -> QueryResponse:
+        _reject_unsupported("query_points", kwargs)
+        with self.__lock:
+            collection = self._collection(collection_name)
+            # exact skips the HNSW index, its other parameters do not apply to brute force
+            scored = self._query(collection, query, using, prefetch, limit, exact=bool(search_params and search_params.exact))
+            return QueryResponse(points=[
+                ScoredPoint(
+                    id=collection.ids[row],
+                    version=0,
+                    score=score,
+                    payload=collection.payloads[row] if with_payload else None,
+                )
+                for row, score in scored
+            ])
+
+
+class AsyncLocalVectorStore:
+    """
+    Awaitable facade over a LocalVectorStore with the AsyncQdrantClient call
+    signatures; every call runs in the default executor.
+    """
+
+    def __init__(self, store: LocalVectorStore) -> None:
+        self.__store = store
+
+    def __getattr__(self, name: str):
+        method = getattr(self.__store, name)
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, partial(method, *args, **kwargs))
+
+        return call
@@ -1,10 +1,75 @@
 from config.config import settings
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.models import VectorParams, Distance, SparseVectorParams, HnswConfigDiff
+from app.clients.local_vector_store import LocalVectorStore, AsyncLocalVectorStore
 
 class QuadrantClient:
+    VECTOR_STORE_BACKENDS = ("qdrant", "local")
+    _local_store: LocalVectorStore | None = None
+    _async_client: AsyncQdrantClient | AsyncLocalVectorStore | None = None
+
     def __init__(self) -> None:
-        self.__client = QdrantClient(url=f"http://{settings.QDRANT_HOST}:6333")
+        if settings.VECTOR_STORE_BACKEND not in self.VECTOR_STORE_BACKENDS:
+            raise ValueError(f"Unknown vector store backend '{settings.VECTOR_STORE_BACKEND}', expected one of {self.VECTOR_STORE_BACKENDS}")
+        
+        if settings.VECTOR_STORE_BACKEND == "local":
+            # one store per process, every controller must see the same collections
+            if QuadrantClient._local_store is None:
+                QuadrantClient._local_store = LocalVectorStore(settings.LOCAL_VECTOR_STORE_PATH)
+            self.__client = QuadrantClient._local_store
+        else:
+            self.__client = QdrantClient(url=f"http://{settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
         
     @property
     def client(self):
         return self.__client
+    
+    @property
+    def async_client(self):
+        # shared by every request handler, so they all multiplex one gRPC channel
+        if QuadrantClient._async_client is None:
+            if settings.VECTOR_STORE_BACKEND == "local":
+                QuadrantClient._async_client = AsyncLocalVectorStore(self.__client)
+            else:
+                QuadrantClient._async_client = AsyncQdrantClient(
+                    host=settings.QDRANT_HOST,
+                    port=settings.QDRANT_PORT,
+                    grpc_port=settings.QDRANT_GRPC_PORT,
+                    prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                    timeout=settings.QDRANT_TIMEOUT,
+                )
+        return QuadrantClient._async_client
+    
+    @staticmethod
+    async def vector_names(async_client, collection_name: str) -> set[str]:
+        """Names of the dense vectors a collection was created with."""
+        if settings.VECTOR_STORE_BACKEND == "local":
+            return set(await async_client.vector_names(collection_name))
+        info = await async_client.get_collection(collection_name)
+        vectors = info.config.params.vectors
+        return set(vectors) if isinstance(vectors, dict) else {""}
+    
+    @staticmethod
+    def collection_config(dimension: int, sparse: bool = settings.SPARSE_VECTORS_ENABLED, small_dimension: int | None = None) -> dict:
+        vectors_config = {
+            settings.DENSE_VECTOR_NAME: VectorParams(
+                size=dimension,
+                distance=Distance.COSINE,
+            ),
+        }
+        if small_dimension:
+            # the small vector carries the HNSW graph, full vectors are only read to rescore candidates
+            vectors_config[settings.DENSE_VECTOR_NAME] = VectorParams(
+                size=dimension,
+                distance=Distance.COSINE,
+                on_disk=True,
+                hnsw_config=HnswConfigDiff(m=0),
+            )
+            vectors_config[settings.SMALL_VECTOR_NAME] = VectorParams(
+                size=small_dimension,
+                distance=Distance.COSINE,
+            )
+        return {
+            "vectors_config": vectors_config,
+            "sparse_vectors_config": {settings.SPARSE_VECTOR_NAME: SparseVectorParams()} if sparse else None,
+        }
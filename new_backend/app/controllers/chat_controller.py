@@ -1,14 +1,21 @@
 from config.config import settings
 from app.models.chat_model import ChatMessage
+from app.utils.response_cache import ResponseCache
+from app.utils.llm_scheduler import UpstreamScheduler
+from app.utils.sse import StreamError, parse_sse_data, extract_delta, format_sse, format_sse_delta, coalesce_stream
+from fastapi import Request
 from fastapi.responses import StreamingResponse
-from typing import List
+from typing import Awaitable, Callable, List
 import json
-import httpx
 
 
 class ChatController:
-    def __init__(self, model: str = settings.DEFAULT_MODEL) -> None:
-        self.__headers = {"Authorization": f"Bearer {settings.LLM_SERVICE_API_KEY}"}
+    def __init__(self, model: str = settings.DEFAULT_MODEL, response_cache: ResponseCache | None = None, on_complete: Callable[[str], Awaitable[None]] | None = None, client_id: str = "anonymous") -> None:
+        self.__response_cache = response_cache
+        self.__on_complete = on_complete
+        self.__client_id = client_id
+        self.__scheduler = UpstreamScheduler()
+        self.__had_error = False
         self.__payload = {
             "model": model, 
             "messages": [], 
@@ -29,57 +36,104 @@ class ChatController:
         
     @messages.setter
     def messages(self, messages: List[ChatMessage]):
-        self.__payload["messages"] = messages
+        self.__payload["messages"] = [m.dict() if isinstance(m, ChatMessage) else m for m in messages]
         
     def append_message(self, message: ChatMessage):
-        self.__payload["messages"].append(message)
+        self.__payload["messages"].append(message.dict() if isinstance(message, ChatMessage) else message)
         
-    async def generate_chat(self):
+    async def _generate_upstream(self):
         content_received = False
         had_error = False
         error_message = ""
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream("POST", settings.LLM_URL, headers=self.__headers, json=self.__payload) as response:
-                    async for line in response.aiter_lines():
-                        line = line.strip()
-                        if line.startswith('data: '):
-                            data_content = line[6:]
-                            if data_content == '[DONE]':
-                                if not content_received:
-                                    had_error = True
-                                    error_message = "AI generated no content - empty response"
-                                    yield f"Error: {error_message}\n"
-                                break
-                            
-                            try:
-                                data_obj = json.loads(data_content)
-                                if (data_obj.get("choices") and 
-                                    data_obj["choices"][0].get("delta")):
-                                    
-                                    content = data_obj["choices"][0]["delta"].get("content")
-                                    if content and content.strip():
-                                        content_received = True
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
-                            
-                    if not content_received and not had_error:
-                        had_error = True
-                        error_message = "Stream ended without generating content"
-                        yield f"Error: {error_message}\n"
+            async with self.__scheduler.stream(self.__payload, client_id=self.__client_id) as response:
+                async for line in response.aiter_lines():
+                    data_content = parse_sse_data(line.strip())
+                    if data_content is None:
+                        continue
+                    if data_content == '[DONE]':
+                        if not content_received:
+                            had_error = True
+                            error_message = "AI generated no content - empty response"
+                            yield StreamError(f"Error: {error_message}\n")
+                        break
                     
+                    # whitespace-only deltas are real output, dropping them merges words
+                    content = extract_delta(data_content)
+                    if content:
+                        content_received = True
+                        yield content
+                        
+                if not content_received and not had_error:
+                    had_error = True
+                    error_message = "Stream ended without generating content"
+                    yield StreamError(f"Error: {error_message}\n")
+                
         except Exception as e:
             had_error = True
             error_message = f"Stream error: {str(e)}"
-            yield f"Error: {error_message}\n"
+            yield StreamError(f"Error: {error_message}\n")
         
         if not content_received and not had_error:
-            yield "Error: No content generated by AI model\n"
+            had_error = True
+            yield StreamError("Error: No content generated by AI model\n")
+        
+        self.__had_error = had_error
+        
+    async def _generate_chunks(self):
+        if self.__response_cache is None:
+            async for chunk in self._generate_upstream():
+                yield chunk
+            return
+        
+        async for chunk in self.__response_cache.stream(
+            self.model,
+            self.messages,
+            self._generate_upstream,
+            is_cacheable=lambda: not self.__had_error,
+        ):
+            yield chunk
+            
+    async def generate_chat(self):
+        parts = []
+        had_error = False
+        async for chunk in self._generate_chunks():
+            if isinstance(chunk, StreamError):
+                had_error = True
+            else:
+                parts.append(chunk)
+            yield chunk
+        
+        if self.__on_complete is not None and not had_error:
+            await self.__on_complete("".join(parts))
+            
+    async def complete(self) -> str:
+        parts = [chunk async for chunk in self._generate_upstream()]
+        if self.__had_error:
+            raise ValueError("".join(parts).strip())
+        return "".join(parts)
+            
+    async def _frame_sse(self, chunks):
+        async for chunk in chunks:
+            if isinstance(chunk, StreamError):
+                yield format_sse(json.dumps({"error": chunk.strip()}), event="error")
+            else:
+                yield format_sse_delta(chunk)
+        yield format_sse("[DONE]")
             
-    async def stream_chat(self) -> StreamingResponse | ValueError:
+    async def stream_chat(self, request: Request | None = None, stream_format: str = "text") -> StreamingResponse | ValueError:
         try:
-            return StreamingResponse(self.generate_chat(), media_type="text/plain")
+            chunks = coalesce_stream(
+                self.generate_chat(),
+                is_disconnected=request.is_disconnected if request is not None else None,
+            )
+            if stream_format == "sse":
+                return StreamingResponse(
+                    self._frame_sse(chunks),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                )
+            return StreamingResponse(chunks, media_type="text/plain")
         except Exception as e:
             return ValueError(f"Error, there has been an error fetching from llm provider: {e}")
@@ -0,0 +1,132 @@
+from qdrant_client.http.models import Prefetch, FusionQuery, Fusion
+from config.config import settings
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from app.utils.sparse_vectorizer import SparseVectorizer
+from app.utils.vector_projection import MissingProjectionError, ProjectionStore
+from app.clients.qdrant_client import QuadrantClient
+from app.utils.reranker import CrossEncoderReranker
+from app.utils.collection_catalog import CollectionCatalog
+from app.utils.text_store import TextStore
+from typing import List
+import asyncio
+
+
+class SearchController:
+    SEARCH_MODES = ("dense", "sparse", "prefilter", "hybrid")
+
+    def __init__(
+        self,
+        qdrant_client,
+        redis_client,
+        file_processing_pipeline: FileProcessingPipeline,
+        projection_store: ProjectionStore,
+        collection_catalog: CollectionCatalog,
+        text_store: TextStore,
+        reranker: CrossEncoderReranker | None = None,
+    ) -> None:
+        self.__qdrant_client = qdrant_client
+        self.__redis_client = redis_client
+        self.__file_processing_pipeline = file_processing_pipeline
+        self.__sparse_vectorizer = file_processing_pipeline.sparse_vectorizer or SparseVectorizer(redis_client)
+        self.__projection_store = projection_store
+        self.__reranker = reranker
+        self.__collection_catalog = collection_catalog
+        self.__text_store = text_store
+
+    async def _dense_query(self, query: str) -> List[float]:
+        embeddings = await self.__file_processing_pipeline.embed_chunks([query])
+        return embeddings[0].tolist()
+
+    async def _dense_stage(self, collection_name: str, dense_query: List[float], limit: int) -> dict:
+        """Arguments of a dense query, a first pass on the small vector rescored with the full one where the collection has it."""
+        projection = await self.__projection_store.get(collection_name)
+        if projection is None:
+            if not self.__projection_store.known_without_small_vectors(collection_name):
+                if settings.SMALL_VECTOR_NAME in await QuadrantClient.vector_names(self.__qdrant_client, collection_name):
+                    # without the fitted matrix no query can be projected, the full vectors have no HNSW graph to fall back on
+                    raise MissingProjectionError(f"Collection {collection_name} has small vectors but its projection is missing")
+                self.__projection_store.mark_without_small_vectors(collection_name)
+            return {"query": dense_query, "using": settings.DENSE_VECTOR_NAME}
+        return {
+            "prefetch": Prefetch(
+                query=projection.project(dense_query).tolist(),
+                using=settings.SMALL_VECTOR_NAME,
+                limit=max(settings.SEARCH_RESCORE_LIMIT, limit),
+            ),
+            "query": dense_query,
+            "using": settings.DENSE_VECTOR_NAME,
+        }
+
+    def _format_points(self, points) -> List[dict]:
+        return [
+            {
+                "id": point.id,
+                "score": point.score,
+                "payload": point.payload,
+            }
+            for point in points
+        ]
+
+    async def search(self, query: str, collection_name: str, mode: str = "hybrid", limit: int = settings.SEARCH_LIMIT, prefetch_limit: int = settings.SEARCH_PREFETCH_LIMIT, rerank: bool = True):
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {self.SEARCH_MODES}")
+        if not await self.__collection_catalog.exists(collection_name, verify_missing=True):
+            raise ValueError(f"Collection {collection_name} does not exist")
+
+        # the cross-encoder picks the final results from a wider candidate set
+        rerank = rerank and self.__reranker is not None
+        result_limit = limit
+        if rerank:
+            limit = max(limit, settings.RERANKER_CANDIDATES)
+            prefetch_limit = max(prefetch_limit, limit)
+
+        if mode == "dense":
+            response = await self.__qdrant_client.query_points(
+                collection_name=collection_name,
+                **await self._dense_stage(collection_name, await self._dense_query(query), limit),
+                limit=limit,
+                with_payload=True,
+            )
+        else:
+            response = await self._lexical_search(query, collection_name, mode, limit, prefetch_limit)
+
+        results = self._format_points(response.points)
+        if any(r["payload"] and "text_doc" in r["payload"] for r in results):
+            # one pass over the hits, off the event loop, before the reranker needs the texts
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.__text_store.hydrate, collection_name, [r["payload"] for r in results])
+        if rerank:
+            return await self.__reranker.rerank(query, results, result_limit)
+        return results
+
+    async def _lexical_search(self, query: str, collection_name: str, mode: str, limit: int, prefetch_limit: int):
+        sparse_query = await self.__sparse_vectorizer.encode_query(collection_name, query)
+
+        if mode == "sparse":
+            return await self.__qdrant_client.query_points(
+                collection_name=collection_name,
+                query=sparse_query,
+                using=settings.SPARSE_VECTOR_NAME,
+                limit=limit,
+                with_payload=True,
+            )
+        if mode == "prefilter":
+            # cheap lexical candidate set, re-scored with the dense vectors
+            return await self.__qdrant_client.query_points(
+                collection_name=collection_name,
+                prefetch=Prefetch(query=sparse_query, using=settings.SPARSE_VECTOR_NAME, limit=prefetch_limit),
+                query=await self._dense_query(query),
+                using=settings.DENSE_VECTOR_NAME,
+                limit=limit,
+                with_payload=True,
+            )
+        return await self.__qdrant_client.query_points(
+            collection_name=collection_name,
+            prefetch=[
+                Prefetch(query=sparse_query, using=settings.SPARSE_VECTOR_NAME, limit=prefetch_limit),
+                Prefetch(**await self._dense_stage(collection_name, await self._dense_query(query), prefetch_limit), limit=prefetch_limit),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+        )
@@ -0,0 +1,143 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from config.config import settings
+from app.controllers.chat_controller import ChatController
+from app.controllers.search_controller import SearchController
+from app.utils.conversation_store import ConversationStore
+from app.utils.response_cache import ResponseCache
+from typing import List
+import logging
+import asyncio
+
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below so it can replace the original turns as context. "
+    "Keep every talk title, date, place, name and fact that was asked about or answered. "
+    "Answer with the summary only."
+)
+
+CONTEXT_PROMPT = (
+    "Answer using the transcript excerpts below where they are relevant. "
+    "Say so when they do not contain the answer."
+)
+
+
+class SessionController:
+    # background summaries are kept referenced until they finish
+    _summary_tasks: set[asyncio.Task] = set()
+
+    def __init__(self, redis_client, response_cache: ResponseCache | None = None, search_controller: SearchController | None = None) -> None:
+        self.__redis_client = redis_client
+        self.__conversation_store = ConversationStore(redis_client)
+        self.__response_cache = response_cache
+        self.__search_controller = search_controller
+        self.__logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def estimate_tokens(message: dict) -> int:
+        # chars per token is close enough for budgeting without loading a tokenizer
+        return int(len(message.get("content", "")) / settings.CHARS_PER_TOKEN) + 4
+
+    def _context_budget(self, model: str) -> int:
+        budget = settings.MODEL_CONTEXT_BUDGETS.get(model, settings.DEFAULT_CONTEXT_BUDGET)
+        return max(budget - settings.CONTEXT_RESPONSE_RESERVE, 0)
+
+    def _assemble_context(self, meta: dict, turns: List[dict], new_turn: dict, excerpts: List[dict] | None = None) -> tuple[List[dict], int]:
+        head = []
+        if meta.get("system_prompt"):
+            head.append({"role": "system", "content": meta["system_prompt"]})
+        if meta.get("summary"):
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{meta['summary']}"})
+        if excerpts:
+            context = "\n\n".join(
+                f"[{i}] {(r.get('payload') or {}).get('document', '')}\n{(r.get('payload') or {}).get('text', '')}"
+                for i, r in enumerate(excerpts, start=1)
+            )
+            head.append({"role": "system", "content": f"{CONTEXT_PROMPT}\n\n{context}"})
+
+        used = sum(self.estimate_tokens(m) for m in head) + self.estimate_tokens(new_turn)
+        budget = self._context_budget(meta["model"])
+
+        first_kept = len(turns)
+        for i in range(len(turns) - 1, meta["summarized_turns"] - 1, -1):
+            cost = self.estimate_tokens(turns[i])
+            if used + cost > budget:
+                break
+            used += cost
+            first_kept = i
+
+        return head + turns[first_kept:] + [new_turn], first_kept
+
+    async def _summarize(self, session_id: str, meta: dict, turns: List[dict], summarize_until: int):
+        lock_key = f"{ConversationStore.SESSION_PREFIX}{session_id}:summarizing"
+        if not await self.__redis_client.set(lock_key, 1, nx=True, ex=settings.SUMMARY_LOCK_TTL):
+            return
+
+        try:
+            transcript = "\n".join(
+                f"{turn['role']}: {turn['content']}" for turn in turns[meta["summarized_turns"]:summarize_until]
+            )
+            if meta.get("summary"):
+                transcript = f"Earlier summary:\n{meta['summary']}\n\n{transcript}"
+
+            chat_controller = ChatController(model=settings.SUMMARY_MODEL or meta["model"])
+            chat_controller.messages = [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ]
+            summary = await chat_controller.complete()
+            await self.__conversation_store.set_summary(session_id, summary.strip(), summarize_until)
+            self.__logger.info(f"Compacted {summarize_until} turns of conversation {session_id}")
+        except Exception as e:
+            self.__logger.error(f"Error while summarizing conversation {session_id}: {e}")
+        finally:
+            await self.__redis_client.delete(lock_key)
+
+    async def create_session(self, model: str, system_prompt: str | None = None) -> dict:
+        session_id = await self.__conversation_store.create(model, system_prompt)
+        return {"session_id": session_id, "model": model}
+
+    async def get_session(self, session_id: str) -> dict:
+        meta, turns = await self.__conversation_store.get(session_id)
+        return {
+            "session_id": session_id,
+            "model": meta["model"],
+            "summary": meta.get("summary", ""),
+            "summarized_turns": meta["summarized_turns"],
+            "turns": turns,
+        }
+
+    async def delete_session(self, session_id: str):
+        await self.__conversation_store.delete(session_id)
+
+    async def _retrieve(self, content: str, collection_name: str) -> List[dict]:
+        if self.__search_controller is None:
+            raise ValueError("Retrieval is not available for chat sessions")
+        # with reranking on, only the few chunks the cross-encoder ranks highest reach the prompt
+        return await self.__search_controller.search(content, collection_name, limit=settings.RAG_CONTEXT_CHUNKS)
+
+    async def send_message(self, session_id: str, content: str, request: Request | None = None, stream_format: str = "text", collection_name: str | None = None) -> StreamingResponse | ValueError:
+        meta, turns = await self.__conversation_store.get(session_id)
+        new_turn = {"role": "user", "content": content}
+        # excerpts go into this request's prompt only, the stored turn stays the user's message
+        excerpts = await self._retrieve(content, collection_name) if collection_name else None
+        messages, first_kept = self._assemble_context(meta, turns, new_turn, excerpts)
+
+        if first_kept > meta["summarized_turns"] and settings.CONTEXT_COMPACTION == "summarize":
+            # compacting off the request path keeps time to first token flat,
+            # this turn is answered with the older summary, without the dropped turns
+            task = asyncio.create_task(self._summarize(session_id, meta, turns, first_kept))
+            self._summary_tasks.add(task)
+            task.add_done_callback(self._summary_tasks.discard)
+
+        async def on_complete(answer: str):
+            await self.__conversation_store.append_turns(session_id, [new_turn, {"role": "assistant", "content": answer}])
+
+        chat_controller = ChatController(
+            model=meta["model"],
+            response_cache=self.__response_cache,
+            on_complete=on_complete,
+            client_id=request.client.host if request is not None and request.client else "anonymous",
+        )
+        chat_controller.messages = messages
+        return await chat_controller.stream_chat(request=request, stream_format=stream_format)
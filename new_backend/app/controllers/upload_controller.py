@@ -1,40 +1,67 @@
 from starlette.datastructures import Headers
 from fastapi import UploadFile
 from fastapi.datastructures import UploadFile as UploadFileDatastructure
-from qdrant_client.http.models import VectorParams, Distance
 from tempfile import SpooledTemporaryFile
-from typing import List, BinaryIO, cast
+from typing import AsyncIterator, Awaitable, Callable, List, BinaryIO, Sequence, cast
 from pathlib import Path
+from qdrant_client.http.models import PointStruct
+from redis.client import NEVER_DECODE
 from config.config import settings
 from app.clients.qdrant_client import QuadrantClient
-from app.clients.redis_client import RedisClient
 from app.utils.file_processing_pipeline import FileProcessingPipeline
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils.embedding_archive import EmbeddingArchive
+from app.utils.admission_controller import AdmissionController
+from app.utils.upload_progress import UploadProgress
+from app.utils.chunk_janitor import ChunkJanitor
+from app.utils.vector_projection import ProjectionStore
+from app.utils.chunk_codec import DecompressedSizeExceededError, decode_stream, negotiate
 from app.models.uploading import ChunkedUploadMetadata, ChunkDataInfo
 from app.utils.CustomHTTPException import CustomHTTPException
+from app.utils.tracing import tracer, session_span, end_session
+from app.utils.serialization import pack_model, unpack_model
+from app.utils.collection_catalog import CollectionCatalog
+from app.utils.text_store import TextStore
 import uuid
+import base64
 import asyncio
 import aiofiles
 import math
+import time
 import os
 
 
 class UploadController:
-    def __init__(self) -> None:
-        self.__qdrant_client = QuadrantClient().client
-        self.__redis_client = RedisClient().client
-        self.__file_processing_pipeline = FileProcessingPipeline()
+    
+    def __init__(
+        self,
+        qdrant_client,
+        redis_client,
+        file_processing_pipeline: FileProcessingPipeline,
+        admission_controller: AdmissionController,
+        upload_progress: UploadProgress,
+        chunk_janitor: ChunkJanitor,
+        projection_store: ProjectionStore,
+        collection_catalog: CollectionCatalog,
+        text_store: TextStore,
+        embedding_archive: EmbeddingArchive | None = None,
+    ) -> None:
+        self.__qdrant_client = qdrant_client
+        self.__redis_client = redis_client
+        self.__file_processing_pipeline = file_processing_pipeline
         self.__processable_file_types = [".txt"]
-        self.__upload_locks: dict[str, asyncio.Lock] = {}
-        self.__upload_locks_lock = asyncio.Lock()
-        self.__chunks_location = Path("/tmp/upload")
+        self.__admission_controller = admission_controller
+        self.__upload_progress = upload_progress
+        self.__chunk_janitor = chunk_janitor
+        self.__projection_store = projection_store
+        self.__collection_catalog = collection_catalog
+        self.__chunks_location = self.__chunk_janitor.root
+        self.__embedding_archive = embedding_archive
+        self.__text_store = text_store
         
     def _scan_for_non_uploaded_chunks(self, metadata: ChunkedUploadMetadata):
-        missing_chunk_indexs = []
-        for i, cm in enumerate(metadata.chunk_metadata):
-            if cm.chunk_index != i:
-                missing_chunk_indexs.append(i)
-                
-        return missing_chunk_indexs
+        received = {cm.chunk_index for cm in metadata.chunk_metadata}
+        return [i for i in range(metadata.total_chunks) if i not in received]
         
     def _merge_chunks(self, file_extention: str, chunks_dir: str, merged_file_name = None, block_size: int = settings.MERGING_CHUNK_SIZE):
         if merged_file_name is None:
@@ -63,16 +90,59 @@ class UploadController:
                         merged_file.write(block)
         return merged_path
         
-    async def _get_upload_lock(self, upload_id) -> asyncio.Lock:
-        async with self.__upload_locks_lock:
-            if upload_id not in self.__upload_locks:
-                self.__upload_locks[upload_id] = asyncio.Lock()
-            return self.__upload_locks[upload_id]
+    @staticmethod
+    def _chunks_key(redis_uuid: str) -> str:
+        return f"{redis_uuid}:chunks"
+    
+    @staticmethod
+    def _received_bytes_key(redis_uuid: str) -> str:
+        return f"{redis_uuid}:received_bytes"
+    
+    async def _load_metadata(self, redis_uuid: str, with_chunks: bool = False) -> ChunkedUploadMetadata | None:
+        """
+        The session metadata, written once at init. Received chunks are fields
+        of a Redis hash and their bytes a counter next to it, so chunks landing
+        on different workers never rewrite the same value; `with_chunks` reads
+        them back into chunk_metadata and received_bytes.
+        """
+        # session state is msgpack, read as bytes past the client's response decoding
+        if not with_chunks:
+            redis_data = await self.__redis_client.execute_command("GET", redis_uuid, **{NEVER_DECODE: True})
+            return unpack_model(ChunkedUploadMetadata, redis_data) if redis_data else None
+        
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.execute_command("GET", redis_uuid, **{NEVER_DECODE: True})
+        pipe.execute_command("HGETALL", self._chunks_key(redis_uuid), **{NEVER_DECODE: True})
+        pipe.get(self._received_bytes_key(redis_uuid))
+        redis_data, chunks, received_bytes = await pipe.execute()
+        if not redis_data:
+            return None
         
-    def _existing_collection(self, collection_name: str, redis_uuid: str):
-        collection_exists = self.__qdrant_client.collection_exists(collection_name + "_" + redis_uuid)
+        metadata = unpack_model(ChunkedUploadMetadata, redis_data)
+        # sessions started before chunks were kept in the hash still carry them in the metadata
+        recorded = {cm.chunk_index: cm for cm in metadata.chunk_metadata}
+        for data in (chunks or {}).values():
+            info = unpack_model(ChunkDataInfo, data)
+            recorded[info.chunk_index] = info
+        metadata.chunk_metadata = [recorded[i] for i in sorted(recorded)]
+        metadata.received_bytes += int(received_bytes or 0)
+        return metadata
+    
+    async def _delete_session(self, redis_uuid: str):
+        await self.__redis_client.delete(redis_uuid, self._chunks_key(redis_uuid), self._received_bytes_key(redis_uuid))
+    
+    @staticmethod
+    async def _single_block(data: bytes) -> AsyncIterator[bytes]:
+        yield data
+        
+    async def _existing_collection(self, collection_name: str, redis_uuid: str):
+        # answered from the catalog, this runs for every chunk
+        collection_exists = await self.__collection_catalog.exists(collection_name)
         if collection_exists:
-            self.__redis_client.delete(redis_uuid)
+            # the session is abandoned, its disk and backlog shares go with it
+            await self._delete_session(redis_uuid)
+            await self.__chunk_janitor.release(redis_uuid)
+            await self.__admission_controller.release(redis_uuid)
         return collection_exists
         
     def _create_upload_file(self, file_path: str) -> UploadFileDatastructure:
@@ -91,21 +161,77 @@ class UploadController:
     
         return upload_file
     
-    async def upload_files_to_qdrant(self, files: List[UploadFile]):
-        for f in files:
-            await self.upload_file_to_qdrant(f)
+    async def delete_collection(self, collection_name: str) -> dict:
+        """Deletes a collection with everything kept for it next to the vector store; its embedding archive stays as a backup."""
+        if not await self.__collection_catalog.exists(collection_name, verify_missing=True):
+            raise ValueError(f"Collection {collection_name} does not exist")
+        
+        points = (await self.__qdrant_client.count(collection_name=collection_name, exact=False)).count
+        await self.__qdrant_client.delete_collection(collection_name)
+        await self.__collection_catalog.remove(collection_name)
+        
+        # the text store may hold documents written while it was enabled
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.__text_store.delete, collection_name)
+        await self.__projection_store.delete(collection_name)
+        if self.__file_processing_pipeline.sparse_vectorizer is not None:
+            await self.__file_processing_pipeline.sparse_vectorizer.delete(collection_name)
+        
+        return {"collection": collection_name, "points": points}
     
-    async def upload_file_to_qdrant(self, file: UploadFile):
+    async def upload_files_to_qdrant(self, files: List[UploadFile], client_id: str = "anonymous") -> List[dict]:
+        # raises AdmissionRejectedError before any work is queued
+        admission_key = str(uuid.uuid4())
+        await self.__admission_controller.admit(admission_key, client_id, sum(f.size or 0 for f in files))
+        
+        # files are ingested concurrently, their chunks share encode calls and
+        # one file's upsert runs while the next file is still being embedded
+        embedding_batcher = EmbeddingBatcher(self.__file_processing_pipeline)
+        semaphore = asyncio.Semaphore(settings.INGEST_FILE_CONCURRENCY)
+        
+        async def ingest(file: UploadFile) -> dict:
+            async with semaphore:
+                try:
+                    result = await self.upload_file_to_qdrant(file, embed=embedding_batcher.embed)
+                    return {"file": file.filename, "status": "ok", **result}
+                except Exception as e:
+                    return {"file": file.filename, "status": "failed", "error": str(e)}
+        
+        try:
+            return await asyncio.gather(*(ingest(f) for f in files))
+        finally:
+            await embedding_batcher.close()
+            await self.__admission_controller.release(admission_key)
+    
+    async def _upsert_points(self, collection_name: str, points: List[PointStruct], batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE):
+        # large files are split into bounded gRPC messages that are sent concurrently
+        semaphore = asyncio.Semaphore(settings.QDRANT_UPSERT_CONCURRENCY)
+        
+        async def upsert(batch: List[PointStruct]):
+            async with semaphore:
+                await self.__qdrant_client.upsert(collection_name=collection_name, points=batch, wait=True)
+        
+        await asyncio.gather(*(upsert(points[i:i + batch_size]) for i in range(0, len(points), batch_size)))
+    
+    @property
+    def upload_progress(self) -> UploadProgress:
+        return self.__upload_progress
+    
+    async def upload_file_to_qdrant(self, file: UploadFile, embed: Callable[[List[str]], Awaitable] | None = None, on_stage: Callable[[str], Awaitable] | None = None) -> dict:
         if file.filename is None:
             raise ValueError("Uploaded file must have a filename")
         if Path(file.filename).suffix not in self.__processable_file_types:
             raise ValueError("Filetype currently not processable")
         file_collection_name = Path(file.filename).stem
         
+        if on_stage is not None:
+            await on_stage("embedding")
         try:
-            vec_points = await self.__file_processing_pipeline.process_txt_file(file)
+            vec_points = await self.__file_processing_pipeline.process_txt_file(file, embed=embed)
         except Exception as e:
             raise ValueError(f"error occured wile processing file: {e}")
+        if on_stage is not None:
+            await on_stage("storing")
         
         embedding_model = self.__file_processing_pipeline.embedding_model
         dimension = embedding_model.get_sentence_embedding_dimension()
@@ -113,20 +239,51 @@ class UploadController:
         if dimension is None:
             raise ValueError("Model embedding dimension is None.")
         
-        self.__qdrant_client.create_collection(
-            collection_name=file_collection_name,
-            vectors_config=VectorParams(
-                size=dimension,
-                distance=Distance.COSINE,
-            ),
-        )
+        small_dimension = None
+        projection = None
+        if settings.SMALL_VECTORS_ENABLED and vec_points:
+            # the projection is fitted on this collection's own embeddings and kept for its queries
+            projection = await self.__projection_store.get_or_fit(
+                file_collection_name, [point.vector[settings.DENSE_VECTOR_NAME] for point in vec_points]
+            )
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, projection.attach, vec_points)
+            small_dimension = projection.dimension
         
-        self.__qdrant_client.upsert(
-            collection_name=file_collection_name,
-            points=vec_points
+        with tracer.start_as_current_span("qdrant.store", attributes={"collection": file_collection_name, "points": len(vec_points)}):
+            await self.__qdrant_client.create_collection(
+                collection_name=file_collection_name,
+                **QuadrantClient.collection_config(
+                    dimension,
+                    sparse=self.__file_processing_pipeline.sparse_vectorizer is not None,
+                    small_dimension=small_dimension,
+                ),
+            )
+            
+            sparse_vectorizer = self.__file_processing_pipeline.sparse_vectorizer
+            texts = [point.payload["text"] for point in vec_points] if sparse_vectorizer is not None else []
+            # externalize replaces the payloads, the archive keeps the full ones so it does not depend on this host's text store
+            archived_points = [point.copy() for point in vec_points] if self.__embedding_archive is not None else None
+            if settings.TEXT_STORE_ENABLED:
+                # after the collection was created, a name that is taken must not get a second document
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.__text_store.externalize, file_collection_name, vec_points)
+            await self._upsert_points(file_collection_name, vec_points)
+            if sparse_vectorizer is not None:
+                await sparse_vectorizer.record_documents(file_collection_name, texts)
+        await self.__collection_catalog.add(
+            file_collection_name,
+            len(vec_points),
+            document={"source": file.filename, "chunks": len(vec_points), "created_at": time.time()},
         )
+        
+        if self.__embedding_archive is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: self.__embedding_archive.write_block(file_collection_name, archived_points, projection=projection))
+        
+        return {"collection": file_collection_name, "chunks": len(vec_points)}
 
-    async def chunked_upload_init(self, file_name: str, file_size: int, chunk_size: int, total_chunks: int, content_type: str):
+    async def chunked_upload_init(self, file_name: str, file_size: int, chunk_size: int, total_chunks: int, content_type: str, client_id: str = "anonymous", accept_encoding: Sequence[str] = ("identity",)):
         
         metadata = ChunkedUploadMetadata(
             file_name=file_name,
@@ -135,6 +292,8 @@ class UploadController:
             total_chunks=total_chunks,
             content_type=content_type,
             chunk_metadata=[],
+            encoding=negotiate(accept_encoding),
+            started_at=time.time(),
         )
         
         if file_size > settings.MAX_FILESIZE:
@@ -143,82 +302,168 @@ class UploadController:
         if chunk_size > settings.MAX_CHUNK_SIZE:
             raise ValueError(f"Chunk size exceeds the limit.")
 
+        if await self.__collection_catalog.exists(Path(file_name).stem):
+            raise ValueError(f"Existing collection {Path(file_name).stem}")
+
+        session_id = str(uuid.uuid4())
+        # raises StorageQuotaExceededError when open uploads already fill the chunk store
+        await self.__chunk_janitor.reserve(session_id, file_size, ttl=settings.CHUNK_TTL)
+
+        # the session's share of the backlog is held until it completes or its chunks expire
         try:
-            session_id = str(uuid.uuid4())
-            await self.__redis_client.set(session_id, metadata.json(), ex=settings.CHUNK_TTL)
-        except Exception as e:
-            raise ValueError(f"Redis Error: {str(e)}")
+            await self.__admission_controller.admit(session_id, client_id, file_size, ttl=settings.CHUNK_TTL)
+        except Exception:
+            await self.__chunk_janitor.release(session_id)
+            raise
+
+        # the session id is the trace id, every later request of this upload joins the same trace
+        with session_span("upload.init", session_id, **{"file.size": file_size, "chunks.total": total_chunks}):
+            try:
+                await self.__redis_client.set(session_id, pack_model(metadata), ex=settings.CHUNK_TTL)
+                await self.__upload_progress.start(session_id, total_chunks)
+            except Exception as e:
+                await self.__admission_controller.release(session_id)
+                await self.__chunk_janitor.release(session_id)
+                raise ValueError(f"Redis Error: {str(e)}")
 
         return {
                 "metadata": metadata.dict(), 
-                "redis_uuid": session_id
+                "redis_uuid": session_id,
+                "encoding": metadata.encoding,
         }
     
-    async def process_chunk(self, chunk_data: bytes, chunk_index: int, redis_uuid: str):
+    async def _write_chunk(self, chunk_stream: AsyncIterator[bytes], encoding: str, limit: int, part_path: Path) -> int:
+        # decompressed while received, a chunk that outgrows the limit is cut off and never lands on disk
+        size = 0
+        try:
+            async with aiofiles.open(part_path, "wb") as f:
+                async for block in decode_stream(encoding, chunk_stream, limit):
+                    await f.write(block)
+                    size += len(block)
+        except Exception:
+            part_path.unlink(missing_ok=True)
+            raise
+        return size
+    
+    async def process_chunk(self, chunk_data: bytes | AsyncIterator[bytes], chunk_index: int, redis_uuid: str):
+        with session_span("upload.chunk", redis_uuid, **{"chunk.index": chunk_index}):
+            return await self._process_chunk(chunk_data, chunk_index, redis_uuid)
+    
+    async def _process_chunk(self, chunk_data: bytes | AsyncIterator[bytes], chunk_index: int, redis_uuid: str):
         
-        upload_lock = await self._get_upload_lock(chunk_index)
+        metadata = await self._load_metadata(redis_uuid)
+        if metadata is None:
+            raise ValueError("Upload session not found")
         
-        async with upload_lock:
-
-            redis_data = await self.__redis_client.get(redis_uuid)
-            metadata = ChunkedUploadMetadata.parse_raw(redis_data)
-            
-            collection_name = Path(metadata.file_name).stem
-            if self._existing_collection(collection_name, redis_uuid):
-                raise ValueError(f"Existing collection {collection_name}")
-
-            try:
-                upload_dir = self.__chunks_location / f"{collection_name}_{redis_uuid}"
-                upload_dir.mkdir(parents=True, exist_ok=True)
-
-                chunk_path = upload_dir / f"chunk_{chunk_index}.txt"
-                async with aiofiles.open(chunk_path, "wb") as f:
-                    await f.write(chunk_data)
+        if not 0 <= chunk_index < metadata.total_chunks:
+            raise ValueError(f"Chunk index {chunk_index} out of range, upload has {metadata.total_chunks} chunks")
+        
+        collection_name = Path(metadata.file_name).stem
+        if await self._existing_collection(collection_name, redis_uuid):
+            raise ValueError(f"Existing collection {collection_name}")
+        
+        if isinstance(chunk_data, bytes):
+            if metadata.encoding != "identity":
+                # compressed chunks sent inside JSON are base64 text
+                chunk_data = base64.b64decode(chunk_data)
+            chunk_stream = self._single_block(chunk_data)
+        else:
+            chunk_stream = chunk_data
+        
+        # chunks are written before they are claimed, so a slow chunk does not hold up the others
+        upload_dir = self.__chunks_location / f"{collection_name}_{redis_uuid}"
+        chunk_path = upload_dir / f"chunk_{chunk_index}.txt"
+        part_path = upload_dir / f"part_{chunk_index}_{uuid.uuid4().hex}"
+        try:
+            upload_dir.mkdir(parents=True, exist_ok=True)
+            size = await self._write_chunk(chunk_stream, metadata.encoding, min(metadata.chunk_size, settings.MAX_CHUNK_SIZE), part_path)
+        except DecompressedSizeExceededError:
+            raise
+        except (ValueError, OSError) as e:
+            # anything else, e.g. a body cut off by the content length limit, reaches the route as is
+            raise ValueError(f"Error saving chunk: {str(e)}")
+        
+        # chunks of one upload may land on different workers, each chunk index
+        # is claimed with one HSETNX, its bytes are added with one INCRBY
+        chunks_key = self._chunks_key(redis_uuid)
+        received_bytes_key = self._received_bytes_key(redis_uuid)
+        info = ChunkDataInfo(chunk_index=chunk_index, file_path=str(chunk_path), size=size)
+        try:
+            pipe = self.__redis_client.pipeline(transaction=True)
+            pipe.hsetnx(chunks_key, str(chunk_index), pack_model(info))
+            pipe.expire(chunks_key, settings.CHUNK_TTL)
+            claimed, _ = await pipe.execute()
+        except Exception as e:
+            part_path.unlink(missing_ok=True)
+            raise ValueError(f"Redis Error: {str(e)}")
+        if not claimed:
+            part_path.unlink(missing_ok=True)
+            return {
+                "message": f"Chunk {chunk_index} already uploaded.",
+                "payload": {"ignore": True}
+            }
 
-            except Exception as e:
-                raise ValueError(f"Error saving chunk: {str(e)}")
+        counted = False
+        try:
+            pipe = self.__redis_client.pipeline(transaction=True)
+            pipe.incrby(received_bytes_key, size)
+            pipe.expire(received_bytes_key, settings.CHUNK_TTL)
+            received_bytes, _ = await pipe.execute()
+            counted = True
 
-            if any(cm.chunk_index == chunk_index for cm in metadata.chunk_metadata):
-                return {
-                    "message": f"Chunk {chunk_index} already uploaded.",
-                    "payload": {"ignore": True}
-                }
+            # the limits apply to what is written, not to what was sent
+            file_limit = min(metadata.file_size, settings.MAX_FILESIZE)
+            if metadata.received_bytes + received_bytes > file_limit:
+                raise DecompressedSizeExceededError(f"Decompressed upload exceeds {file_limit} bytes")
 
-            metadata.chunk_metadata.append(
-                ChunkDataInfo(chunk_index=chunk_index, file_path=str(chunk_path))
-            )
+            os.replace(part_path, chunk_path)
+        except Exception:
+            # the claim is given back, so the chunk can be sent again
+            pipe = self.__redis_client.pipeline(transaction=False)
+            pipe.hdel(chunks_key, str(chunk_index))
+            if counted:
+                pipe.decrby(received_bytes_key, size)
+            await pipe.execute()
+            part_path.unlink(missing_ok=True)
+            raise
 
-            try:
-                await self.__redis_client.set(redis_uuid, metadata.json(), ex=settings.CHUNK_TTL)
-            except Exception as e:
-                raise ValueError(f"Redis Error: {str(e)}")
-    
-    async def chunked_chunking_status(self, redis_uuid: str):
-        
-        try: 
-            redis_data = await self.__redis_client.get(redis_uuid)
-            metadata = ChunkedUploadMetadata.parse_raw(redis_data)
-
-            is_complete = len(metadata.chunk_metadata) == metadata.total_chunks
-            
+        try:
+            await self.__chunk_janitor.consume(redis_uuid, size)
+            await self.__redis_client.expire(redis_uuid, settings.CHUNK_TTL)
+            await self.__upload_progress.chunk_received(redis_uuid, chunk_index)
         except Exception as e:
             raise ValueError(f"Redis Error: {str(e)}")
+    
+    async def chunked_chunking_status(self, redis_uuid: str):
+        # compact progress instead of the full chunk metadata, its size no longer grows with the upload
+        with session_span("upload.status", redis_uuid):
+            try: 
+                progress = await self.__upload_progress.snapshot(redis_uuid)
+            except Exception as e:
+                raise ValueError(f"Redis Error: {str(e)}")
         
         return {
-                "metadata": metadata.dict(), 
-                "progress_percentage": len(metadata.chunk_metadata) / metadata.total_chunks,
-                "is_complete": is_complete
+                **progress,
+                "progress_percentage": progress["received"] / progress["total"] if progress["total"] else 1.0,
+                "is_complete": progress["received"] == progress["total"]
         }    
     
     async def complete_chunked_upload(self, redis_uuid: str):
+        with session_span("upload.complete", redis_uuid):
+            return await self._complete_chunked_upload(redis_uuid)
+    
+    async def _complete_chunked_upload(self, redis_uuid: str):
         retries = 0
 
-        redis_data = await self.__redis_client.get(redis_uuid)
-        if not redis_data:
+        metadata = await self._load_metadata(redis_uuid, with_chunks=True)
+        if metadata is None:
             raise ValueError("Upload session not found")
-
-        metadata = ChunkedUploadMetadata.parse_raw(redis_data)
-
+        
+        async def on_stage(stage: str):
+            await self.__upload_progress.set_stage(redis_uuid, stage)
+        
+        # missing chunks leave the session as it is, the client resends them and
+        # completes again; an abandoned session is reclaimed after CHUNK_TTL
         while len(metadata.chunk_metadata) != metadata.total_chunks:
             if retries > settings.MAX_RETRIES:
                 raise ValueError("all retries failed, data not fully uploaded")
@@ -227,26 +472,34 @@ class UploadController:
             try:
                 delay = math.factorial(retries)
                 await asyncio.sleep(delay)
-                redis_data = await self.__redis_client.get(redis_uuid)
-                metadata = ChunkedUploadMetadata.parse_raw(redis_data)
+                metadata = await self._load_metadata(redis_uuid, with_chunks=True)
+                if metadata is None:
+                    raise ValueError("Upload session not found")
             except Exception as e:
                 return {
                     "message": f"Error during retry {retries}: {str(e)}",
                     "payload": {"missing_indexes": missing_indexs}
                 }
         
-            try:
-                chunks_dir = str(self.__chunks_location / f"{Path(metadata.file_name).stem}_{redis_uuid}")
-                ext = metadata.file_name.split(".")[-1]
-                merged_chunks_file_path = self._merge_chunks(file_extention=ext, chunks_dir=chunks_dir)
-                result = await self.upload_file_to_qdrant(self._create_upload_file(merged_chunks_file_path))
-
-                for chunk in metadata.chunk_metadata:
-                    os.remove(chunk.file_path)
-                os.remove(merged_chunks_file_path)
-
-                await self.__redis_client.delete(redis_uuid)
+        chunks_dir = self.__chunks_location / f"{Path(metadata.file_name).stem}_{redis_uuid}"
+        # from here on the session ends in the finally below, whichever way it ends
+        try:
+            await on_stage("merging")
+            ext = metadata.file_name.split(".")[-1]
+            with tracer.start_as_current_span("upload.merge", attributes={"chunks.total": metadata.total_chunks}):
+                merged_chunks_file_path = self._merge_chunks(file_extention=ext, chunks_dir=str(chunks_dir))
+            result = await self.upload_file_to_qdrant(self._create_upload_file(merged_chunks_file_path), on_stage=on_stage)
+            await on_stage("done")
+            end_session(redis_uuid, metadata.started_at, file_name=metadata.file_name, chunks=result["chunks"])
 
-                return result
-            except Exception as e:
-                raise ValueError(f"Processing error: {str(e)}")
+            return result
+        except Exception as e:
+            await self.__upload_progress.set_stage(redis_uuid, "failed", error=str(e))
+            end_session(redis_uuid, metadata.started_at, error=str(e), file_name=metadata.file_name)
+            raise ValueError(f"Processing error: {str(e)}")
+        finally:
+            # a failed merge or ingestion cannot be resumed, its chunks and merged file go as well
+            await self.__chunk_janitor.remove(chunks_dir)
+            await self.__chunk_janitor.release(redis_uuid)
+            await self._delete_session(redis_uuid)
+            await self.__admission_controller.release(redis_uuid)
@@ -0,0 +1,177 @@
+from fastapi import FastAPI, Depends
+from starlette.requests import HTTPConnection
+from contextlib import asynccontextmanager
+from config.config import settings
+from app.clients.qdrant_client import QuadrantClient
+from app.clients.redis_client import RedisClient
+from app.controllers.upload_controller import UploadController
+from app.controllers.search_controller import SearchController
+from app.controllers.session_controller import SessionController
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from app.utils.sparse_vectorizer import SparseVectorizer
+from app.utils.response_cache import ResponseCache
+from app.utils.llm_scheduler import UpstreamScheduler
+from app.utils.chunk_janitor import ChunkJanitor
+from app.utils.collection_catalog import CollectionCatalog
+from app.utils.admission_controller import AdmissionController
+from app.utils.upload_progress import UploadProgress
+from app.utils.vector_projection import ProjectionStore
+from app.utils.embedding_archive import EmbeddingArchive
+from app.utils.text_store import TextStore
+from app.utils.reranker import CrossEncoderReranker
+from app.utils.tracing import setup_tracing, shutdown_tracing
+from app.utils.metrics import metrics
+import logging
+import asyncio
+import time
+
+
+controller_setup = metrics.histogram(
+    "controller_setup_seconds",
+    "Time spent building a request's controller from the shared resources",
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0),
+)
+
+
+class AppResources:
+    """
+    Clients and models shared by every request of one process.
+
+    Created once in the app lifespan: one Redis connection pool, one Qdrant
+    client, one embedding model and one of each helper that keeps per-process
+    state (embedding slots, caches, usage counters), so requests only build
+    thin controllers around them.
+    """
+
+    def __init__(self) -> None:
+        self.redis_client = RedisClient().client
+        self.qdrant_client = QuadrantClient().async_client
+        self.admission_controller = AdmissionController(self.redis_client)
+        self.file_processing_pipeline = FileProcessingPipeline(
+            sparse_vectorizer=SparseVectorizer(self.redis_client) if settings.SPARSE_VECTORS_ENABLED else None,
+            admission_controller=self.admission_controller,
+        )
+        self.response_cache = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                self.redis_client,
+                file_processing_pipeline=self.file_processing_pipeline if settings.SEMANTIC_CACHE_ENABLED else None,
+            )
+        self.chunk_janitor = ChunkJanitor(self.redis_client)
+        self.collection_catalog = CollectionCatalog(self.redis_client, self.qdrant_client)
+        self.upload_progress = UploadProgress(self.redis_client)
+        self.projection_store = ProjectionStore(self.redis_client)
+        # the text store is read by searches and emptied on delete even when new uploads do not use it
+        self.text_store = TextStore()
+        self.embedding_archive = EmbeddingArchive(settings.EMBEDDING_ARCHIVE_DIR) if settings.EMBEDDING_ARCHIVE_DIR else None
+        # a collection deleted by any process is dropped from this process's caches
+        self.collection_catalog.on_removed(self.projection_store.forget)
+        self.collection_catalog.on_removed(self.text_store.forget)
+        self.reranker = CrossEncoderReranker() if settings.RERANKER_ENABLED else None
+        self.__janitor_task: asyncio.Task | None = None
+        self.__catalog_task: asyncio.Task | None = None
+        self.__invalidation_task: asyncio.Task | None = None
+        self.__logger = logging.getLogger(__name__)
+
+    async def load(self):
+        # the model is loaded before the first request instead of by it
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: self.file_processing_pipeline.embedding_model)
+        if self.reranker is not None:
+            await loop.run_in_executor(None, CrossEncoderReranker.preload_model)
+        self.__janitor_task = asyncio.create_task(self.chunk_janitor.run())
+        self.__catalog_task = asyncio.create_task(self.collection_catalog.run())
+        self.__invalidation_task = asyncio.create_task(self.collection_catalog.listen())
+        self.__logger.info("Shared resources ready")
+
+    async def close(self):
+        for task in (self.__janitor_task, self.__catalog_task, self.__invalidation_task):
+            if task is not None:
+                task.cancel()
+        # every client is closed even if one of them fails to
+        try:
+            await self.redis_client.aclose()
+        finally:
+            try:
+                await self.qdrant_client.close()
+            finally:
+                try:
+                    await UpstreamScheduler.close()
+                finally:
+                    CrossEncoderReranker.shutdown()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.TRACING_ENABLED:
+        setup_tracing()
+    resources = AppResources()
+    await resources.load()
+    app.state.resources = resources
+    try:
+        yield
+    finally:
+        await resources.close()
+        if settings.TRACING_ENABLED:
+            shutdown_tracing()
+
+
+def get_resources(connection: HTTPConnection) -> AppResources:
+    # HTTPConnection rather than Request, so websocket routes can depend on it too
+    return connection.app.state.resources
+
+
+def get_upload_controller(resources: AppResources = Depends(get_resources)) -> UploadController:
+    start = time.perf_counter()
+    controller = UploadController(
+        resources.qdrant_client,
+        resources.redis_client,
+        resources.file_processing_pipeline,
+        admission_controller=resources.admission_controller,
+        upload_progress=resources.upload_progress,
+        chunk_janitor=resources.chunk_janitor,
+        projection_store=resources.projection_store,
+        collection_catalog=resources.collection_catalog,
+        text_store=resources.text_store,
+        embedding_archive=resources.embedding_archive,
+    )
+    controller_setup.observe(time.perf_counter() - start, controller="upload")
+    return controller
+
+
+def _search_controller(resources: AppResources) -> SearchController:
+    return SearchController(
+        resources.qdrant_client,
+        resources.redis_client,
+        resources.file_processing_pipeline,
+        projection_store=resources.projection_store,
+        collection_catalog=resources.collection_catalog,
+        text_store=resources.text_store,
+        reranker=resources.reranker,
+    )
+
+
+def get_search_controller(resources: AppResources = Depends(get_resources)) -> SearchController:
+    start = time.perf_counter()
+    controller = _search_controller(resources)
+    controller_setup.observe(time.perf_counter() - start, controller="search")
+    return controller
+
+
+def get_session_controller(resources: AppResources = Depends(get_resources)) -> SessionController:
+    start = time.perf_counter()
+    controller = SessionController(
+        resources.redis_client,
+        response_cache=resources.response_cache,
+        search_controller=_search_controller(resources),
+    )
+    controller_setup.observe(time.perf_counter() - start, controller="session")
+    return controller
+
+
+def get_collection_catalog(resources: AppResources = Depends(get_resources)) -> CollectionCatalog:
+    return resources.collection_catalog
+
+
+def get_response_cache(resources: AppResources = Depends(get_resources)) -> ResponseCache | None:
+    return resources.response_cache
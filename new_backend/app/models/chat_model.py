@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List
+from config.config import settings
 
 
 class ChatMessage(BaseModel):
@@ -9,3 +10,13 @@ class ChatMessage(BaseModel):
 class LLMChatMessageRequest(BaseModel):
     model: str 
     messages: List[ChatMessage]
+    stream_format: str = "text"
+
+class CreateSessionRequest(BaseModel):
+    model: str = settings.DEFAULT_MODEL
+    system_prompt: str | None = None
+
+class SessionMessageRequest(BaseModel):
+    content: str
+    stream_format: str = "text"
+    collection_name: str | None = None
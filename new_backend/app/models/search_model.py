@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from config.config import settings
+
+
+class SearchRequest(BaseModel):
+    query: str
+    collection_name: str
+    mode: str = "hybrid"
+    limit: int = settings.SEARCH_LIMIT
+    rerank: bool = True
@@ -5,6 +5,7 @@ from datetime import datetime
 class ChunkDataInfo(BaseModel):
     chunk_index: int
     file_path: str
+    size: int = 0
     timestamp: datetime = datetime.utcnow()
 
 class ChunkedUploadMetadata(BaseModel):
@@ -14,6 +15,9 @@ class ChunkedUploadMetadata(BaseModel):
     total_chunks: int
     content_type: str
     chunk_metadata: list[ChunkDataInfo]
+    encoding: str = "identity"
+    received_bytes: int = 0
+    started_at: float = 0.0
     retry: int = 0
     timestamp: datetime = datetime.utcnow()
     
@@ -23,6 +27,7 @@ class UploadInitRequest(BaseModel):
     chunk_size: int
     total_chunks: int
     content_type: str
+    accept_encoding: list[str] = ["identity"]
 
 class UploadChunkRequest(BaseModel):
     chunk_data: bytes
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Depends
+from app.controllers.upload_controller import UploadController
+from app.dependencies import get_collection_catalog, get_upload_controller
+from app.models.messages import SuccessfulMessage
+from app.utils.collection_catalog import CollectionCatalog
+
+
+route = APIRouter(prefix="/api", tags=["collections_router"])
+
+@route.get("/collections")
+async def list_collections(refresh: bool = False, collection_catalog: CollectionCatalog = Depends(get_collection_catalog)):
+    try:
+        entries = await (collection_catalog.refresh() if refresh else collection_catalog.entries())
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error while listing collections: {e}"
+        )
+
+    return SuccessfulMessage(
+        detail=f"{len(entries)} collections",
+        payload={"collections": sorted(entries.values(), key=lambda entry: entry["name"])}
+    )
+
+
+@route.delete("/collections/{collection_name}")
+async def delete_collection(collection_name: str, upload_controller: UploadController = Depends(get_upload_controller)):
+    try:
+        result = await upload_controller.delete_collection(collection_name)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=404,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error while deleting collection: {e}"
+        )
+
+    return SuccessfulMessage(
+        detail=f"deleted {collection_name}",
+        payload=result
+    )
@@ -1,18 +1,66 @@
-from fastapi import APIRouter, Request, HTTPException
-from controllers.chat_controller import ChatController
-from app.models.chat_model import LLMChatMessageRequest
+from fastapi import APIRouter, HTTPException, Request, Depends
+from app.controllers.chat_controller import ChatController
+from app.controllers.session_controller import SessionController
+from app.dependencies import get_response_cache, get_session_controller
+from app.models.chat_model import LLMChatMessageRequest, CreateSessionRequest, SessionMessageRequest
+from app.models.messages import SuccessfulMessage
+from app.utils.response_cache import ResponseCache
 
 
 route = APIRouter(prefix="/api/v1", tags=["llm_router"])
 
 @route.post("/chat/completions")
-async def chat_completion(request: Request):
-    data: LLMChatMessageRequest = await request.json()
-    
-    chat_controller = ChatController(model=data.model)
+async def chat_completion(data: LLMChatMessageRequest, request: Request, response_cache: ResponseCache | None = Depends(get_response_cache)):
+    chat_controller = ChatController(
+        model=data.model,
+        response_cache=response_cache,
+        client_id=request.client.host if request.client else "anonymous",
+    )
     chat_controller.messages = data.messages
     
     try:
-        await chat_controller.stream_chat()
+        return await chat_controller.stream_chat(request=request, stream_format=data.stream_format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error while streaming from llm: {e}")
+
+@route.post("/chat/sessions")
+async def create_session(data: CreateSessionRequest, session_controller: SessionController = Depends(get_session_controller)):
+    try:
+        session = await session_controller.create_session(data.model, data.system_prompt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error while creating chat session: {e}")
+    
+    return SuccessfulMessage(
+        detail="chat session created",
+        payload=session
+    )
+
+@route.get("/chat/sessions/{session_id}")
+async def get_session(session_id: str, session_controller: SessionController = Depends(get_session_controller)):
+    try:
+        session = await session_controller.get_session(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Error while retrieving chat session: {e}")
+    
+    return SuccessfulMessage(
+        detail="chat session retrieved",
+        payload=session
+    )
+
+@route.post("/chat/sessions/{session_id}/messages")
+async def session_message(session_id: str, data: SessionMessageRequest, request: Request, session_controller: SessionController = Depends(get_session_controller)):
+    try:
+        return await session_controller.send_message(
+            session_id, data.content, request=request, stream_format=data.stream_format, collection_name=data.collection_name
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error while streaming from llm: {e}")
+
+@route.delete("/chat/sessions/{session_id}")
+async def delete_session(session_id: str, session_controller: SessionController = Depends(get_session_controller)):
+    try:
+        await session_controller.delete_session(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error while deleting chat session: {e}")
+    
+    return SuccessfulMessage(detail="chat session deleted")
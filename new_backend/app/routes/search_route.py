@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Depends
+from app.controllers.search_controller import SearchController
+from app.dependencies import get_search_controller
+from app.models.messages import SuccessfulMessage
+from app.models.search_model import SearchRequest
+
+
+route = APIRouter(prefix="/api", tags=["search_router"])
+
+@route.post("/search")
+async def search(data: SearchRequest, search_controller: SearchController = Depends(get_search_controller)):
+    try:
+        results = await search_controller.search(data.query, data.collection_name, mode=data.mode, limit=data.limit, rerank=data.rerank)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error while searching: {e}"
+        )
+
+    return SuccessfulMessage(
+        detail=f"retrieved {len(results)} results",
+        payload={"mode": data.mode, "results": results}
+    )
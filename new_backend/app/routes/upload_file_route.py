@@ -1,6 +1,13 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Request
+from fastapi import APIRouter, UploadFile, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from typing import List
 from app.controllers.upload_controller import UploadController
+from app.dependencies import get_upload_controller
+from app.utils.admission_controller import AdmissionRejectedError
+from app.utils.chunk_janitor import StorageQuotaExceededError
+from app.utils.chunk_codec import CODECS, DecompressedSizeExceededError
+from app.utils.sse import format_sse
+import json
 from app.models.messages import SuccessfulMessage
 from app.models.uploading import UploadInitRequest, UploadChunkRequest, UploadStatusRequest, UploadCompleteRequest
 from config.config import settings
@@ -9,16 +16,27 @@ from config.config import settings
 route = APIRouter(prefix="/api", tags=["database_router"])
 
 @route.post("/upload")
-async def upload_files(files: List[UploadFile]):
-    upload_controller = UploadController()
-    
+async def upload_files(files: List[UploadFile], request: Request, upload_controller: UploadController = Depends(get_upload_controller)):
     try:
-        await upload_controller.upload_files_to_qdrant(list(files))
+        results = await upload_controller.upload_files_to_qdrant(list(files), client_id=request.client.host if request.client else "anonymous")
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        HTTPException(
+        raise HTTPException(
             status_code=500,
             detail=f"upload failed: {e}"
         )
+    
+    failed = [r for r in results if r["status"] != "ok"]
+    return SuccessfulMessage(
+        status_code=200 if not failed else 207,
+        detail=f"processed {len(results) - len(failed)} of {len(results)} files",
+        payload={"results": results}
+    )
 
 @route.get("/upload/instr")
 async def upload_instructions():
@@ -28,17 +46,29 @@ async def upload_instructions():
             "max_file_size": settings.MAX_FILESIZE,
             "max_chunk_size": settings.MAX_CHUNK_SIZE,
             "chunk_ttl": settings.CHUNK_TTL,
+            "chunk_encodings": list(CODECS),
         }
     )
 
 @route.post("/upload/init")
-async def upload_init(req: Request):
-    data: UploadInitRequest = await req.json()
-    
-    upload_controller = UploadController()
-    
+async def upload_init(data: UploadInitRequest, request: Request, upload_controller: UploadController = Depends(get_upload_controller)):
     try:
-        init_data = await upload_controller.chunked_upload_init(data.file_name, data.file_size, data.chunk_size, data.total_chunks, data.content_type)
+        init_data = await upload_controller.chunked_upload_init(
+            data.file_name, data.file_size, data.chunk_size, data.total_chunks, data.content_type,
+            client_id=request.client.host if request.client else "anonymous",
+            accept_encoding=data.accept_encoding,
+        )
+    except StorageQuotaExceededError as e:
+        raise HTTPException(
+            status_code=507,
+            detail=str(e)
+        )
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -51,13 +81,14 @@ async def upload_init(req: Request):
     )
 
 @route.post("/upload/chunk")
-async def process_chunk(req: Request):
-    data: UploadChunkRequest = await req.json()
-    
-    upload_controller = UploadController()
-    
+async def process_chunk(data: UploadChunkRequest, upload_controller: UploadController = Depends(get_upload_controller)):
     try:
         process_res = await upload_controller.process_chunk(data.chunk_data, data.chunk_index, data.redis_uuid)
+    except DecompressedSizeExceededError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -70,12 +101,32 @@ async def process_chunk(req: Request):
         payload=process_res
     )
 
+@route.put("/upload/{redis_uuid}/chunk/{chunk_index}")
+async def process_chunk_stream(redis_uuid: str, chunk_index: int, request: Request, upload_controller: UploadController = Depends(get_upload_controller)):
+    # the raw, possibly compressed, chunk is the request body and is decompressed as it arrives
+    try:
+        process_res = await upload_controller.process_chunk(request.stream(), chunk_index, redis_uuid)
+    except DecompressedSizeExceededError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error while processing chunk: {e}"
+        )
+
+    return SuccessfulMessage(
+        status_code=202,
+        detail=f"succesfully processed chunk: {chunk_index}",
+        payload=process_res
+    )
+
 @route.post("/upload/status")
-async def chunking_status(req: Request):
-    data: UploadStatusRequest = await req.json()
-    
-    upload_controller = UploadController()
-    
+async def chunking_status(data: UploadStatusRequest, upload_controller: UploadController = Depends(get_upload_controller)):
     try:
         chunking_status_res = await upload_controller.chunked_chunking_status(data.redis_uuid)
     except Exception as e:
@@ -89,12 +140,38 @@ async def chunking_status(req: Request):
         payload=chunking_status_res
     )
 
-@route.post("/upload/complete")
-async def complete_upload(req: Request):
-    data: UploadCompleteRequest = await req.json()
+@route.get("/upload/{redis_uuid}/events")
+async def upload_events(redis_uuid: str, upload_controller: UploadController = Depends(get_upload_controller)):
+    try:
+        await upload_controller.upload_progress.snapshot(redis_uuid)
+    except Exception as e:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Error while subscribing to upload progress: {e}"
+        )
     
-    upload_controller = UploadController()
+    async def events():
+        async for event in upload_controller.upload_progress.subscribe(redis_uuid):
+            # comment frames keep proxies from closing a quiet stream
+            yield format_sse(json.dumps(event), event="progress") if event is not None else ": keepalive\n\n"
     
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@route.websocket("/upload/{redis_uuid}/ws")
+async def upload_events_ws(websocket: WebSocket, redis_uuid: str, upload_controller: UploadController = Depends(get_upload_controller)):
+    await websocket.accept()
+    try:
+        async for event in upload_controller.upload_progress.subscribe(redis_uuid):
+            # heartbeats find dead sockets while the upload is idle
+            await websocket.send_json(event if event is not None else {"heartbeat": True})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+
+@route.post("/upload/complete")
+async def complete_upload(data: UploadCompleteRequest, upload_controller: UploadController = Depends(get_upload_controller)):
     try:
         upload_complete_res = await upload_controller.complete_chunked_upload(data.redis_uuid)
     except Exception as e:
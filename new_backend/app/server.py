@@ -1,11 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 import requests
 
 from config.config import settings
 from app.routes.llm_chat_route import route as llm_route
 from app.routes.upload_file_route import route as vector_db_route
-from middleware.middleware import MaxContentLengthMiddleware
+from app.routes.search_route import route as search_route
+from app.routes.collections_route import route as collections_route
+from app.dependencies import lifespan
+from middleware.middleware import MaxContentLengthMiddleware, RequestTimingMiddleware, ProfilingMiddleware
+from app.utils.metrics import metrics
 
 
 def create_app() -> FastAPI:
@@ -13,6 +18,8 @@ def create_app() -> FastAPI:
         title="backend for talks trascript processing",
         description="Handles the processing of the transcript processing and other functionalities",
         version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     app.add_middleware(
@@ -23,6 +30,14 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     app.add_middleware(MaxContentLengthMiddleware)
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
+    # added last so it is outermost and times the whole stack
+    app.add_middleware(RequestTimingMiddleware)
+    if settings.TRACING_ENABLED:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics,health")
 
     @app.get("/")
     def home():
@@ -36,8 +51,14 @@ def create_app() -> FastAPI:
             "llm_endpoint": "running" if bool(response) else "not running",
         }
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def get_metrics():
+        return metrics.render()
+
     app.include_router(llm_route)
     app.include_router(vector_db_route)
+    app.include_router(search_route)
+    app.include_router(collections_route)
 
     return app
 
@@ -0,0 +1,169 @@
+from config.config import settings
+from app.utils.metrics import metrics
+from app.utils.serialization import dumps, loads
+from redis.exceptions import WatchError
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+import logging
+import asyncio
+import math
+import time
+
+
+pending_bytes = metrics.gauge("ingest_pending_bytes", "Bytes admitted for ingestion but not embedded yet")
+pending_chunks = metrics.gauge("ingest_pending_chunks", "Estimated chunks admitted for ingestion but not embedded yet")
+rejections = metrics.counter("ingest_rejections_total", "Upload requests rejected with 429")
+embed_slots_active = metrics.gauge("embed_slots_active", "Embedding calls currently running")
+
+
+class AdmissionRejectedError(Exception):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionTicket(NamedTuple):
+    client_id: str
+    bytes: int
+    chunks: int
+    expires_at: float
+
+
+class AdmissionController:
+    """
+    Bounds the embedding backlog that uploads may queue up.
+
+    Every upload reserves its size (and the chunk count estimated from it)
+    until its embeddings are stored. Tickets are kept in a Redis hash keyed by
+    upload, so the worker that completes a chunked upload releases the ticket
+    another worker admitted it with, and the limits hold for all workers
+    together. New uploads that would push the backlog or the client past the
+    limits are rejected with a Retry-After computed from the measured
+    embedding throughput. Embedding calls themselves go through a small slot
+    pool in which ingestion can never take the slots reserved for interactive
+    requests (search and semantic cache lookups).
+    """
+
+    KEY = "admission_tickets"
+
+    def __init__(self, redis_client) -> None:
+        self.__redis_client = redis_client
+        # throughput and embedding slots are per process, the app builds one controller
+        self.__chunks_per_second: float | None = None
+        self.__active_slots = 0
+        self.__active_bulk_slots = 0
+        self.__slots_changed: asyncio.Condition | None = None
+        self.__logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def estimate_chunks(size: int) -> int:
+        return math.ceil(size / max(settings.CHUNK_SIZE - settings.OVERLAP, 1))
+
+    @staticmethod
+    def _live_tickets(stored: dict[str, str]) -> tuple[dict[str, AdmissionTicket], list[str]]:
+        now = time.time()
+        tickets = {key: AdmissionTicket(**loads(value)) for key, value in stored.items()}
+        # chunked uploads that were never completed give their share back after the chunk TTL
+        expired = [key for key, ticket in tickets.items() if ticket.expires_at < now]
+        return {key: ticket for key, ticket in tickets.items() if key not in expired}, expired
+
+    @staticmethod
+    def _set_gauges(tickets: list[AdmissionTicket]):
+        pending_bytes.set(sum(t.bytes for t in tickets))
+        pending_chunks.set(sum(t.chunks for t in tickets))
+
+    def _retry_after(self, excess_chunks: int) -> int:
+        rate = self.__chunks_per_second or settings.INGEST_FALLBACK_CHUNKS_PER_SECOND
+        return min(max(math.ceil(excess_chunks / rate), 1), settings.INGEST_MAX_RETRY_AFTER)
+
+    async def admit(self, key: str, client_id: str, size: int, ttl: float = settings.CHUNK_TTL) -> AdmissionTicket:
+        # the check and the new ticket are one transaction, two workers cannot both take the last share
+        async with self.__redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.KEY)
+                    live, expired = self._live_tickets(await pipe.hgetall(self.KEY))
+                    ticket = self._check(client_id, size, list(live.values()), ttl)
+                    pipe.multi()
+                    if expired:
+                        pipe.hdel(self.KEY, *expired)
+                    pipe.hset(self.KEY, key, dumps(ticket._asdict()))
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        self._set_gauges([*live.values(), ticket])
+        return ticket
+
+    def _check(self, client_id: str, size: int, tickets: list[AdmissionTicket], ttl: float) -> AdmissionTicket:
+        chunks = self.estimate_chunks(size)
+        total_bytes = sum(t.bytes for t in tickets)
+        total_chunks = sum(t.chunks for t in tickets)
+        client_bytes = sum(t.bytes for t in tickets if t.client_id == client_id)
+        client_chunks = sum(t.chunks for t in tickets if t.client_id == client_id)
+
+        # an empty backlog always takes the upload, however large, so no file is locked out
+        process_excess = 0
+        if total_chunks:
+            process_excess = max(
+                total_chunks + chunks - settings.INGEST_MAX_PENDING_CHUNKS,
+                self.estimate_chunks(total_bytes + size - settings.INGEST_MAX_PENDING_BYTES),
+            )
+        client_excess = 0
+        if client_chunks:
+            client_excess = max(
+                client_chunks + chunks - settings.INGEST_MAX_CLIENT_PENDING_CHUNKS,
+                self.estimate_chunks(client_bytes + size - settings.INGEST_MAX_CLIENT_PENDING_BYTES),
+            )
+
+        excess = max(process_excess, client_excess)
+        if excess > 0:
+            retry_after = self._retry_after(excess)
+            rejections.inc(scope="client" if client_excess >= process_excess else "process")
+            self.__logger.info(f"Rejected upload of {size} bytes from {client_id}, backlog {total_chunks} chunks, retry in {retry_after}s")
+            raise AdmissionRejectedError(f"Ingestion backlog is full, retry in {retry_after}s", retry_after)
+
+        return AdmissionTicket(client_id, size, chunks, time.time() + ttl)
+
+    async def release(self, key: str):
+        pipe = self.__redis_client.pipeline(transaction=True)
+        pipe.hdel(self.KEY, key)
+        pipe.hgetall(self.KEY)
+        _, stored = await pipe.execute()
+        live, _ = self._live_tickets(stored)
+        self._set_gauges(list(live.values()))
+
+    def _record_throughput(self, chunks: int, seconds: float):
+        if chunks == 0 or seconds <= 0:
+            return
+        rate = chunks / seconds
+        self.__chunks_per_second = rate if self.__chunks_per_second is None else 0.8 * self.__chunks_per_second + 0.2 * rate
+
+    @asynccontextmanager
+    async def embedding_slot(self, chunks: int, interactive: bool = True):
+        if self.__slots_changed is None:
+            # created on first use, inside the event loop that serves the requests
+            self.__slots_changed = asyncio.Condition()
+        slots_changed = self.__slots_changed
+        bulk_limit = max(settings.EMBED_MAX_CONCURRENCY - settings.EMBED_INTERACTIVE_RESERVED_SLOTS, 1)
+
+        async with slots_changed:
+            await slots_changed.wait_for(
+                lambda: self.__active_slots < settings.EMBED_MAX_CONCURRENCY and (interactive or self.__active_bulk_slots < bulk_limit)
+            )
+            self.__active_slots += 1
+            self.__active_bulk_slots += 0 if interactive else 1
+            embed_slots_active.set(self.__active_slots)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if not interactive:
+                # single query embeddings would say little about the backlog drain rate
+                self._record_throughput(chunks, time.monotonic() - start)
+            async with slots_changed:
+                self.__active_slots -= 1
+                self.__active_bulk_slots -= 0 if interactive else 1
+                embed_slots_active.set(self.__active_slots)
+                slots_changed.notify_all()
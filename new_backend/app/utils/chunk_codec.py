@@ -0,0 +1,102 @@
+from config.config import settings
+from typing import AsyncIterator, List, Sequence
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# in order of preference, zstd is offered only where the module is installed
+CODECS = tuple(codec for codec in ("zstd", "gzip", "identity") if codec != "zstd" or zstandard is not None)
+
+
+class DecompressedSizeExceededError(ValueError):
+    pass
+
+
+def negotiate(accepted: Sequence[str]) -> str:
+    """The first of our codecs the client accepts, identity when there is none in common."""
+    accepted = [codec.strip().lower() for codec in accepted]
+    for codec in CODECS:
+        if codec in accepted:
+            return codec
+    return "identity"
+
+
+# zstd input is fed in slices this small: a decompressobj returns all the output
+# of its input at once, and a slice expands to at most a few MiB however it was built
+ZSTD_INPUT_SLICE = 128
+
+
+def _blocks(data: bytes, block_size: int):
+    for start in range(0, len(data), block_size):
+        yield data[start:start + block_size]
+
+
+async def decode_stream(codec: str, stream: AsyncIterator[bytes], limit: int, block_size: int = settings.MERGING_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Decompresses a chunk while it is received.
+
+    Yields decompressed blocks of at most block_size bytes and raises
+    DecompressedSizeExceededError as soon as the output passes `limit`, so a
+    small compressed body can never expand into memory or onto disk.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported chunk encoding '{codec}', expected one of {CODECS}")
+
+    size = 0
+    if codec == "identity":
+        async for data in stream:
+            size += len(data)
+            if size > limit:
+                raise DecompressedSizeExceededError(f"Chunk exceeds {limit} bytes")
+            yield data
+        return
+
+    if codec == "gzip":
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        async for data in stream:
+            while data:
+                try:
+                    block = decompressor.decompress(data, block_size)
+                except zlib.error as e:
+                    raise ValueError(f"Corrupt gzip chunk: {e}")
+                data = decompressor.unconsumed_tail
+                size += len(block)
+                if size > limit:
+                    raise DecompressedSizeExceededError(f"Decompressed chunk exceeds {limit} bytes")
+                if block:
+                    yield block
+                if decompressor.eof:
+                    break
+        # output zlib still holds back is at most one window
+        block = decompressor.flush()
+        size += len(block)
+        if size > limit:
+            raise DecompressedSizeExceededError(f"Decompressed chunk exceeds {limit} bytes")
+        if block:
+            yield block
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip chunk")
+        return
+
+    decompressor = zstandard.ZstdDecompressor().decompressobj(write_size=block_size)
+    async for data in stream:
+        for start in range(0, len(data), ZSTD_INPUT_SLICE):
+            try:
+                block = decompressor.decompress(data[start:start + ZSTD_INPUT_SLICE])
+            except zstandard.ZstdError as e:
+                raise ValueError(f"Corrupt zstd chunk: {e}")
+            size += len(block)
+            if size > limit:
+                raise DecompressedSizeExceededError(f"Decompressed chunk exceeds {limit} bytes")
+            for piece in _blocks(block, block_size):
+                yield piece
+            if decompressor.eof:
+                break
+        if decompressor.eof:
+            break
+    if not decompressor.eof:
+        raise ValueError("Truncated zstd chunk")
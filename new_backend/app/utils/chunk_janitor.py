@@ -0,0 +1,173 @@
+from config.config import settings
+from app.utils.metrics import metrics
+from redis.exceptions import WatchError
+from pathlib import Path
+import logging
+import asyncio
+import shutil
+import time
+import os
+
+
+store_bytes = metrics.gauge("chunk_store_bytes", "Bytes of uploaded chunks and merged files on disk")
+store_sessions = metrics.gauge("chunk_store_sessions", "Chunked upload directories on disk")
+reclaimed_bytes = metrics.counter("chunk_store_reclaimed_bytes_total", "Bytes removed by the chunk store janitor")
+quota_rejections = metrics.counter("chunk_store_quota_rejections_total", "Upload sessions refused because the chunk store quota was reached")
+reserved_bytes = metrics.gauge("chunk_store_reserved_bytes", "Bytes declared by open upload sessions and not written yet")
+
+
+class StorageQuotaExceededError(Exception):
+    pass
+
+
+def _directory_size(path: Path) -> int:
+    size = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                size += entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+class ChunkJanitor:
+    """
+    Reclaims chunk directories of chunked uploads and enforces a disk quota.
+
+    A directory is named <file stem>_<redis_uuid>. Once its Redis metadata is
+    gone, because the session expired after CHUNK_TTL or was completed, the
+    directory is removed after a grace period.
+
+    A new session reserves its declared size against CHUNK_STORE_QUOTA_BYTES,
+    on top of the bytes on disk. Both are kept in Redis, shared by the
+    workers: a written chunk moves its size from the session's reservation to
+    the bytes on disk in one transaction, a removed directory takes its size
+    off, and each sweep resets the bytes on disk from a scan of the directory.
+    Reservations are released when the upload completes or fails and dropped
+    after CHUNK_TTL when it is abandoned.
+    """
+
+    RESERVED_KEY = "chunk_store_reserved"
+    EXPIRES_KEY = "chunk_store_reserved:expires"
+    BYTES_KEY = "chunk_store_bytes"
+
+    def __init__(self, redis_client, root: str = settings.CHUNK_STORE_DIR) -> None:
+        self.__redis_client = redis_client
+        self.__root = Path(root)
+        self.__logger = logging.getLogger(__name__)
+
+    @property
+    def root(self) -> Path:
+        return self.__root
+
+    @staticmethod
+    def session_id(directory: Path) -> str:
+        # redis_uuid is a uuid4, always the last 36 characters
+        return directory.name[-36:]
+
+    def _scan(self) -> list[tuple[Path, int, float]]:
+        if not self.__root.exists():
+            return []
+        directories = []
+        for path in self.__root.iterdir():
+            if path.is_dir():
+                directories.append((path, _directory_size(path), path.stat().st_mtime))
+        return directories
+
+    async def _measure(self):
+        """Sets the bytes on disk from a scan, unless another worker set them first."""
+        loop = asyncio.get_running_loop()
+        directories = await loop.run_in_executor(None, self._scan)
+        await self.__redis_client.set(self.BYTES_KEY, sum(size for _, size, _ in directories), nx=True)
+
+    async def reserve(self, session_id: str, size: int, ttl: float = settings.CHUNK_TTL):
+        if not await self.__redis_client.exists(self.BYTES_KEY):
+            # no sweep ran yet, or Redis lost the counter
+            await self._measure()
+        # the check and the reservation are one transaction, two workers cannot both take the last bytes
+        async with self.__redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # the bytes on disk are not watched, a chunk write only moves bytes out of a reservation
+                    await pipe.watch(self.RESERVED_KEY, self.EXPIRES_KEY)
+                    usage = max(int(await pipe.get(self.BYTES_KEY) or 0), 0)
+                    expires = dict(await pipe.zrange(self.EXPIRES_KEY, 0, -1, withscores=True))
+                    pending = await pipe.hgetall(self.RESERVED_KEY)
+                    now = time.time()
+                    # a chunk that lands after its session was released leaves a field without an expiry
+                    expired = [session for session in pending if expires.get(session, 0) < now]
+                    reserved = sum(max(int(remaining), 0) for session, remaining in pending.items() if session not in expired)
+                    if usage + reserved + size > settings.CHUNK_STORE_QUOTA_BYTES:
+                        quota_rejections.inc()
+                        raise StorageQuotaExceededError(
+                            f"Upload storage is full: {usage} of {settings.CHUNK_STORE_QUOTA_BYTES} bytes in use, "
+                            f"{reserved} reserved, {size} requested"
+                        )
+                    pipe.multi()
+                    if expired:
+                        pipe.hdel(self.RESERVED_KEY, *expired)
+                        pipe.zrem(self.EXPIRES_KEY, *expired)
+                    pipe.hset(self.RESERVED_KEY, session_id, size)
+                    pipe.zadd(self.EXPIRES_KEY, {session_id: now + ttl})
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        store_bytes.set(usage)
+        reserved_bytes.set(reserved + size)
+
+    async def consume(self, session_id: str, size: int):
+        """Moves written bytes of a session from its reservation to the bytes on disk."""
+        pipe = self.__redis_client.pipeline(transaction=True)
+        pipe.incrby(self.BYTES_KEY, size)
+        pipe.hincrby(self.RESERVED_KEY, session_id, -size)
+        await pipe.execute()
+
+    async def release(self, session_id: str):
+        pipe = self.__redis_client.pipeline(transaction=True)
+        pipe.hdel(self.RESERVED_KEY, session_id)
+        pipe.zrem(self.EXPIRES_KEY, session_id)
+        await pipe.execute()
+
+    async def remove(self, directory: Path) -> int:
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(None, _directory_size, directory) if directory.exists() else 0
+        await loop.run_in_executor(None, lambda: shutil.rmtree(directory, ignore_errors=True))
+        reclaimed_bytes.inc(size)
+        await self.__redis_client.decrby(self.BYTES_KEY, size)
+        return size
+
+    async def sweep(self) -> int:
+        loop = asyncio.get_running_loop()
+        directories = await loop.run_in_executor(None, self._scan)
+        now = time.time()
+        reclaimed = 0
+        kept_bytes = 0
+        kept = 0
+
+        pipe = self.__redis_client.pipeline(transaction=False)
+        for directory, _, _ in directories:
+            pipe.exists(self.session_id(directory))
+        alive = await pipe.execute() if directories else []
+
+        for (directory, size, mtime), session_alive in zip(directories, alive):
+            if session_alive or now - mtime < settings.CHUNK_JANITOR_GRACE:
+                kept_bytes += size
+                kept += 1
+                continue
+            await loop.run_in_executor(None, lambda: shutil.rmtree(directory, ignore_errors=True))
+            reclaimed += size
+            self.__logger.info(f"Removed {directory} ({size} bytes), its upload session is gone")
+
+        reclaimed_bytes.inc(reclaimed)
+        await self.__redis_client.set(self.BYTES_KEY, kept_bytes)
+        store_bytes.set(kept_bytes)
+        store_sessions.set(kept)
+        return reclaimed
+
+    async def run(self, interval: float = settings.CHUNK_JANITOR_INTERVAL):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.__logger.warning(f"Chunk store sweep failed: {e}")
+            await asyncio.sleep(interval)
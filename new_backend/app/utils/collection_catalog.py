@@ -0,0 +1,197 @@
+from config.config import settings
+from app.utils.metrics import metrics
+from app.utils.serialization import dumps, loads
+from redis.exceptions import WatchError
+from typing import Callable
+import logging
+import asyncio
+import time
+
+
+catalog_lookups = metrics.counter("collection_catalog_lookups_total", "Collection existence checks answered by the catalog")
+catalog_refreshes = metrics.counter("collection_catalog_refreshes_total", "Rebuilds of the collection catalog from the vector store")
+
+
+def _merge_documents(*document_lists: list) -> list:
+    merged = []
+    for documents in document_lists:
+        for document in documents:
+            if document not in merged:
+                merged.append(document)
+    return merged
+
+
+class CollectionCatalog:
+    """
+    Names, point counts and document metadata of the vector store's collections.
+
+    Two tiers: a copy in each process, reread after COLLECTION_CATALOG_LOCAL_TTL
+    seconds, and a Redis hash shared by the workers and the old backend. The
+    app updates both tiers when it creates a collection, and a background task
+    rebuilds the shared tier from the vector store every
+    COLLECTION_CATALOG_REFRESH_INTERVAL seconds, which picks up collections
+    created or deleted outside of the app. Entries are rewritten under WATCH,
+    so documents recorded by another worker meanwhile are merged, not lost.
+
+    A deleted collection is announced on CHANNEL. Every process listens and
+    drops what it cached about the name, its own catalog entry and whatever
+    the helpers registered with `on_removed` keep (projections, text store
+    files), so a collection created again under the same name is not served
+    from stale caches. When the subscription drops, everything is dropped.
+    """
+
+    KEY = "collection_catalog"
+    REFRESHED_KEY = "collection_catalog:refreshed_at"
+    CHANNEL = "collection_catalog:removed"
+
+    def __init__(self, redis_client, qdrant_client) -> None:
+        self.__redis_client = redis_client
+        self.__qdrant_client = qdrant_client
+        self.__entries: dict[str, dict] | None = None
+        self.__loaded_at = 0.0
+        self.__removed_callbacks: list[Callable[[str | None], None]] = []
+        self.__logger = logging.getLogger(__name__)
+
+    async def entries(self) -> dict[str, dict]:
+        if self.__entries is not None and time.monotonic() - self.__loaded_at < settings.COLLECTION_CATALOG_LOCAL_TTL:
+            return self.__entries
+
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.hgetall(self.KEY)
+        pipe.get(self.REFRESHED_KEY)
+        stored, refreshed_at = await pipe.execute()
+        if refreshed_at is None:
+            # the shared tier was never built, or Redis lost it
+            return await self.refresh()
+        self._set_entries({name: loads(entry) for name, entry in stored.items()})
+        return self.__entries
+
+    def _set_entries(self, entries: dict[str, dict]):
+        self.__entries = entries
+        self.__loaded_at = time.monotonic()
+
+    async def exists(self, collection_name: str, verify_missing: bool = False) -> bool:
+        """
+        Whether a collection exists, without asking the vector store. With
+        `verify_missing` a name the catalog does not know is checked against
+        the vector store, for callers that must not miss a collection created
+        since the last refresh.
+        """
+        catalog_lookups.inc()
+        if collection_name in await self.entries():
+            return True
+        if verify_missing and await self.__qdrant_client.collection_exists(collection_name):
+            await self.add(collection_name, await self._count(collection_name))
+            return True
+        return False
+
+    async def add(self, collection_name: str, points: int, document: dict | None = None):
+        entries = await self.entries()
+        async with self.__redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.KEY)
+                    stored = await pipe.hget(self.KEY, collection_name)
+                    documents = loads(stored).get("documents", []) if stored else []
+                    entry = {
+                        "name": collection_name,
+                        "points": points,
+                        "documents": _merge_documents(documents, [document] if document else []),
+                        "updated_at": time.time(),
+                    }
+                    pipe.multi()
+                    pipe.hset(self.KEY, collection_name, dumps(entry))
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        entries[collection_name] = entry
+
+    async def remove(self, collection_name: str):
+        await self.__redis_client.hdel(self.KEY, collection_name)
+        (await self.entries()).pop(collection_name, None)
+        await self.__redis_client.publish(self.CHANNEL, collection_name)
+
+    def on_removed(self, callback: Callable[[str | None], None]):
+        """Registers a callback run with the name of a removed collection, or None when every cached name must be dropped."""
+        self.__removed_callbacks.append(callback)
+
+    def _forget(self, collection_name: str | None):
+        if collection_name is None:
+            self.__entries = None
+        elif self.__entries is not None:
+            self.__entries.pop(collection_name, None)
+        for callback in self.__removed_callbacks:
+            try:
+                callback(collection_name)
+            except Exception as e:
+                self.__logger.warning(f"Dropping cached state of {collection_name or 'every collection'} failed: {e}")
+
+    async def _count(self, collection_name: str) -> int:
+        result = await self.__qdrant_client.count(collection_name=collection_name, exact=False)
+        return result.count
+
+    async def refresh(self) -> dict[str, dict]:
+        """Rebuilds the catalog from the vector store, keeping the document metadata it cannot provide."""
+        known = set(await self.__redis_client.hkeys(self.KEY))
+        response = await self.__qdrant_client.get_collections()
+        names = [collection.name for collection in response.collections]
+        counts = await asyncio.gather(*(self._count(name) for name in names))
+
+        async with self.__redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.KEY)
+                    stored = {name: loads(entry) for name, entry in (await pipe.hgetall(self.KEY)).items()}
+                    now = time.time()
+                    # a name removed from the catalog since the listing was deleted meanwhile, it is not put back
+                    entries = {
+                        name: {"name": name, "points": points, "documents": stored.get(name, {}).get("documents", []), "updated_at": now}
+                        for name, points in zip(names, counts)
+                        if name in stored or name not in known
+                    }
+                    pipe.multi()
+                    if entries:
+                        pipe.hset(self.KEY, mapping={name: dumps(entry) for name, entry in entries.items()})
+                    # only names read before the listing are dropped, one added meanwhile is kept
+                    removed = [name for name in known if name in stored and name not in entries]
+                    if removed:
+                        pipe.hdel(self.KEY, *removed)
+                        for name in removed:
+                            pipe.publish(self.CHANNEL, name)
+                    pipe.set(self.REFRESHED_KEY, now)
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        entries.update({name: entry for name, entry in stored.items() if name not in known and name not in entries})
+
+        catalog_refreshes.inc()
+        self._set_entries(entries)
+        return entries
+
+    async def listen(self, retry_interval: float = 1.0):
+        while True:
+            pubsub = self.__redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                # removals published while not subscribed were missed
+                self._forget(None)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._forget(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.__logger.warning(f"Collection catalog subscription failed: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(retry_interval)
+
+    async def run(self, interval: float = settings.COLLECTION_CATALOG_REFRESH_INTERVAL):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.__logger.warning(f"Collection catalog refresh failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,59 @@
+from config.config import settings
+from app.utils.serialization import dumps, loads
+from typing import List
+import uuid
+
+
+class ConversationStore:
+    SESSION_PREFIX = "conversation:"
+
+    def __init__(self, redis_client) -> None:
+        self.__redis_client = redis_client
+
+    def _meta_key(self, session_id: str) -> str:
+        return f"{self.SESSION_PREFIX}{session_id}"
+
+    def _turns_key(self, session_id: str) -> str:
+        return f"{self.SESSION_PREFIX}{session_id}:turns"
+
+    async def create(self, model: str, system_prompt: str | None = None) -> str:
+        session_id = str(uuid.uuid4())
+        pipe = self.__redis_client.pipeline(transaction=True)
+        pipe.hset(self._meta_key(session_id), mapping={
+            "model": model,
+            "system_prompt": system_prompt or "",
+            "summary": "",
+            "summarized_turns": 0,
+        })
+        pipe.expire(self._meta_key(session_id), settings.SESSION_TTL)
+        await pipe.execute()
+        return session_id
+
+    async def get(self, session_id: str) -> tuple[dict, List[dict]]:
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.hgetall(self._meta_key(session_id))
+        pipe.lrange(self._turns_key(session_id), 0, -1)
+        pipe.expire(self._meta_key(session_id), settings.SESSION_TTL)
+        pipe.expire(self._turns_key(session_id), settings.SESSION_TTL)
+        meta, turns, _, _ = await pipe.execute()
+        if not meta:
+            raise ValueError("Conversation session not found")
+
+        meta["summarized_turns"] = int(meta.get("summarized_turns", 0))
+        return meta, [loads(turn) for turn in turns]
+
+    async def append_turns(self, session_id: str, turns: List[dict]):
+        pipe = self.__redis_client.pipeline(transaction=True)
+        pipe.rpush(self._turns_key(session_id), *[dumps(turn) for turn in turns])
+        pipe.expire(self._turns_key(session_id), settings.SESSION_TTL)
+        pipe.expire(self._meta_key(session_id), settings.SESSION_TTL)
+        await pipe.execute()
+
+    async def set_summary(self, session_id: str, summary: str, summarized_turns: int):
+        await self.__redis_client.hset(self._meta_key(session_id), mapping={
+            "summary": summary,
+            "summarized_turns": summarized_turns,
+        })
+
+    async def delete(self, session_id: str):
+        await self.__redis_client.delete(self._meta_key(session_id), self._turns_key(session_id))
@@ -0,0 +1,220 @@
+from qdrant_client.http.models import PointStruct, SparseVector
+from config.config import settings
+from app.utils.vector_projection import VectorProjection
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, List
+import numpy as np
+import logging
+import fcntl
+import json
+import os
+import re
+
+
+ARCHIVE_FORMAT_VERSION = 2
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", value)
+
+
+def _save_npy(path: Path, array: np.ndarray):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_bytes(path: Path, data: bytes):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingArchive:
+    """
+    Append-only on-disk copy of a collection's points, versioned by model name.
+
+    Each block stores the dense vectors as a raw .npy matrix (float32, or int8
+    with a per-row scale) that is memory mapped on read, the sparse vectors in
+    CSR form, and every payload field as its own column: string columns are one
+    utf-8 blob plus an int64 offsets array, integer columns a plain int64 array.
+    Column types are recorded per block, a field can be an integer column in
+    one block and a string column in the next. Collections with small vectors
+    keep their projection next to the manifest, small vectors are projected
+    again on restore. The manifest is rewritten last, so a block only becomes visible once all of
+    its files are on disk. Writers of a collection take an flock on its
+    manifest.lock, so workers and bulk imports never write the same block.
+    """
+
+    def __init__(self, root: str | Path, model_name: str = settings.SENTENCE_TRANSFORMER_MODEL_NAME) -> None:
+        self.__root = Path(root)
+        self.__model_name = model_name
+        self.__logger = logging.getLogger(__name__)
+
+    def collection_dir(self, collection_name: str) -> Path:
+        return self.__root / _slug(self.__model_name) / _slug(collection_name)
+
+    def read_manifest(self, collection_name: str) -> dict | None:
+        manifest_path = self.collection_dir(collection_name) / "manifest.json"
+        if not manifest_path.exists():
+            return None
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    def collections(self) -> List[str]:
+        model_dir = self.__root / _slug(self.__model_name)
+        if not model_dir.exists():
+            return []
+        manifests = (json.loads(p.read_text(encoding="utf-8")) for p in model_dir.glob("*/manifest.json"))
+        return sorted(m["collection"] for m in manifests)
+
+    def _write_string_column(self, prefix: Path, values: List[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        _save_bytes(prefix.with_name(prefix.name + ".data"), b"".join(encoded))
+        _save_npy(prefix.with_name(prefix.name + ".offsets.npy"), offsets)
+
+    def read_projection(self, collection_name: str) -> VectorProjection | None:
+        manifest = self.read_manifest(collection_name)
+        if manifest is None or not manifest.get("projection"):
+            return None
+        path = self.collection_dir(collection_name) / manifest["projection"]
+        if not path.exists():
+            raise ValueError(f"Archive of {collection_name} is missing its projection {path.name}")
+        return VectorProjection.loads(path.read_bytes())
+
+    @contextmanager
+    def _locked(self, directory: Path):
+        # each call opens the lock file, so threads of this process exclude each other too
+        with open(directory / "manifest.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write_block(self, collection_name: str, points: List[PointStruct], dtype: str = settings.EMBEDDING_ARCHIVE_DTYPE, projection: VectorProjection | None = None):
+        if not points:
+            return
+
+        directory = self.collection_dir(collection_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        # the block number comes from the manifest, writers of a collection take turns
+        with self._locked(directory):
+            manifest = self.read_manifest(collection_name) or {
+                "format_version": ARCHIVE_FORMAT_VERSION,
+                "model": self.__model_name,
+                "collection": collection_name,
+                "dtype": dtype,
+                "dimension": None,
+                "blocks": [],
+            }
+            if manifest["model"] != self.__model_name:
+                raise ValueError(f"Archive was written with {manifest['model']}, not {self.__model_name}")
+
+            block_name = f"block_{len(manifest['blocks']):05d}"
+            prefix = directory / block_name
+
+            dense = np.asarray([p.vector[settings.DENSE_VECTOR_NAME] for p in points], dtype=np.float32)
+            if manifest["dtype"] == "int8":
+                scales = np.maximum(np.abs(dense).max(axis=1), 1e-12) / 127.0
+                _save_npy(prefix.with_name(block_name + ".vectors.npy"), np.round(dense / scales[:, None]).astype(np.int8))
+                _save_npy(prefix.with_name(block_name + ".scales.npy"), scales.astype(np.float32))
+            else:
+                _save_npy(prefix.with_name(block_name + ".vectors.npy"), dense)
+
+            sparse = [p.vector.get(settings.SPARSE_VECTOR_NAME) for p in points]
+            has_sparse = all(s is not None for s in sparse)
+            if has_sparse:
+                indptr = np.zeros(len(sparse) + 1, dtype=np.int64)
+                np.cumsum([len(s.indices) for s in sparse], out=indptr[1:])
+                _save_npy(prefix.with_name(block_name + ".sparse.indptr.npy"), indptr)
+                _save_npy(prefix.with_name(block_name + ".sparse.indices.npy"), np.fromiter((i for s in sparse for i in s.indices), dtype=np.uint32, count=int(indptr[-1])))
+                _save_npy(prefix.with_name(block_name + ".sparse.values.npy"), np.fromiter((v for s in sparse for v in s.values), dtype=np.float32, count=int(indptr[-1])))
+
+            self._write_string_column(prefix.with_name(block_name + ".id"), [str(p.id) for p in points])
+
+            columns = {}
+            for key in sorted({key for p in points for key in (p.payload or {})}):
+                values = [(p.payload or {}).get(key) for p in points]
+                column_prefix = prefix.with_name(f"{block_name}.col.{_slug(key)}")
+                if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                    _save_npy(column_prefix.with_name(column_prefix.name + ".npy"), np.asarray(values, dtype=np.int64))
+                    columns[key] = "int64"
+                else:
+                    self._write_string_column(column_prefix, ["" if v is None else str(v) for v in values])
+                    columns[key] = "string"
+
+            if projection is not None and not manifest.get("projection"):
+                _save_bytes(directory / "projection.npz", projection.dumps())
+                manifest["projection"] = "projection.npz"
+
+            manifest["dimension"] = int(dense.shape[1])
+            manifest["blocks"].append({
+                "name": block_name,
+                "count": len(points),
+                "sparse": has_sparse,
+                "columns": columns,
+            })
+            _save_bytes(directory / "manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+        self.__logger.info(f"Archived {len(points)} points of {collection_name} as {block_name}")
+
+    def _read_string_column(self, prefix: Path) -> List[str]:
+        offsets = np.load(prefix.with_name(prefix.name + ".offsets.npy"))
+        with open(prefix.with_name(prefix.name + ".data"), "rb") as f:
+            data = f.read()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def iter_points(self, collection_name: str, batch_size: int = settings.BULK_IMPORT_BATCH_SIZE) -> Iterator[List[PointStruct]]:
+        manifest = self.read_manifest(collection_name)
+        if manifest is None:
+            raise ValueError(f"No archive for {collection_name} with model {self.__model_name}")
+
+        directory = self.collection_dir(collection_name)
+        for block in manifest["blocks"]:
+            prefix = directory / block["name"]
+            vectors = np.load(prefix.with_name(block["name"] + ".vectors.npy"), mmap_mode="r")
+            scales = None
+            if manifest["dtype"] == "int8":
+                scales = np.load(prefix.with_name(block["name"] + ".scales.npy"))
+
+            if block["sparse"]:
+                indptr = np.load(prefix.with_name(block["name"] + ".sparse.indptr.npy"))
+                indices = np.load(prefix.with_name(block["name"] + ".sparse.indices.npy"), mmap_mode="r")
+                values = np.load(prefix.with_name(block["name"] + ".sparse.values.npy"), mmap_mode="r")
+
+            ids = [int(i) if i.isdigit() else i for i in self._read_string_column(prefix.with_name(block["name"] + ".id"))]
+            # format 1 listed the keys per block and kept one type per key for the whole manifest
+            column_types = block["columns"] if isinstance(block["columns"], dict) else {key: manifest["columns"][key] for key in block["columns"]}
+            columns = {}
+            for key, column_type in column_types.items():
+                column_prefix = prefix.with_name(f"{block['name']}.col.{_slug(key)}")
+                if column_type == "int64":
+                    columns[key] = np.load(column_prefix.with_name(column_prefix.name + ".npy")).tolist()
+                else:
+                    columns[key] = self._read_string_column(column_prefix)
+
+            for start in range(0, block["count"], batch_size):
+                end = min(start + batch_size, block["count"])
+                dense = np.asarray(vectors[start:end], dtype=np.float32)
+                if scales is not None:
+                    dense *= scales[start:end, None]
+                dense_rows = dense.tolist()
+
+                points = []
+                for row, i in enumerate(range(start, end)):
+                    vector = {settings.DENSE_VECTOR_NAME: dense_rows[row]}
+                    if block["sparse"]:
+                        vector[settings.SPARSE_VECTOR_NAME] = SparseVector(
+                            indices=indices[indptr[i]:indptr[i + 1]].tolist(),
+                            values=values[indptr[i]:indptr[i + 1]].tolist(),
+                        )
+                    points.append(PointStruct(
+                        id=ids[i],
+                        vector=vector,
+                        payload={key: column[i] for key, column in columns.items()},
+                    ))
+                yield points
@@ -0,0 +1,72 @@
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from config.config import settings
+from typing import List
+import numpy as np
+import contextvars
+import logging
+import asyncio
+
+
+class EmbeddingBatcher:
+    """
+    Packs chunks from concurrently ingested files into shared encode calls.
+
+    Callers await embed() with the chunks of one file; requests that arrive
+    while a batch is being encoded are merged into the next one, so several
+    small files cost one forward pass instead of one each.
+    """
+
+    def __init__(self, file_processing_pipeline: FileProcessingPipeline, max_batch_chunks: int = settings.INGEST_EMBED_BATCH_CHUNKS, max_wait: float = settings.INGEST_EMBED_BATCH_WAIT_MS / 1000) -> None:
+        self.__file_processing_pipeline = file_processing_pipeline
+        self.__max_batch_chunks = max_batch_chunks
+        self.__max_wait = max_wait
+        self.__pending: asyncio.Queue[tuple[List[str], asyncio.Future]] = asyncio.Queue()
+        self.__worker: asyncio.Task | None = None
+        self.__logger = logging.getLogger(__name__)
+
+    async def embed(self, chunks: List[str]) -> np.ndarray:
+        if self.__worker is None or self.__worker.done():
+            # the worker serves every caller, it must not carry the first caller's profile or trace context
+            self.__worker = asyncio.create_task(self._run(), context=contextvars.Context())
+
+        future = asyncio.get_running_loop().create_future()
+        await self.__pending.put((chunks, future))
+        return await future
+
+    async def _collect(self) -> List[tuple[List[str], asyncio.Future]]:
+        batch = [await self.__pending.get()]
+        size = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.__max_wait
+        while size < self.__max_batch_chunks:
+            remaining = deadline - loop.time()
+            try:
+                request = self.__pending.get_nowait() if remaining <= 0 else await asyncio.wait_for(self.__pending.get(), timeout=remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            chunks = [chunk for request_chunks, _ in batch for chunk in request_chunks]
+            try:
+                embeddings = await self.__file_processing_pipeline.embed_chunks(chunks, interactive=False)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.__logger.info(f"Embedded {len(chunks)} chunks from {len(batch)} files in one batch")
+            offset = 0
+            for request_chunks, future in batch:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(request_chunks)])
+                offset += len(request_chunks)
+
+    async def close(self):
+        if self.__worker is not None:
+            self.__worker.cancel()
@@ -1,24 +1,62 @@
 from sentence_transformers import SentenceTransformer
 from qdrant_client.http.models import PointStruct
 from config.config import settings
+from app.utils.sparse_vectorizer import SparseVectorizer
+from app.utils.metrics import metrics
+from app.utils.admission_controller import AdmissionController
+from app.utils.profiling import profiled_stage
+from app.utils.tracing import tracer
 from fastapi import UploadFile
 from pathlib import Path
-from typing import List
+from contextlib import nullcontext
+from typing import Awaitable, Callable, List
 import logging
 import asyncio
+import time
 logging.basicConfig(level=logging.INFO)
 
 
+model_loads = metrics.counter("embedding_model_loads_total", "SentenceTransformer models loaded from disk")
+model_load_seconds = metrics.histogram("embedding_model_load_seconds", "Time spent loading the SentenceTransformer model")
+
+
+def _load_embedding_model() -> SentenceTransformer:
+    start = time.perf_counter()
+    model = SentenceTransformer(settings.SENTENCE_TRANSFORMER_MODEL_NAME)
+    model_load_seconds.observe(time.perf_counter() - start, model=settings.SENTENCE_TRANSFORMER_MODEL_NAME)
+    model_loads.inc(model=settings.SENTENCE_TRANSFORMER_MODEL_NAME)
+    return model
+
+
 class FileProcessingPipeline:
-    def __init__(self) -> None:
-        self.__embedding_model = None
+    # set in the gunicorn master before it forks, workers then share its pages copy-on-write
+    _preloaded_model: SentenceTransformer | None = None
+    
+    def __init__(self, sparse_vectorizer: SparseVectorizer | None = None, embedding_model: SentenceTransformer | None = None, admission_controller: AdmissionController | None = None) -> None:
+        self.__embedding_model = embedding_model
+        self.__sparse_vectorizer = sparse_vectorizer
+        # without one, as in the scripts, embedding calls are not limited
+        self.__admission_controller = admission_controller
         self.__logger = logging.getLogger(__name__)
         
+    @classmethod
+    def preload_embedding_model(cls) -> SentenceTransformer:
+        if cls._preloaded_model is None:
+            model = _load_embedding_model()
+            # weights are only ever read, no autograd state may be written into the shared pages
+            model.eval()
+            for parameter in model.parameters():
+                parameter.requires_grad_(False)
+            cls._preloaded_model = model
+        return cls._preloaded_model
+        
     @property
     def embedding_model(self) -> SentenceTransformer:
+        if self.__embedding_model is None and self._preloaded_model is not None:
+            self.__embedding_model = self._preloaded_model
         if self.__embedding_model is None:
             self.__logger.info("Loading sentence transformer model...")
-            self.__embedding_model = SentenceTransformer(settings.SENTENCE_TRANSFORMER_MODEL_NAME)
+            self.__embedding_model = _load_embedding_model()
             self.__logger.info("Model loaded successfully")
         return self.__embedding_model
     
@@ -26,6 +64,10 @@ class FileProcessingPipeline:
     def embedding_model(self, value):
         self.__embedding_model = value
         
+    @property
+    def sparse_vectorizer(self) -> SparseVectorizer | None:
+        return self.__sparse_vectorizer
+        
     def _chunk_text(self, text: str, chunk_size: int = settings.CHUNK_SIZE, overlap: int = settings.OVERLAP) -> List[str]:
         self.__logger.info(f"Chunking text into segments of {chunk_size} chars with {overlap} overlap")
         chunks = []
@@ -51,33 +93,63 @@ class FileProcessingPipeline:
     
     async def chunk_text(self, text: str):
         loop = asyncio.get_running_loop()
-        chunked_text = await loop.run_in_executor(None, self._chunk_text, text)
+        chunked_text = await loop.run_in_executor(None, profiled_stage(self._chunk_text, "chunk_text"), text)
         return chunked_text
     
-    async def embed_chunks(self, chunks: List[str]):
+    async def embed_chunks(self, chunks: List[str], interactive: bool = True):
         loop = asyncio.get_running_loop()
-        embeddings = await loop.run_in_executor(None, self._embed_chunks, chunks)
+        slot = nullcontext() if self.__admission_controller is None else self.__admission_controller.embedding_slot(len(chunks), interactive=interactive)
+        async with slot:
+            embeddings = await loop.run_in_executor(None, profiled_stage(self._embed_chunks, "embed_chunks"), chunks)
         return embeddings
 
-    async def process_txt_file(self, file: UploadFile):
-        data = file.file.read()
-        text = data.decode("utf-8")
-        
-        chunked_text = await self.chunk_text(text)
-        embeddings = await self.embed_chunks(chunked_text)
+    async def read_txt_file(self, file: UploadFile) -> str:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, profiled_stage(file.file.read, "read_file"))
+        return data.decode("utf-8")
+
+    async def build_points(self, filename: str | None, chunked_text: List[str], embeddings) -> List[PointStruct]:
+        document = Path(filename).stem if filename else ""
+        sparse_vectors = [None] * len(chunked_text)
+        if self.__sparse_vectorizer is not None:
+            # a file's collection is named after it
+            sparse_vectors = await self.__sparse_vectorizer.encode_documents(document, chunked_text)
         
         points = []
-        for i, (vect, text_chunk) in enumerate(zip(embeddings, chunked_text)):
+        for i, (vect, sparse_vect, text_chunk) in enumerate(zip(embeddings, sparse_vectors, chunked_text)):
+            vector = {settings.DENSE_VECTOR_NAME: vect}
+            if sparse_vect is not None:
+                vector[settings.SPARSE_VECTOR_NAME] = sparse_vect
             points.append(
                 PointStruct(
                     id=i,
-                    vector=vect,
+                    vector=vector,
                     payload={
                         "text": text_chunk,
-                        "source": file.filename,
-                        "document": Path(file.filename).stem if file.filename else ""
+                        "source": filename,
+                        "document": document
                     }
                 )
             )
         
         return points
+
+    async def process_txt_file(self, file: UploadFile, embed: Callable[[List[str]], Awaitable] | None = None):
+        # spans are opened here on the event loop, the executor threads do not carry the trace context
+        with tracer.start_as_current_span("pipeline.read"):
+            text = await self.read_txt_file(file)
+        
+        with tracer.start_as_current_span("pipeline.chunk", attributes={"text.length": len(text)}) as span:
+            chunked_text = await self.chunk_text(text)
+            span.set_attribute("chunks", len(chunked_text))
+        if not chunked_text:
+            # nothing to embed, no collection is created for it
+            raise ValueError(f"{file.filename} contains no text")
+        with tracer.start_as_current_span("pipeline.embed", attributes={"chunks": len(chunked_text), "batched": embed is not None}):
+            if embed is None:
+                embeddings = await self.embed_chunks(chunked_text, interactive=False)
+            else:
+                embeddings = await embed(chunked_text)
+        
+        with tracer.start_as_current_span("pipeline.build_points"):
+            return await self.build_points(file.filename, chunked_text, embeddings)
@@ -0,0 +1,211 @@
+from config.config import settings
+from app.utils.metrics import metrics
+from contextlib import asynccontextmanager, AsyncExitStack
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import List, NamedTuple
+import logging
+import asyncio
+import random
+import time
+import httpx
+
+
+queue_depth = metrics.gauge("llm_queue_depth", "Chat requests waiting for an upstream slot")
+active_requests = metrics.gauge("llm_active_requests", "Chat requests currently streaming from upstream")
+queue_wait = metrics.histogram("llm_queue_wait_seconds", "Time spent waiting for an upstream slot")
+upstream_retries = metrics.counter("llm_upstream_retries_total", "Upstream requests retried before streaming")
+upstream_failovers = metrics.counter("llm_upstream_failovers_total", "Requests moved to the next fallback target")
+
+
+class UpstreamUnavailableError(Exception):
+    pass
+
+
+class UpstreamTarget(NamedTuple):
+    url: str
+    api_key: str | None
+    model: str
+
+
+class FairQueue:
+    """Concurrency limit that grants free slots round robin across clients."""
+
+    def __init__(self, limit: int) -> None:
+        self.__limit = limit
+        self.__active = 0
+        self.__waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    @property
+    def depth(self) -> int:
+        return sum(len(w) for w in self.__waiters.values())
+
+    async def acquire(self, client_id: str):
+        if self.__active < self.__limit and not self.__waiters:
+            self.__active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.__waiters.setdefault(client_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # slot was granted while we were being cancelled, hand it on
+                self.release()
+            else:
+                self._remove_waiter(client_id, future)
+            raise
+
+    def _remove_waiter(self, client_id: str, future: asyncio.Future):
+        waiters = self.__waiters.get(client_id)
+        if waiters is None:
+            return
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            del self.__waiters[client_id]
+
+    def release(self):
+        while self.__waiters:
+            client_id, waiters = next(iter(self.__waiters.items()))
+            future = waiters.popleft()
+            del self.__waiters[client_id]
+            if waiters:
+                # client goes to the back of the line for its next request
+                self.__waiters[client_id] = waiters
+            if not future.done():
+                future.set_result(None)
+                return
+        self.__active -= 1
+
+
+class UpstreamScheduler:
+    # shared by every controller in the process so limits are per process, not per request
+    _queues: dict[str, FairQueue] = {}
+    _http_client: httpx.AsyncClient | None = None
+
+    def __init__(self) -> None:
+        self.__logger = logging.getLogger(__name__)
+
+    @classmethod
+    def _client(cls) -> httpx.AsyncClient:
+        if cls._http_client is None:
+            cls._http_client = httpx.AsyncClient(timeout=settings.LLM_REQUEST_TIMEOUT)
+        return cls._http_client
+
+    @classmethod
+    async def close(cls):
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+
+    def _queue(self, model: str) -> FairQueue:
+        if model not in self._queues:
+            limit = settings.LLM_MODEL_CONCURRENCY.get(model, settings.LLM_MAX_CONCURRENCY)
+            self._queues[model] = FairQueue(limit)
+        return self._queues[model]
+
+    def targets(self, model: str) -> List[UpstreamTarget]:
+        targets = [UpstreamTarget(settings.LLM_URL, settings.LLM_SERVICE_API_KEY, model)]
+        targets += [UpstreamTarget(settings.LLM_URL, settings.LLM_SERVICE_API_KEY, m) for m in settings.LLM_FALLBACK_MODELS if m != model]
+        for provider in settings.LLM_FALLBACK_PROVIDERS:
+            targets += [UpstreamTarget(provider.url, provider.api_key, m) for m in (provider.models or [model])]
+        return targets
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float | None:
+        value = response.headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        delay = settings.LLM_RETRY_BASE_DELAY * (2 ** attempt)
+        return min(delay * random.uniform(0.5, 1.5), settings.LLM_RETRY_MAX_DELAY)
+
+    @asynccontextmanager
+    async def _slot(self, model: str, client_id: str):
+        queue = self._queue(model)
+        start = time.monotonic()
+        queue_depth.inc(model=model)
+        try:
+            await queue.acquire(client_id)
+        finally:
+            queue_depth.dec(model=model)
+        queue_wait.observe(time.monotonic() - start, model=model)
+
+        active_requests.inc(model=model)
+        try:
+            yield
+        finally:
+            active_requests.dec(model=model)
+            queue.release()
+
+    @asynccontextmanager
+    async def stream(self, payload: dict, client_id: str = "anonymous"):
+        """
+        Opens a streaming completion, yielding the upstream response once it
+        answered 200. Rate limits and server errors are retried, and then failed
+        over to the next target, only before anything has been streamed.
+        """
+        last_error = "no upstream target configured"
+        targets = self.targets(payload["model"])
+
+        for target_index, target in enumerate(targets):
+            if target_index > 0:
+                upstream_failovers.inc(model=targets[target_index - 1].model, fallback=target.model)
+                self.__logger.info(f"Failing over from {targets[target_index - 1].model} to {target.model}")
+
+            for attempt in range(settings.LLM_MAX_RETRIES + 1):
+                streaming = False
+                retry_after = None
+                try:
+                    async with AsyncExitStack() as stack:
+                        await stack.enter_async_context(self._slot(target.model, client_id))
+                        response = await stack.enter_async_context(
+                            self._client().stream(
+                                "POST",
+                                target.url,
+                                headers={"Authorization": f"Bearer {target.api_key}"},
+                                json={**payload, "model": target.model},
+                            )
+                        )
+
+                        if response.status_code == 200:
+                            streaming = True
+                            yield response
+                            return
+
+                        await response.aread()
+                        status = response.status_code
+                        last_error = f"{target.model} answered {status}: {response.text[:200]}"
+                        retryable = status == 429 or status >= 500
+                        retry_after = self._retry_after(response)
+                except httpx.TransportError as e:
+                    if streaming:
+                        raise
+                    status = "transport"
+                    last_error = f"{target.model} unreachable: {e}"
+                    retryable = True
+
+                # the slot is released before sleeping so other models' requests are not held up
+                if not retryable or attempt == settings.LLM_MAX_RETRIES:
+                    break
+                delay = max(retry_after or 0.0, self._backoff(attempt))
+                if delay > settings.LLM_RETRY_MAX_DELAY:
+                    break
+                upstream_retries.inc(model=target.model, status=status)
+                self.__logger.info(f"Retrying {target.model} in {delay:.2f}s after {status}")
+                await asyncio.sleep(delay)
+
+        raise UpstreamUnavailableError(last_error)
@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, Tuple
+import threading
+import bisect
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def _samples(self) -> Iterable[str]:
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self.__values: Dict[LabelKey, float] = {}
+
+    def inc(self, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + value
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v}" for k, v in self.__values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self.__values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.__values[_label_key(labels)] = value
+
+    def inc(self, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + value
+
+    def dec(self, value: float = 1.0, **labels):
+        self.inc(-value, **labels)
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v}" for k, v in self.__values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description)
+        self.__buckets = tuple(sorted(buckets))
+        self.__values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self.__values.setdefault(key, [[0] * (len(self.__buckets) + 1), 0.0])
+            entry[0][bisect.bisect_left(self.__buckets, value)] += 1
+            entry[1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self.__values.items():
+                cumulative = 0
+                for bound, count in zip(self.__buckets, counts):
+                    cumulative += count
+                    samples.append(f"{self.name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                cumulative += counts[-1]
+                samples.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {cumulative}")
+                samples.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                samples.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    """Process local metrics rendered in the Prometheus text format on /metrics."""
+
+    def __init__(self) -> None:
+        self.__metrics: Dict[str, _Metric] = {}
+        self.__lock = threading.Lock()
+
+    def _register(self, metric_type, name: str, description: str, **kwargs):
+        with self.__lock:
+            if name not in self.__metrics:
+                self.__metrics[name] = metric_type(name, description, **kwargs)
+            return self.__metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._register(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, **kwargs) -> Histogram:
+        return self._register(Histogram, name, description, **kwargs)
+
+    def render(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,91 @@
+from contextvars import ContextVar
+from config.config import settings
+from app.utils.metrics import metrics
+from pathlib import Path
+from typing import Callable
+import logging
+import random
+import hmac
+import time
+import uuid
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    Profiler = None
+
+
+profiles_written = metrics.counter("profiles_written_total", "Request and stage profiles written to PROFILING_DIR")
+
+# id of the profile the current request is recorded under, None when it is not profiled
+current_profile: ContextVar[str | None] = ContextVar("current_profile", default=None)
+
+
+def should_profile(path: str, header: str | None) -> bool:
+    """Whether a request is profiled: a profiled route, and the header carrying PROFILING_TOKEN or the sampling rate."""
+    if not any(path.startswith(prefix) for prefix in settings.PROFILING_ROUTES):
+        return False
+    # without a token the header is ignored, clients could otherwise force profiles of any request
+    if header is not None and settings.PROFILING_TOKEN and hmac.compare_digest(header.encode("utf-8"), settings.PROFILING_TOKEN.encode("utf-8")):
+        return True
+    return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def new_profile_id(method: str, path: str) -> str:
+    slug = "".join(c if c.isalnum() else "_" for c in path.strip("/"))[:60]
+    return f"{time.strftime('%Y%m%dT%H%M%S')}_{method.lower()}_{slug}_{uuid.uuid4().hex[:8]}"
+
+
+class ProfileStore:
+    """
+    Writes speedscope profiles (open them at https://www.speedscope.app) to
+    PROFILING_DIR and keeps at most PROFILING_MAX_FILES files and
+    PROFILING_MAX_BYTES bytes, removing the oldest first.
+    """
+
+    def __init__(self, directory: str = settings.PROFILING_DIR) -> None:
+        self.__directory = Path(directory)
+        self.__logger = logging.getLogger(__name__)
+
+    def write(self, name: str, session) -> Path:
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        path = self.__directory / f"{name}.speedscope.json"
+        path.write_text(SpeedscopeRenderer().render(session), encoding="utf-8")
+        profiles_written.inc()
+        self._enforce_retention()
+        return path
+
+    def _enforce_retention(self):
+        files = sorted(
+            ((path, path.stat()) for path in self.__directory.glob("*.speedscope.json")),
+            key=lambda item: item[1].st_mtime,
+            reverse=True,
+        )
+        kept_bytes = 0
+        for count, (path, stat) in enumerate(files, start=1):
+            kept_bytes += stat.st_size
+            if count > settings.PROFILING_MAX_FILES or kept_bytes > settings.PROFILING_MAX_BYTES:
+                path.unlink(missing_ok=True)
+
+
+def profiled_stage(function: Callable, stage: str) -> Callable:
+    """
+    Wraps a pipeline stage that runs in the executor, so a profiled request
+    gets a profile of that thread as well; the request's own profiler only
+    samples the event loop thread. Returns `function` itself otherwise.
+    """
+    profile_id = current_profile.get()
+    if profile_id is None:
+        return function
+
+    def run(*args, **kwargs):
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="disabled")
+        profiler.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            session = profiler.stop()
+            ProfileStore().write(f"{profile_id}.{stage}.{uuid.uuid4().hex[:6]}", session)
+
+    return run
@@ -0,0 +1,133 @@
+from sentence_transformers import CrossEncoder
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from config.config import settings
+from app.utils.metrics import metrics
+from typing import List
+import hashlib
+import logging
+import asyncio
+import time
+
+
+rerank_seconds = metrics.histogram("reranker_seconds", "Time spent scoring query/chunk pairs with the cross-encoder")
+rerank_skipped = metrics.counter("reranker_skipped_total", "Rerankings skipped, results kept in retrieval order")
+rerank_cache_hits = metrics.counter("reranker_cache_hits_total", "Query/chunk pair scores served from the cache")
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved chunks with a local cross-encoder.
+
+    All uncached pairs of a query are scored in one forward pass, on a
+    single thread of its own, so the passes never compete with each other or
+    take the default executor's threads from file reads and embeddings. The
+    time per pair is tracked, and a reranking predicted to overrun
+    RERANKER_BUDGET_MS is skipped up front, as is one that arrives while a
+    pass is still running; one that overruns anyway is abandoned at the
+    budget and its scores are cached once they arrive. Skipped rerankings
+    keep the retrieval order.
+    """
+
+    # the model, the pair scores and the cost estimate are shared by every request of the process
+    _model: CrossEncoder | None = None
+    _scores: OrderedDict[str, float] = OrderedDict()
+    _seconds_per_pair: float | None = None
+    # created on first use, in the worker rather than in a master that forks
+    _executor: ThreadPoolExecutor | None = None
+    _in_flight: Future | None = None
+
+    def __init__(self, budget_ms: float = settings.RERANKER_BUDGET_MS) -> None:
+        self.__budget = budget_ms / 1000
+        self.__logger = logging.getLogger(__name__)
+
+    @classmethod
+    def preload_model(cls) -> CrossEncoder:
+        if cls._model is None:
+            cls._model = CrossEncoder(settings.RERANKER_MODEL_NAME, max_length=settings.RERANKER_MAX_LENGTH)
+        return cls._model
+
+    @classmethod
+    def _submit(cls, pairs: List[List[str]]) -> Future | None:
+        if cls._in_flight is not None and not cls._in_flight.done():
+            return None
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        cls._in_flight = cls._executor.submit(cls._score, pairs)
+        return cls._in_flight
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            # a pass still running is not waited for, its scores are no longer needed
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @staticmethod
+    def _pair_key(query: str, text: str) -> str:
+        return hashlib.sha1(f"{settings.RERANKER_MODEL_NAME}\0{query}\0{text}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _cache(cls, keys: List[str], scores: List[float]):
+        for key, score in zip(keys, scores):
+            cls._scores[key] = score
+            cls._scores.move_to_end(key)
+        while len(cls._scores) > settings.RERANKER_CACHE_SIZE:
+            cls._scores.popitem(last=False)
+
+    @classmethod
+    def _score(cls, pairs: List[List[str]]) -> tuple[List[float], float]:
+        start = time.perf_counter()
+        scores = cls.preload_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        seconds = time.perf_counter() - start
+        per_pair = seconds / len(pairs)
+        cls._seconds_per_pair = per_pair if cls._seconds_per_pair is None else 0.8 * cls._seconds_per_pair + 0.2 * per_pair
+        return [float(score) for score in scores], seconds
+
+    async def rerank(self, query: str, results: List[dict], limit: int, min_score: float | None = settings.RERANKER_MIN_SCORE) -> List[dict]:
+        """Results ordered by cross-encoder score with a `rerank_score`, cut to `limit` and `min_score`."""
+        if not results:
+            return results
+
+        keys = [self._pair_key(query, (r.get("payload") or {}).get("text", "")) for r in results]
+        scores = {i: self._scores[key] for i, key in enumerate(keys) if key in self._scores}
+        rerank_cache_hits.inc(len(scores))
+        missing = [i for i in range(len(results)) if i not in scores]
+
+        if missing:
+            if self._seconds_per_pair is not None and self._seconds_per_pair * len(missing) > self.__budget:
+                rerank_skipped.inc(reason="predicted")
+                return results[:limit]
+
+            pairs = [[query, (results[i].get("payload") or {}).get("text", "")] for i in missing]
+            submitted = self._submit(pairs)
+            if submitted is None:
+                # waiting behind the running pass would spend the budget in the queue
+                rerank_skipped.inc(reason="busy")
+                return results[:limit]
+            scoring = asyncio.wrap_future(submitted)
+            done, _ = await asyncio.wait({scoring}, timeout=self.__budget)
+            missing_keys = [keys[i] for i in missing]
+            if not done:
+                # the forward pass cannot be interrupted, its scores still serve the next identical query
+                scoring.add_done_callback(lambda f: None if f.cancelled() or f.exception() else self._cache(missing_keys, f.result()[0]))
+                rerank_skipped.inc(reason="budget")
+                self.__logger.info(f"Reranking {len(pairs)} pairs overran {self.__budget * 1000:.0f}ms, kept retrieval order")
+                return results[:limit]
+
+            if scoring.exception() is not None:
+                rerank_skipped.inc(reason="error")
+                self.__logger.warning(f"Reranking failed, kept retrieval order: {scoring.exception()}")
+                return results[:limit]
+
+            new_scores, seconds = scoring.result()
+            rerank_seconds.observe(seconds)
+            self._cache(missing_keys, new_scores)
+            scores.update(zip(missing, new_scores))
+
+        ranked = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+        return [
+            {**results[i], "rerank_score": scores[i]}
+            for i in ranked
+            if min_score is None or scores[i] >= min_score
+        ][:limit]
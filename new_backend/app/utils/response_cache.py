@@ -0,0 +1,178 @@
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from config.config import settings
+from typing import AsyncIterator, Awaitable, Callable, List
+import numpy as np
+import hashlib
+import logging
+import asyncio
+import base64
+import json
+
+
+class _InFlightResponse:
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self.__changed = asyncio.Condition()
+
+    async def publish(self, chunk: str):
+        async with self.__changed:
+            self.chunks.append(chunk)
+            self.__changed.notify_all()
+
+    async def finish(self):
+        async with self.__changed:
+            self.done = True
+            self.__changed.notify_all()
+
+    async def replay(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            async with self.__changed:
+                await self.__changed.wait_for(lambda: self.done or index < len(self.chunks))
+                pending = self.chunks[index:]
+                done = self.done
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if done and index >= len(self.chunks):
+                return
+
+
+class ResponseCache:
+    """
+    Redis backed cache for streamed chat completions.
+
+    Exact entries are keyed by the model and the normalized message list.
+    Semantic entries store the embedding of the last user message under the
+    hash of the preceding conversation, so a paraphrased question only hits
+    when it is asked in the same context. Identical requests that arrive while
+    the first one is still streaming share a single upstream call.
+    """
+
+    EXACT_PREFIX = "chat_cache:exact:"
+    SEMANTIC_PREFIX = "chat_cache:semantic:"
+
+    # process wide so every controller instance coalesces on the same requests
+    _in_flight: dict[str, _InFlightResponse] = {}
+
+    def __init__(self, redis_client, file_processing_pipeline: FileProcessingPipeline | None = None) -> None:
+        self.__redis_client = redis_client
+        self.__file_processing_pipeline = file_processing_pipeline
+        self.__logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def normalize_messages(messages: List[dict]) -> List[dict]:
+        return [
+            {
+                "role": str(m.get("role", "")).strip().lower(),
+                "content": " ".join(str(m.get("content", "")).split()),
+            }
+            for m in messages
+        ]
+
+    @staticmethod
+    def _digest(value) -> str:
+        return hashlib.sha256(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def exact_key(self, model: str, messages: List[dict]) -> str:
+        return self._digest([model, self.normalize_messages(messages)])
+
+    def _context_key(self, model: str, messages: List[dict]) -> str:
+        return self._digest([model, self.normalize_messages(messages[:-1])])
+
+    async def _embed_question(self, messages: List[dict]) -> np.ndarray | None:
+        if self.__file_processing_pipeline is None or not messages or messages[-1].get("role") != "user":
+            return None
+        embeddings = await self.__file_processing_pipeline.embed_chunks([messages[-1].get("content", "")])
+        vector = embeddings[0]
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    async def get_exact(self, key: str) -> List[str] | None:
+        cached = await self.__redis_client.get(self.EXACT_PREFIX + key)
+        return json.loads(cached) if cached else None
+
+    async def get_semantic(self, model: str, messages: List[dict], question_vector: np.ndarray) -> List[str] | None:
+        entries = await self.__redis_client.lrange(self.SEMANTIC_PREFIX + self._context_key(model, messages), 0, -1)
+        if not entries:
+            return None
+
+        decoded = [json.loads(entry) for entry in entries]
+        matrix = np.stack([np.frombuffer(base64.b64decode(e["vector"]), dtype=np.float32) for e in decoded])
+        similarities = matrix @ question_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < settings.SEMANTIC_CACHE_THRESHOLD:
+            return None
+
+        self.__logger.info(f"Semantic cache hit with similarity {similarities[best]:.3f}")
+        return await self.get_exact(decoded[best]["key"])
+
+    async def store(self, key: str, model: str, messages: List[dict], chunks: List[str], question_vector: np.ndarray | None):
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.set(self.EXACT_PREFIX + key, json.dumps(chunks), ex=settings.RESPONSE_CACHE_TTL)
+        if question_vector is not None:
+            semantic_key = self.SEMANTIC_PREFIX + self._context_key(model, messages)
+            entry = {"key": key, "vector": base64.b64encode(question_vector.astype(np.float32).tobytes()).decode("ascii")}
+            pipe.lpush(semantic_key, json.dumps(entry))
+            pipe.ltrim(semantic_key, 0, settings.SEMANTIC_CACHE_MAX_ENTRIES - 1)
+            pipe.expire(semantic_key, settings.RESPONSE_CACHE_TTL)
+        await pipe.execute()
+
+    async def _produce(self, key: str, in_flight: _InFlightResponse, producer: Callable[[], AsyncIterator[str]], is_cacheable: Callable[[], bool], store: Callable[[List[str]], Awaitable[None]]):
+        try:
+            async for chunk in producer():
+                await in_flight.publish(chunk)
+            if is_cacheable():
+                await store(in_flight.chunks)
+        except Exception as e:
+            self.__logger.error(f"Error while producing cached response: {e}")
+        finally:
+            self._in_flight.pop(key, None)
+            await in_flight.finish()
+
+    async def _subscribe(self, key: str, in_flight: _InFlightResponse) -> AsyncIterator[str]:
+        in_flight.subscribers += 1
+        try:
+            async for chunk in in_flight.replay():
+                yield chunk
+        finally:
+            in_flight.subscribers -= 1
+            if in_flight.subscribers == 0 and not in_flight.done and in_flight.task is not None:
+                # nobody is listening anymore, stop paying for the generation
+                in_flight.task.cancel()
+
+    async def stream(self, model: str, messages: List[dict], producer: Callable[[], AsyncIterator[str]], is_cacheable: Callable[[], bool]) -> AsyncIterator[str]:
+        key = self.exact_key(model, messages)
+
+        cached = await self.get_exact(key)
+        if cached is None and key in self._in_flight:
+            async for chunk in self._subscribe(key, self._in_flight[key]):
+                yield chunk
+            return
+
+        question_vector = None
+        if cached is None and settings.SEMANTIC_CACHE_ENABLED:
+            question_vector = await self._embed_question(messages)
+            if question_vector is not None:
+                cached = await self.get_semantic(model, messages, question_vector)
+
+        if cached is not None:
+            for chunk in cached:
+                yield chunk
+            return
+
+        if key in self._in_flight:
+            in_flight = self._in_flight[key]
+        else:
+            in_flight = _InFlightResponse()
+            self._in_flight[key] = in_flight
+
+            async def store(chunks: List[str]):
+                await self.store(key, model, messages, chunks, question_vector)
+
+            in_flight.task = asyncio.create_task(self._produce(key, in_flight, producer, is_cacheable, store))
+
+        async for chunk in self._subscribe(key, in_flight):
+            yield chunk
@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Type, TypeVar
+import msgpack
+import orjson
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value)
+
+
+def loads(data: bytes | str) -> Any:
+    # orjson.JSONDecodeError is a json.JSONDecodeError, existing handlers keep working
+    return orjson.loads(data)
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot pack {type(value).__name__}")
+
+
+def pack_model(model: BaseModel) -> bytes:
+    """Packs a model into msgpack, the form session state is kept in Redis."""
+    return msgpack.packb(model.dict(), default=_default, use_bin_type=True)
+
+
+def unpack_model(model_class: Type[M], data: bytes) -> M:
+    # a msgpack map never starts with "{", values written as JSON before the switch still load
+    if data[:1] == b"{":
+        return model_class.parse_obj(orjson.loads(data))
+    return model_class.parse_obj(msgpack.unpackb(data, raw=False))
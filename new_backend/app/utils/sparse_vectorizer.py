@@ -0,0 +1,117 @@
+from qdrant_client.http.models import SparseVector
+from collections import Counter
+from config.config import settings
+from typing import List
+import hashlib
+import logging
+import asyncio
+import math
+import re
+
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+(?:[-'][0-9a-z]+)*")
+
+
+class SparseVectorizer:
+    """
+    BM25 term vectors for Qdrant sparse search.
+
+    Documents are encoded with the BM25 term-frequency component only and the
+    query carries the IDF weights, so the sparse dot product computed by Qdrant
+    is the BM25 score and IDF changes apply to already indexed points without
+    re-encoding them. Document frequencies and corpus length are kept in Redis
+    per collection, and are only added once the chunks were stored, so a failed
+    upsert leaves them as they were.
+    """
+
+    # collections indexed before the statistics were kept per collection
+    LEGACY_PREFIX = "sparse"
+
+    def __init__(self, redis_client, k1: float = settings.BM25_K1, b: float = settings.BM25_B) -> None:
+        self.__redis_client = redis_client
+        self.__k1 = k1
+        self.__b = b
+        self.__logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _keys(collection_name: str | None) -> tuple[str, str, str]:
+        prefix = SparseVectorizer.LEGACY_PREFIX if collection_name is None else f"sparse:{collection_name}"
+        return f"{prefix}:df", f"{prefix}:docs", f"{prefix}:tokens"
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return TOKEN_PATTERN.findall(text.lower())
+
+    @staticmethod
+    def term_id(term: str) -> int:
+        # stable across processes, so workers never need to agree on a shared id table
+        return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little") & 0x7FFFFFFF
+
+    def _encode_document(self, term_counts: Counter, doc_length: int, avg_doc_length: float) -> SparseVector:
+        norm = self.__k1 * (1 - self.__b + self.__b * doc_length / max(avg_doc_length, 1.0))
+        weights: dict[int, float] = {}
+        for term, tf in term_counts.items():
+            idx = self.term_id(term)
+            weights[idx] = weights.get(idx, 0.0) + tf * (self.__k1 + 1) / (tf + norm)
+        return SparseVector(indices=list(weights.keys()), values=list(weights.values()))
+
+    def _count_terms(self, texts: List[str]) -> List[Counter]:
+        return [Counter(self.tokenize(text)) for text in texts]
+
+    async def encode_documents(self, collection_name: str, texts: List[str]) -> List[SparseVector]:
+        """Encodes chunks of a collection, without counting them in its statistics, see record_documents."""
+        loop = asyncio.get_running_loop()
+        term_counts = await loop.run_in_executor(None, self._count_terms, texts)
+
+        _, docs_key, tokens_key = self._keys(collection_name)
+        n_docs, n_tokens = await self.__redis_client.mget(docs_key, tokens_key)
+        # the chunks count towards the average length they are normalised with
+        n_docs = int(n_docs or 0) + len(term_counts)
+        n_tokens = int(n_tokens or 0) + sum(sum(counts.values()) for counts in term_counts)
+        avg_doc_length = n_tokens / n_docs if n_docs else 1.0
+
+        return [self._encode_document(counts, sum(counts.values()), avg_doc_length) for counts in term_counts]
+
+    async def record_documents(self, collection_name: str, texts: List[str]):
+        """Adds stored chunks to the collection's statistics, once the upsert that stored them returned."""
+        loop = asyncio.get_running_loop()
+        term_counts = await loop.run_in_executor(None, self._count_terms, texts)
+        document_frequencies: Counter = Counter()
+        total_tokens = 0
+        for counts in term_counts:
+            document_frequencies.update(counts.keys())
+            total_tokens += sum(counts.values())
+
+        df_key, docs_key, tokens_key = self._keys(collection_name)
+        pipe = self.__redis_client.pipeline(transaction=False)
+        for term, df in document_frequencies.items():
+            pipe.hincrby(df_key, term, df)
+        pipe.incrby(docs_key, len(term_counts))
+        pipe.incrby(tokens_key, total_tokens)
+        results = await pipe.execute()
+        self.__logger.info(f"Updated sparse statistics of {collection_name}: {results[-2]} documents, {results[-1]} tokens")
+
+    async def delete(self, collection_name: str):
+        await self.__redis_client.delete(*self._keys(collection_name))
+
+    async def encode_query(self, collection_name: str, text: str) -> SparseVector:
+        terms = list(dict.fromkeys(self.tokenize(text)))
+        if not terms:
+            return SparseVector(indices=[], values=[])
+
+        df_key, docs_key, _ = self._keys(collection_name)
+        if not await self.__redis_client.exists(docs_key):
+            df_key, docs_key, _ = self._keys(None)
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.get(docs_key)
+        pipe.hmget(df_key, terms)
+        n_docs_raw, dfs = await pipe.execute()
+        n_docs = int(n_docs_raw or 0)
+
+        weights: dict[int, float] = {}
+        for term, df_raw in zip(terms, dfs):
+            df = int(df_raw or 0)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            idx = self.term_id(term)
+            weights[idx] = weights.get(idx, 0.0) + idf
+        return SparseVector(indices=list(weights.keys()), values=list(weights.values()))
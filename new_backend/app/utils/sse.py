@@ -0,0 +1,114 @@
+from config.config import settings
+from app.utils.serialization import dumps, loads
+from typing import AsyncIterator, Awaitable, Callable
+import asyncio
+import json
+import time
+
+
+class StreamError(str):
+    """Marks a chunk of a chat stream as an error message rather than model output."""
+
+
+def parse_sse_data(line: str) -> str | None:
+    if not line.startswith("data:"):
+        return None
+    data = line[5:]
+    return data[1:] if data.startswith(" ") else data
+
+
+def extract_delta(data: str) -> str | None:
+    try:
+        data_obj = loads(data)
+    except json.JSONDecodeError:
+        return None
+    choices = data_obj.get("choices")
+    if not choices:
+        return None
+    delta = choices[0].get("delta")
+    return delta.get("content") if delta else None
+
+
+def format_sse(data: str, event: str | None = None) -> str:
+    frame = f"event: {event}\n" if event else ""
+    for line in data.split("\n"):
+        frame += f"data: {line}\n"
+    return frame + "\n"
+
+
+def format_sse_delta(content: str) -> str:
+    return format_sse(dumps({"choices": [{"index": 0, "delta": {"content": content}}]}).decode("utf-8"))
+
+
+async def coalesce_stream(
+    chunks: AsyncIterator[str],
+    max_delay: float = settings.STREAM_COALESCE_MS / 1000,
+    max_bytes: int = settings.STREAM_COALESCE_BYTES,
+    queue_size: int = settings.STREAM_QUEUE_SIZE,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    poll_interval: float = settings.STREAM_DISCONNECT_POLL_INTERVAL,
+) -> AsyncIterator[str]:
+    """
+    Merges small deltas into larger writes.
+
+    The upstream is read by a separate task into a bounded queue, so a slow
+    client stops the upstream read instead of buffering without limit. The task
+    is cancelled, closing the upstream request, as soon as the consumer stops
+    or the client is found to be disconnected.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    end = object()
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(StreamError(f"Error: Stream error: {str(e)}\n"))
+        await queue.put(end)
+
+    producer = asyncio.create_task(produce())
+
+    try:
+        finished = False
+        while not finished:
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                continue
+
+            if first is end:
+                break
+            if isinstance(first, StreamError):
+                yield first
+                continue
+
+            buffer = [first]
+            size = len(first)
+            deadline = time.monotonic() + max_delay
+            while size < max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    chunk = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if chunk is end:
+                    finished = True
+                    break
+                if isinstance(chunk, StreamError):
+                    if buffer:
+                        yield "".join(buffer)
+                    buffer, size = [], 0
+                    yield chunk
+                    continue
+                buffer.append(chunk)
+                size += len(chunk)
+
+            if buffer:
+                yield "".join(buffer)
+    finally:
+        producer.cancel()
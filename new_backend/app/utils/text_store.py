@@ -0,0 +1,249 @@
+from qdrant_client.http.models import PointStruct
+from config.config import settings
+from app.utils.metrics import metrics
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List
+import threading
+import fcntl
+import logging
+import shutil
+import mmap
+import json
+import zlib
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+hydrated_chunks = metrics.counter("text_store_hydrated_chunks_total", "Chunk texts read back from the text store for search results")
+decoded_blocks = metrics.counter("text_store_decoded_blocks_total", "Compressed text store blocks decompressed for search results")
+
+# moved out of the payload, kept once per document instead of once per point
+DOCUMENT_FIELDS = ("source", "document")
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", value)
+
+
+def _compress(compression: str, data: bytes) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=settings.TEXT_STORE_ZSTD_LEVEL).compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(compression: str, data) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _merge_chunks(chunks: List[str]) -> tuple[bytes, List[tuple[int, int]]]:
+    """
+    Lays the chunks out as one document, each chunk sharing the bytes it has in
+    common with the end of the previous one, so the overlap is stored once.
+    Every chunk is an exact slice of the result, whatever the chunker did.
+    """
+    document = bytearray()
+    spans = []
+    previous = b""
+    for chunk in chunks:
+        encoded = chunk.encode("utf-8")
+        shared = 0
+        # the chunker's overlap is OVERLAP characters, at most 4 bytes each
+        for size in range(min(len(previous), len(encoded), 4 * settings.OVERLAP), 0, -1):
+            if previous.endswith(encoded[:size]):
+                shared = size
+                break
+        offset = len(document) - shared
+        document += encoded[shared:]
+        spans.append((offset, len(encoded)))
+        previous = encoded
+    return bytes(document), spans
+
+
+class TextStore:
+    """
+    Chunk texts of a collection, kept on local disk instead of in the Qdrant payload.
+
+    Each document is one file of the concatenated chunk texts, overlaps stored
+    once, split into TEXT_STORE_BLOCK_SIZE blocks that are compressed one by
+    one (zstd when installed, else zlib, or none). A point keeps the document
+    number and the byte offset and length of its text; source and document
+    name are kept once per document in the collection's documents.json.
+
+    Files are memory mapped on read. Hydrating a page of search results
+    decompresses each block they touch once, straight from the mapping, and
+    uncompressed documents are sliced without copying. The store is local to
+    the host, every process serving the collection must see the same directory;
+    writers of a collection take an flock on its documents.lock, so workers
+    and bulk imports never hand out the same document number.
+    """
+
+    def __init__(self, root: str | Path = settings.TEXT_STORE_DIR, compression: str = settings.TEXT_STORE_COMPRESSION, block_size: int = settings.TEXT_STORE_BLOCK_SIZE) -> None:
+        if compression not in ("zstd", "zlib", "none"):
+            raise ValueError(f"Unknown text store compression '{compression}', expected 'zstd', 'zlib' or 'none'")
+        self.__root = Path(root)
+        self.__compression = "zlib" if compression == "zstd" and zstandard is None else compression
+        self.__block_size = block_size
+        # the files never change once written
+        self.__documents: dict[str, List[dict]] = {}
+        self.__maps: dict[Path, mmap.mmap] = {}
+        self.__lock = threading.Lock()
+        self.__logger = logging.getLogger(__name__)
+
+    def collection_dir(self, collection_name: str) -> Path:
+        return self.__root / _slug(collection_name)
+
+    def _read_documents(self, collection_name: str) -> List[dict]:
+        path = self.collection_dir(collection_name) / "documents.json"
+        documents = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+        self.__documents[collection_name] = documents
+        return documents
+
+    def _document(self, collection_name: str, number: int) -> dict:
+        documents = self.__documents.get(collection_name)
+        if documents is None or number >= len(documents):
+            # written by another process since it was read
+            documents = self._read_documents(collection_name)
+        if number >= len(documents):
+            raise ValueError(f"Document {number} of {collection_name} is not in the text store")
+        return documents[number]
+
+    @contextmanager
+    def _locked(self, directory: Path):
+        # the thread lock covers this process, the file lock the others
+        with self.__lock, open(directory / "documents.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _map(self, path: Path) -> mmap.mmap:
+        mapping = self.__maps.get(path)
+        if mapping is None:
+            with open(path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__maps[path] = mapping
+        return mapping
+
+    def add_document(self, collection_name: str, chunks: List[str], metadata: dict) -> List[dict]:
+        """Stores one document's chunks and returns the payload fields that refer to each of them."""
+        data, spans = _merge_chunks(chunks)
+        directory = self.collection_dir(collection_name)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        blocks = []
+        compressed = bytearray()
+        if self.__compression == "none":
+            compressed += data
+        else:
+            for start in range(0, len(data), self.__block_size):
+                block = _compress(self.__compression, data[start:start + self.__block_size])
+                blocks.append([len(compressed), len(block)])
+                compressed += block
+
+        with self._locked(directory):
+            documents = self._read_documents(collection_name)
+            number = len(documents)
+            file_name = f"{number:06d}.txt" + ("" if self.__compression == "none" else f".{self.__compression}")
+            tmp_path = directory / (file_name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, directory / file_name)
+
+            documents.append({
+                **metadata,
+                "file": file_name,
+                "compression": self.__compression,
+                "block_size": self.__block_size,
+                "blocks": blocks,
+                "size": len(data),
+            })
+            # the document becomes visible once its file is complete
+            tmp_path = directory / "documents.json.tmp"
+            tmp_path.write_text(json.dumps(documents), encoding="utf-8")
+            os.replace(tmp_path, directory / "documents.json")
+
+        self.__logger.info(f"Stored {len(chunks)} chunks of {collection_name}, {len(data)} bytes as {len(compressed)}")
+        return [{"text_doc": number, "text_offset": offset, "text_length": length} for offset, length in spans]
+
+    def externalize(self, collection_name: str, points: List[PointStruct]):
+        """Moves the text, source and document of the points into the store, in place, one document per source."""
+        groups: dict[tuple, List[PointStruct]] = {}
+        for point in points:
+            payload = point.payload or {}
+            groups.setdefault(tuple(payload.get(field) for field in DOCUMENT_FIELDS), []).append(point)
+
+        for key, group in groups.items():
+            refs = self.add_document(collection_name, [p.payload["text"] for p in group], dict(zip(DOCUMENT_FIELDS, key)))
+            for point, ref in zip(group, refs):
+                point.payload = {k: v for k, v in point.payload.items() if k != "text" and k not in DOCUMENT_FIELDS}
+                point.payload.update(ref)
+
+    def _read(self, directory: Path, document: dict, offset: int, length: int, blocks: dict) -> str:
+        if length == 0:
+            return ""
+        mapping = self._map(directory / document["file"])
+        if document["compression"] == "none":
+            return str(memoryview(mapping)[offset:offset + length], "utf-8")
+
+        block_size = document["block_size"]
+        first, last = offset // block_size, (offset + length - 1) // block_size
+        parts = []
+        for number in range(first, last + 1):
+            key = (document["file"], number)
+            if key not in blocks:
+                start, size = document["blocks"][number]
+                blocks[key] = _decompress(document["compression"], memoryview(mapping)[start:start + size])
+                decoded_blocks.inc()
+            parts.append(blocks[key])
+        start = offset - first * block_size
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        return data[start:start + length].decode("utf-8")
+
+    def hydrate(self, collection_name: str, payloads: Iterable[dict | None]):
+        """Puts text, source and document back into payloads that refer to the store, in place."""
+        directory = self.collection_dir(collection_name)
+        # results from one document share blocks, each is decompressed once per call
+        blocks: dict[tuple[str, int], bytes] = {}
+        for payload in payloads:
+            if not payload or "text_doc" not in payload:
+                continue
+            document = self._document(collection_name, payload["text_doc"])
+            payload["text"] = self._read(directory, document, payload["text_offset"], payload["text_length"], blocks)
+            for field in DOCUMENT_FIELDS:
+                payload.setdefault(field, document.get(field))
+            hydrated_chunks.inc()
+
+    def forget(self, collection_name: str | None = None):
+        """Drops the cached documents and mappings of a collection, or of all of them, after it was deleted by any process."""
+        directory = None if collection_name is None else self.collection_dir(collection_name)
+        # not closed, a search in another thread may still read from it, the mapping goes with its last reference
+        for path in list(self.__maps):
+            if directory is None or path.parent == directory:
+                self.__maps.pop(path, None)
+        if collection_name is None:
+            self.__documents.clear()
+        else:
+            self.__documents.pop(collection_name, None)
+
+    def delete(self, collection_name: str):
+        self.forget(collection_name)
+        directory = self.collection_dir(collection_name)
+        if not directory.exists():
+            return
+        with self._locked(directory):
+            for path in directory.glob("*"):
+                if path.name != "documents.lock":
+                    path.unlink(missing_ok=True)
+        # the lock file goes once it is released
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,139 @@
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.trace import Link, SpanContext, TraceFlags, Status, StatusCode
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config.config import settings
+from typing import Sequence
+import threading
+import hashlib
+import logging
+import time
+import uuid
+
+
+tracer = trace.get_tracer("talks_backend")
+
+# ids the next span must take, used to emit the root span of an upload session
+_forced_ids: ContextVar[tuple[int, int] | None] = ContextVar("forced_ids", default=None)
+
+
+class SessionIdGenerator(RandomIdGenerator):
+    def generate_span_id(self) -> int:
+        forced = _forced_ids.get()
+        return forced[1] if forced is not None else super().generate_span_id()
+
+    def generate_trace_id(self) -> int:
+        forced = _forced_ids.get()
+        return forced[0] if forced is not None else super().generate_trace_id()
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one OTLP-like JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self.__lock, open(self.__path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def session_ids(upload_id: str) -> tuple[int, int]:
+    """Trace id and root span id of an upload session, the same in every worker."""
+    digest = hashlib.sha256(upload_id.encode("utf-8")).digest()
+    try:
+        trace_id = uuid.UUID(upload_id).int
+    except ValueError:
+        # an unknown id from a client, it still gets a trace and the controller reports the missing session
+        trace_id = int.from_bytes(digest[8:24], "big")
+    return trace_id or 1, int.from_bytes(digest[:8], "big") or 1
+
+
+def _session_sampled(trace_id: int) -> bool:
+    # the ratio sampler only looks at the trace id, so every worker and the root span in end_session decide alike
+    result = TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO).should_sample(None, trace_id, "upload.session")
+    return result.decision.is_sampled()
+
+
+def _session_context(upload_id: str) -> Context:
+    trace_id, span_id = session_ids(upload_id)
+    flags = TraceFlags.SAMPLED if _session_sampled(trace_id) else TraceFlags.DEFAULT
+    parent = SpanContext(trace_id=trace_id, span_id=span_id, is_remote=True, trace_flags=TraceFlags(flags))
+    return trace.set_span_in_context(trace.NonRecordingSpan(parent))
+
+
+@contextmanager
+def session_span(name: str, upload_id: str, **attributes):
+    """
+    A span in the upload session's trace, under its root span, linked to the
+    span of the request it runs in. Spans started inside it, Redis, Qdrant
+    and LLM calls included, join the session's trace.
+    """
+    request_span = trace.get_current_span().get_span_context()
+    links = [Link(request_span)] if request_span.is_valid else None
+    with tracer.start_as_current_span(name, context=_session_context(upload_id), links=links, attributes={"upload.id": upload_id, **attributes}) as span:
+        yield span
+
+
+def end_session(upload_id: str, started_at: float, error: str | None = None, **attributes):
+    """Emits the session's root span, from /upload/init to now, with the ids its children already refer to."""
+    token = _forced_ids.set(session_ids(upload_id))
+    try:
+        span = tracer.start_span(
+            "upload.session",
+            context=Context(),
+            start_time=int(started_at * 1e9) if started_at else None,
+            attributes={"upload.id": upload_id, **attributes},
+        )
+    finally:
+        _forced_ids.reset(token)
+    if error is not None:
+        span.set_status(Status(StatusCode.ERROR, error))
+    span.end(end_time=time.time_ns())
+
+
+def _exporter() -> SpanExporter:
+    if settings.TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    if settings.TRACING_EXPORTER == "file":
+        return JsonLinesSpanExporter(settings.TRACING_FILE)
+    raise ValueError(f"Unknown tracing exporter '{settings.TRACING_EXPORTER}', expected 'file' or 'otlp'")
+
+
+def setup_tracing():
+    """Installs the tracer provider and instruments Redis, httpx (LLM calls, Qdrant over REST) and gRPC (Qdrant)."""
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.instrumentation.grpc import GrpcAioInstrumentorClient
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+        id_generator=SessionIdGenerator(),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(provider)
+
+    RedisInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+    GrpcAioInstrumentorClient().instrument()
+    logging.getLogger(__name__).info(f"Tracing to {settings.TRACING_EXPORTER}")
+
+
+def shutdown_tracing():
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
@@ -0,0 +1,44 @@
+from typing import List, NamedTuple
+import re
+
+
+# every talk in the transcript export starts on a new page with "<yyyy-mmdd>, <title>"
+TALK_HEADER = re.compile(r"^\s*(\d{4}-\d{4}), (.+)$")
+
+
+class Talk(NamedTuple):
+    talk_id: str
+    title: str
+    text: str
+
+
+def _slug(value: str, max_length: int = 60) -> str:
+    return re.sub(r"[^0-9a-z]+", "-", value.lower()).strip("-")[:max_length].rstrip("-")
+
+
+def split_talks(text: str, fallback_id: str = "document") -> List[Talk]:
+    pages = [page.strip() for page in text.replace("\r\n", "\n").split("\f")]
+    talks: List[Talk] = []
+    seen: dict[str, int] = {}
+
+    for page in pages:
+        if not page:
+            continue
+        header = TALK_HEADER.match(page.split("\n", 1)[0])
+        if header is None:
+            if talks:
+                # page break inside a talk
+                talks[-1] = talks[-1]._replace(text=f"{talks[-1].text}\n{page}")
+                continue
+            talk_id, title = _slug(fallback_id), fallback_id
+        else:
+            title = header.group(2).strip()
+            talk_id = f"{header.group(1)}_{_slug(title)}"
+
+        # several talks share a date and title prefix, keep ids stable by order of appearance
+        seen[talk_id] = seen.get(talk_id, 0) + 1
+        if seen[talk_id] > 1:
+            talk_id = f"{talk_id}_{seen[talk_id]}"
+        talks.append(Talk(talk_id, title, page))
+
+    return talks
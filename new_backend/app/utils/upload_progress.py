@@ -0,0 +1,131 @@
+from redis.client import NEVER_DECODE
+from config.config import settings
+from typing import AsyncIterator, List
+import json
+
+
+STAGES = ("uploading", "merging", "embedding", "storing", "done", "failed")
+FINAL_STAGES = ("done", "failed")
+
+
+def missing_ranges(bitmap: bytes, total: int, limit: int = settings.UPLOAD_PROGRESS_MAX_RANGES) -> List[List[int]]:
+    """Inclusive [first, last] ranges of chunk indexes whose bit is not set."""
+    ranges: List[List[int]] = []
+    start = None
+    for byte_index, byte in enumerate(bitmap):
+        if byte == 0xFF and start is None:
+            continue
+        for bit in range(8):
+            index = byte_index * 8 + bit
+            if index >= total:
+                break
+            if byte >> (7 - bit) & 1:
+                if start is not None:
+                    ranges.append([start, index - 1])
+                    start = None
+            elif start is None:
+                start = index
+        if len(ranges) >= limit:
+            return ranges[:limit]
+
+    # Redis only stores the bitmap up to the highest set bit, the rest is missing
+    tail = len(bitmap) * 8
+    if start is not None:
+        ranges.append([start, total - 1])
+    elif tail < total:
+        ranges.append([tail, total - 1])
+    return ranges[:limit]
+
+
+class UploadProgress:
+    """
+    Progress of chunked uploads, kept in Redis and pushed over pub/sub.
+
+    Received chunks are bits in a Redis bitmap, so recording a chunk is one
+    SETBIT and an event costs a read of total_chunks / 8 bytes. Every worker
+    publishes to the upload's channel, so a subscriber connected to any
+    worker sees all chunks and stages.
+    """
+
+    def __init__(self, redis_client) -> None:
+        self.__redis_client = redis_client
+
+    @staticmethod
+    def _key(upload_id: str) -> str:
+        return f"upload_progress:{upload_id}"
+
+    async def start(self, upload_id: str, total_chunks: int):
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.hset(self._key(upload_id), mapping={"stage": "uploading", "total": total_chunks})
+        pipe.expire(self._key(upload_id), settings.CHUNK_TTL)
+        await pipe.execute()
+
+    def _event(self, upload_id: str, meta: dict, bitmap: bytes | None) -> dict:
+        total = int(meta["total"])
+        bitmap = bitmap or b""
+        event = {
+            "upload_id": upload_id,
+            "stage": meta["stage"],
+            "received": int.from_bytes(bitmap, "big").bit_count(),
+            "total": total,
+            "missing": missing_ranges(bitmap, total),
+        }
+        if meta.get("error"):
+            event["error"] = meta["error"]
+        return event
+
+    async def _read(self, upload_id: str, refresh_ttl: bool = False) -> tuple[dict, bytes | None]:
+        pipe = self.__redis_client.pipeline(transaction=False)
+        pipe.hgetall(self._key(upload_id))
+        # the bitmap is binary, it must bypass the client's utf-8 decoding
+        pipe.execute_command("GET", f"{self._key(upload_id)}:received", **{NEVER_DECODE: True})
+        if refresh_ttl:
+            pipe.expire(f"{self._key(upload_id)}:received", settings.CHUNK_TTL)
+        meta, bitmap, *_ = await pipe.execute()
+        if "total" not in meta:
+            raise ValueError("Upload session not found")
+        return meta, bitmap
+
+    async def _publish(self, upload_id: str, event: dict):
+        await self.__redis_client.publish(self._key(upload_id), json.dumps(event))
+
+    async def snapshot(self, upload_id: str) -> dict:
+        meta, bitmap = await self._read(upload_id)
+        return self._event(upload_id, meta, bitmap)
+
+    async def chunk_received(self, upload_id: str, chunk_index: int) -> dict:
+        await self.__redis_client.setbit(f"{self._key(upload_id)}:received", chunk_index, 1)
+        meta, bitmap = await self._read(upload_id, refresh_ttl=True)
+        event = self._event(upload_id, meta, bitmap)
+        await self._publish(upload_id, event)
+        return event
+
+    async def set_stage(self, upload_id: str, stage: str, error: str | None = None) -> dict:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown upload stage '{stage}', expected one of {STAGES}")
+        mapping = {"stage": stage}
+        if error is not None:
+            mapping["error"] = error
+        await self.__redis_client.hset(self._key(upload_id), mapping=mapping)
+        event = await self.snapshot(upload_id)
+        await self._publish(upload_id, event)
+        return event
+
+    async def subscribe(self, upload_id: str, heartbeat: float = settings.UPLOAD_PROGRESS_HEARTBEAT) -> AsyncIterator[dict | None]:
+        """Yields the current state, then every event until a final stage; None every `heartbeat` seconds of silence."""
+        pubsub = self.__redis_client.pubsub()
+        # subscribe before the snapshot so no event falls between the two
+        await pubsub.subscribe(self._key(upload_id))
+        try:
+            event = await self.snapshot(upload_id)
+            yield event
+            while event["stage"] not in FINAL_STAGES:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+                if message is None:
+                    yield None
+                    continue
+                event = json.loads(message["data"])
+                yield event
+        finally:
+            await pubsub.unsubscribe(self._key(upload_id))
+            await pubsub.aclose()
@@ -0,0 +1,176 @@
+from qdrant_client.http.models import PointStruct
+from redis.client import NEVER_DECODE
+from config.config import settings
+from pathlib import Path
+from typing import List
+import numpy as np
+import asyncio
+import io
+import os
+import re
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", value)
+
+
+class VectorProjection:
+    """
+    Linear map from the model's embeddings to the small first-pass vector.
+
+    "pca" centres the vectors on the corpus mean and keeps the top principal
+    components fitted on the collection's own embeddings, "truncate" keeps
+    the leading dimensions, which suits Matryoshka-trained models. Projected
+    vectors are L2 normalised for cosine search.
+    """
+
+    METHODS = ("pca", "truncate")
+
+    def __init__(self, method: str, mean: np.ndarray, components: np.ndarray) -> None:
+        self.method = method
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors, dimension: int = settings.SMALL_VECTOR_DIMENSION, method: str = settings.SMALL_VECTOR_PROJECTION) -> "VectorProjection":
+        if method not in cls.METHODS:
+            raise ValueError(f"Unknown projection '{method}', expected one of {cls.METHODS}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        full_dimension = vectors.shape[1]
+        if dimension >= full_dimension:
+            raise ValueError(f"Small vector dimension {dimension} must be below the model dimension {full_dimension}")
+
+        if method == "truncate":
+            return cls(method, np.zeros(full_dimension), np.eye(full_dimension)[:dimension])
+
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        components = np.zeros((dimension, full_dimension), dtype=np.float32)
+        # fewer points than components leave the remaining rows at zero
+        components[:min(dimension, vt.shape[0])] = vt[:dimension]
+        return cls(method, mean, components)
+
+    def project(self, vectors) -> np.ndarray:
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def attach(self, points: List[PointStruct]) -> List[PointStruct]:
+        """Adds the small vector to points that carry the full dense vector."""
+        if not points:
+            return points
+        small = self.project([point.vector[settings.DENSE_VECTOR_NAME] for point in points]).tolist()
+        for point, vector in zip(points, small):
+            point.vector[settings.SMALL_VECTOR_NAME] = vector
+        return points
+
+    def dumps(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, method=np.array(self.method), mean=self.mean, components=self.components)
+        return buffer.getvalue()
+
+    @classmethod
+    def loads(cls, data: bytes) -> "VectorProjection":
+        arrays = np.load(io.BytesIO(data))
+        return cls(str(arrays["method"]), arrays["mean"], arrays["components"])
+
+
+class MissingProjectionError(Exception):
+    pass
+
+
+class ProjectionStore:
+    """
+    Projections saved per collection, as an .npz file in PROJECTION_STORE_DIR
+    and in Redis.
+
+    Redis decides which fit is kept: the first writer wins, so workers
+    ingesting into the same collection at once all end up projecting with the
+    same fitted matrix. The file keeps the projection when Redis loses it and
+    is read first. Projections never change once saved and are cached for the
+    life of the store, which the app builds once per process, until the
+    collection is deleted.
+    """
+
+    def __init__(self, redis_client, root: str | Path = settings.PROJECTION_STORE_DIR) -> None:
+        self.__redis_client = redis_client
+        self.__root = Path(root)
+        self.__projections: dict[str, VectorProjection] = {}
+        # collections found to have no small vector, they are not looked up again
+        self.__without_small_vectors: set[str] = set()
+
+    @staticmethod
+    def _key(collection_name: str) -> str:
+        return f"projection:{collection_name}"
+
+    def _path(self, collection_name: str) -> Path:
+        return self.__root / f"{_slug(collection_name)}.npz"
+
+    def _read_file(self, collection_name: str) -> bytes | None:
+        path = self._path(collection_name)
+        return path.read_bytes() if path.exists() else None
+
+    def _write_file(self, collection_name: str, data: bytes):
+        self.__root.mkdir(parents=True, exist_ok=True)
+        path = self._path(collection_name)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    async def get(self, collection_name: str) -> VectorProjection | None:
+        projection = self.__projections.get(collection_name)
+        if projection is not None:
+            return projection
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._read_file, collection_name)
+        if data is None:
+            # the matrix is binary, it must bypass the client's utf-8 decoding
+            data = await self.__redis_client.execute_command("GET", self._key(collection_name), **{NEVER_DECODE: True})
+            if data is None:
+                return None
+            await loop.run_in_executor(None, self._write_file, collection_name, data)
+        projection = self.__projections[collection_name] = VectorProjection.loads(data)
+        return projection
+
+    async def get_or_fit(self, collection_name: str, vectors) -> VectorProjection:
+        projection = await self.get(collection_name)
+        if projection is None:
+            loop = asyncio.get_running_loop()
+            fitted = await loop.run_in_executor(None, VectorProjection.fit, vectors)
+            await self.__redis_client.set(self._key(collection_name), fitted.dumps(), nx=True)
+            projection = await self.get(collection_name)
+        return projection
+
+    async def save(self, collection_name: str, projection: VectorProjection):
+        """Keeps a projection read from elsewhere, e.g. an embedding archive, for the collection's queries."""
+        data = projection.dumps()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_file, collection_name, data)
+        await self.__redis_client.set(self._key(collection_name), data)
+        self.__projections[collection_name] = projection
+        self.__without_small_vectors.discard(collection_name)
+
+    def known_without_small_vectors(self, collection_name: str) -> bool:
+        return collection_name in self.__without_small_vectors
+
+    def mark_without_small_vectors(self, collection_name: str):
+        self.__without_small_vectors.add(collection_name)
+
+    def forget(self, collection_name: str | None = None):
+        """Drops what is cached for a collection, or for all of them, after it was deleted by any process."""
+        if collection_name is None:
+            self.__projections.clear()
+            self.__without_small_vectors.clear()
+        else:
+            self.__projections.pop(collection_name, None)
+            self.__without_small_vectors.discard(collection_name)
+
+    async def delete(self, collection_name: str):
+        self.forget(collection_name)
+        self._path(collection_name).unlink(missing_ok=True)
+        await self.__redis_client.delete(self._key(collection_name))
@@ -1,5 +1,11 @@
-from pydantic import BaseSettings
-from typing import List
+from pydantic import BaseSettings, BaseModel
+from typing import Dict, List
+
+
+class LLMProvider(BaseModel):
+    url: str
+    api_key: str | None = None
+    models: List[str] = []
 
 
 class Settings(BaseSettings):
@@ -13,18 +19,132 @@ class Settings(BaseSettings):
     CHUNK_TTL: int = 86400
     MAX_RETRIES: int = 3
     MERGING_CHUNK_SIZE: int = 5 * 1024 * 1024
+    CHUNK_STORE_DIR: str = "/tmp/upload"
+    CHUNK_STORE_QUOTA_BYTES: int = 2 * 1024 * 1024 * 1024
+    CHUNK_JANITOR_INTERVAL: int = 300
+    CHUNK_JANITOR_GRACE: int = 300
+    UPLOAD_PROGRESS_HEARTBEAT: float = 15.0
+    UPLOAD_PROGRESS_MAX_RANGES: int = 32
 
     REDIS_HOST: str = "localhost"
     QDRANT_HOST: str = "localhost"
+    QDRANT_PORT: int = 6333
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = True
+    QDRANT_TIMEOUT: int = 30
+    QDRANT_UPSERT_BATCH_SIZE: int = 256
+    QDRANT_UPSERT_CONCURRENCY: int = 4
 
     CHUNK_SIZE: int = 800
     OVERLAP: int = 100
     BATCH_SIZE: int = 32
+    INGEST_FILE_CONCURRENCY: int = 4
+    INGEST_EMBED_BATCH_CHUNKS: int = 256
+    INGEST_EMBED_BATCH_WAIT_MS: int = 20
+    BULK_IMPORT_BATCH_SIZE: int = 1024
+    INGEST_MAX_PENDING_CHUNKS: int = 20000
+    INGEST_MAX_PENDING_BYTES: int = 64 * 1024 * 1024
+    INGEST_MAX_CLIENT_PENDING_CHUNKS: int = 5000
+    INGEST_MAX_CLIENT_PENDING_BYTES: int = 16 * 1024 * 1024
+    INGEST_FALLBACK_CHUNKS_PER_SECOND: float = 50.0
+    INGEST_MAX_RETRY_AFTER: int = 300
+    EMBED_MAX_CONCURRENCY: int = 2
+    EMBED_INTERACTIVE_RESERVED_SLOTS: int = 1
+    EMBEDDING_ARCHIVE_DIR: str | None = None
+    EMBEDDING_ARCHIVE_DTYPE: str = "float32"
     SENTENCE_TRANSFORMER_MODEL_NAME: str = "all-MiniLM-L6-v2"
 
+    VECTOR_STORE_BACKEND: str = "qdrant"
+    LOCAL_VECTOR_STORE_PATH: str | None = None
+    LOCAL_VECTOR_STORE_HNSW_THRESHOLD: int = 20000
+    LOCAL_VECTOR_STORE_HNSW_M: int = 16
+    LOCAL_VECTOR_STORE_HNSW_EF: int = 64
+
+    DENSE_VECTOR_NAME: str = "dense"
+    SPARSE_VECTOR_NAME: str = "sparse"
+    SPARSE_VECTORS_ENABLED: bool = True
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    SEARCH_LIMIT: int = 5
+    SEARCH_PREFETCH_LIMIT: int = 50
+    SMALL_VECTORS_ENABLED: bool = False
+    SMALL_VECTOR_NAME: str = "dense_small"
+    SMALL_VECTOR_DIMENSION: int = 64
+    SMALL_VECTOR_PROJECTION: str = "pca"
+    PROJECTION_STORE_DIR: str = "/tmp/projections"
+    SEARCH_RESCORE_LIMIT: int = 100
+    RERANKER_ENABLED: bool = False
+    RERANKER_MODEL_NAME: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANKER_MAX_LENGTH: int = 512
+    RERANKER_CANDIDATES: int = 20
+    RERANKER_BUDGET_MS: float = 150.0
+    RERANKER_MIN_SCORE: float | None = None
+    RERANKER_CACHE_SIZE: int = 10000
+    RAG_CONTEXT_CHUNKS: int = 4
+
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: int = 86400
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256
+
+    STREAM_COALESCE_MS: int = 25
+    STREAM_COALESCE_BYTES: int = 512
+    STREAM_QUEUE_SIZE: int = 64
+    STREAM_DISCONNECT_POLL_INTERVAL: float = 1.0
+
+    SESSION_TTL: int = 86400
+    DEFAULT_CONTEXT_BUDGET: int = 8192
+    MODEL_CONTEXT_BUDGETS: Dict[str, int] = {}
+    CONTEXT_RESPONSE_RESERVE: int = 1024
+    CONTEXT_COMPACTION: str = "summarize"
+    CHARS_PER_TOKEN: float = 4.0
+    SUMMARY_MODEL: str | None = None
+    SUMMARY_LOCK_TTL: int = 120
+
+    LLM_REQUEST_TIMEOUT: float = 60.0
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_MODEL_CONCURRENCY: Dict[str, int] = {}
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 10.0
+    LLM_FALLBACK_MODELS: List[str] = []
+    LLM_FALLBACK_PROVIDERS: List[LLMProvider] = []
+
     ALLOW_ORIGINS: List[str] = ["http://localhost:5173"]
     MAX_CONTENT_LENGTH: int = 10 * 1024 * 1024
 
+    PROFILING_ENABLED: bool = False
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_TOKEN: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_ROUTES: List[str] = ["/api/upload", "/api/search", "/api/v1/chat"]
+    PROFILING_INTERVAL: float = 0.001
+    PROFILING_DIR: str = "/tmp/profiles"
+    PROFILING_MAX_FILES: int = 200
+    PROFILING_MAX_BYTES: int = 256 * 1024 * 1024
+
+    TEXT_STORE_ENABLED: bool = False
+    TEXT_STORE_DIR: str = "/tmp/text_store"
+    TEXT_STORE_COMPRESSION: str = "zstd"
+    TEXT_STORE_BLOCK_SIZE: int = 64 * 1024
+    TEXT_STORE_ZSTD_LEVEL: int = 3
+
+    COLLECTION_CATALOG_LOCAL_TTL: float = 5.0
+    COLLECTION_CATALOG_REFRESH_INTERVAL: int = 300
+
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "file"
+    TRACING_FILE: str = "/tmp/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4317"
+    TRACING_SERVICE_NAME: str = "talks-backend"
+    TRACING_SAMPLE_RATIO: float = 1.0
+
+    SERVER_BIND: str = "0.0.0.0:8000"
+    SERVER_WORKERS: int = 2
+    SERVER_PRELOAD_MODEL: bool = True
+    SERVER_TIMEOUT: int = 120
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for serving the app with several uvicorn workers.
+
+With SERVER_PRELOAD_MODEL the app and the SentenceTransformer weights are
+loaded once in the master, which then forks the workers. The weights are
+never written, so their pages stay shared copy-on-write and every worker
+after the first costs its own heap instead of another copy of the model.
+
+Run from new_backend/:
+    gunicorn app.server:app
+"""
+import gc
+import logging
+
+from config.config import settings
+
+
+bind = settings.SERVER_BIND
+# the local vector store lives in the process, workers would each serve their own copy
+workers = 1 if settings.VECTOR_STORE_BACKEND == "local" else settings.SERVER_WORKERS
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = settings.SERVER_TIMEOUT
+preload_app = settings.SERVER_PRELOAD_MODEL
+
+
+def when_ready(server):
+    # runs in the master after the app is imported and before the first fork
+    if not settings.SERVER_PRELOAD_MODEL:
+        return
+    from app.utils.file_processing_pipeline import FileProcessingPipeline
+
+    # load only, never encode here: torch thread pools started before a fork deadlock the workers
+    FileProcessingPipeline.preload_embedding_model()
+    if settings.RERANKER_ENABLED:
+        from app.utils.reranker import CrossEncoderReranker
+
+        CrossEncoderReranker.preload_model()
+    # frozen objects are skipped by the collector, so collections in the
+    # workers do not write to the object headers on the shared pages
+    gc.freeze()
+    logging.getLogger(__name__).info(f"Embedding model preloaded, {gc.get_freeze_count()} objects frozen before forking")
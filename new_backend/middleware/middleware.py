@@ -1,18 +1,156 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import HTTPException
+from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
+import time
 
 from config.config import settings
+from app.utils.metrics import metrics
+from app.utils import profiling
 
 
-class MaxContentLengthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        content_length = request.headers.get("content-length")
+request_duration = metrics.histogram("http_request_duration_seconds", "Time from request start to the last response byte")
+response_start = metrics.histogram("http_response_start_seconds", "Time from request start to the response headers")
 
-        if content_length and int(content_length) > settings.MAX_CONTENT_LENGTH:
-            return JSONResponse(
-                status_code=413,
-                content={"detail": "Request payload too large"}
-            )
 
-        return await call_next(request)
\ No newline at end of file
+class RequestBodyTooLarge(HTTPException):
+    # an HTTPException, so FastAPI's body parsing re-raises it instead of turning it into a 400
+    def __init__(self) -> None:
+        super().__init__(status_code=413, detail="Request payload too large")
+
+
+class MaxContentLengthMiddleware:
+    """
+    Rejects request bodies larger than MAX_CONTENT_LENGTH with a 413.
+
+    Pure ASGI: the declared Content-Length is checked up front and the body
+    bytes are counted as they are received, so chunked transfers are limited
+    too. Responses, streaming ones included, are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, max_content_length: int = settings.MAX_CONTENT_LENGTH) -> None:
+        self.app = app
+        self.max_content_length = max_content_length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_content_length:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_content_length:
+                    raise RequestBodyTooLarge()
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestBodyTooLarge:
+            # raised outside of a route, e.g. by a body read in another middleware
+            if response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send):
+        response = JSONResponse(status_code=413, content={"detail": "Request payload too large"})
+        await response(scope, receive, send)
+
+
+class RequestTimingMiddleware:
+    """
+    Records time to response headers and time to the last body byte per
+    route template and status, without wrapping the response object.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_send(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_start.observe(time.perf_counter() - start, method=scope["method"], route=self._route(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            request_duration.observe(time.perf_counter() - start, method=scope["method"], route=self._route(scope), status=str(status))
+
+    @staticmethod
+    def _route(scope: Scope) -> str:
+        # the router stores the matched route in the scope, raw paths would explode the label set
+        route = scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+class ProfilingMiddleware:
+    """
+    Records a sampling profile of selected requests, from the first byte
+    received to the last byte sent, streamed responses included.
+
+    A request on one of PROFILING_ROUTES is profiled when it carries
+    PROFILING_HEADER set to PROFILING_TOKEN, or is drawn by
+    PROFILING_SAMPLE_RATE. Without a token the header is ignored, and with
+    neither a token nor a sample rate the app refuses to start. Its profile id is returned in the
+    header. Only added to the app with PROFILING_ENABLED, so it costs nothing
+    otherwise.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        if profiling.Profiler is None:
+            raise RuntimeError("PROFILING_ENABLED needs pyinstrument installed")
+        if not settings.PROFILING_TOKEN and settings.PROFILING_SAMPLE_RATE <= 0:
+            raise RuntimeError("PROFILING_ENABLED needs PROFILING_TOKEN for header-triggered profiles or a PROFILING_SAMPLE_RATE above 0")
+        self.app = app
+        self.header = settings.PROFILING_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not profiling.should_profile(scope["path"], Headers(scope=scope).get(settings.PROFILING_HEADER)):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = profiling.new_profile_id(scope["method"], scope["path"])
+
+        async def tagged_send(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, profile_id.encode("latin-1"))]
+            await send(message)
+
+        # async mode follows this request's task across awaits and leaves out other requests
+        profiler = profiling.Profiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+        token = profiling.current_profile.set(profile_id)
+        profiler.start()
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            session = profiler.stop()
+            profiling.current_profile.reset(token)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, profiling.ProfileStore().write, profile_id, session)
@@ -0,0 +1,228 @@
+"""
+Offline bulk import of transcript corpora into Qdrant.
+
+Reads a directory of transcript files or a single concatenated export such as
+Transcripts_English_Partial.txt, splits it into talks, chunks and embeds the
+talks in a process pool and upserts them into one collection in large batches.
+Completed talks are appended to a checkpoint file, so an interrupted import
+resumes where it stopped.
+
+Run from new_backend/:
+    python -m scripts.bulk_import ../Transcripts_English_Partial.txt --workers 4
+"""
+from concurrent.futures import ProcessPoolExecutor
+from qdrant_client.http.models import PointStruct
+from pathlib import Path
+from typing import List
+import argparse
+import asyncio
+import uuid
+import time
+import os
+
+from config.config import settings
+from app.clients.qdrant_client import QuadrantClient
+from app.clients.redis_client import RedisClient
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from app.utils.sparse_vectorizer import SparseVectorizer
+from app.utils.transcript_splitter import Talk, split_talks
+from app.utils.embedding_archive import EmbeddingArchive
+from app.utils.vector_projection import ProjectionStore
+from app.utils.text_store import TextStore
+
+
+_worker_pipeline: FileProcessingPipeline | None = None
+
+
+def _init_worker(threads_per_worker: int):
+    global _worker_pipeline
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    _worker_pipeline = FileProcessingPipeline()
+    _worker_pipeline.embedding_model  # load once per worker, not per talk
+
+
+def _process_talk(talk: Talk):
+    chunks = _worker_pipeline._chunk_text(talk.text)
+    embeddings = _worker_pipeline._embed_chunks(chunks) if chunks else []
+    return talk, chunks, embeddings
+
+
+def load_talks(source: Path) -> List[tuple[str, Talk]]:
+    files = sorted(source.rglob("*.txt")) if source.is_dir() else [source]
+    talks = []
+    for file in files:
+        text = file.read_text(encoding="utf-8", errors="replace")
+        talks.extend((file.name, talk) for talk in split_talks(text, fallback_id=file.stem))
+    return talks
+
+
+def read_checkpoint(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    return {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+
+
+def write_checkpoint(path: Path, talk_ids: List[str]):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(f"{talk_id}\n" for talk_id in talk_ids))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Throughput:
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+        self.docs = 0
+        self.chunks = 0
+        self.vectors = 0
+
+    def report(self, prefix: str = "") -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return (
+            f"{prefix}{self.docs} docs, {self.chunks} chunks, {self.vectors} vectors in {elapsed:.1f}s | "
+            f"{self.docs / elapsed:.2f} docs/s, {self.chunks / elapsed:.1f} chunks/s, {self.vectors / elapsed:.1f} vectors/s"
+        )
+
+
+async def bulk_import(args: argparse.Namespace):
+    checkpoint_path = Path(args.checkpoint)
+    done = read_checkpoint(checkpoint_path)
+    talks = [(source, talk) for source, talk in load_talks(Path(args.source)) if talk.talk_id not in done]
+    print(f"{len(talks)} talks to import, {len(done)} already done according to {checkpoint_path}")
+    if not talks:
+        return
+
+    qdrant_client = QuadrantClient().client
+    sparse_vectorizer = SparseVectorizer(RedisClient().client) if not args.no_sparse else None
+    embedding_archive = EmbeddingArchive(args.archive) if args.archive else None
+    text_store = TextStore() if settings.TEXT_STORE_ENABLED and not args.no_text_store else None
+    loop = asyncio.get_running_loop()
+
+    # small vectors go only into collections created with them, i.e. new ones or ones that already have a projection
+    projection_store = ProjectionStore(RedisClient().client) if settings.SMALL_VECTORS_ENABLED and not args.no_small else None
+    if not qdrant_client.collection_exists(args.collection):
+        dimension = FileProcessingPipeline().embedding_model.get_sentence_embedding_dimension()
+        qdrant_client.create_collection(
+            collection_name=args.collection,
+            **QuadrantClient.collection_config(
+                dimension,
+                sparse=sparse_vectorizer is not None,
+                small_dimension=settings.SMALL_VECTOR_DIMENSION if projection_store is not None else None,
+            ),
+        )
+    elif projection_store is not None and await projection_store.get(args.collection) is None:
+        print(f"{args.collection} was created without small vectors, importing without them")
+        projection_store = None
+
+    sources = {talk.talk_id: source for source, talk in talks}
+    throughput = Throughput()
+    batch: List[PointStruct] = []
+    batch_talks: List[str] = []
+    upload: asyncio.Future | None = None
+    last_report = time.monotonic()
+
+    async def flush(points: List[PointStruct], talk_ids: List[str]):
+        projection = None
+        if projection_store is not None:
+            # fitted on the first batch of a new collection, reused for every later one
+            projection = await projection_store.get_or_fit(args.collection, [p.vector[settings.DENSE_VECTOR_NAME] for p in points])
+            await loop.run_in_executor(None, projection.attach, points)
+        texts = [p.payload["text"] for p in points] if sparse_vectorizer is not None else []
+        # externalize replaces the payloads, the archive keeps the full ones so it does not depend on this host's text store
+        archived_points = [p.copy() for p in points] if embedding_archive is not None else None
+        if text_store is not None:
+            # one store document per talk, the points keep references to it
+            await loop.run_in_executor(None, text_store.externalize, args.collection, points)
+        # the previous batch must be stored before its talks are checkpointed
+        await loop.run_in_executor(None, lambda: qdrant_client.upsert(collection_name=args.collection, points=points, wait=True))
+        if sparse_vectorizer is not None:
+            await sparse_vectorizer.record_documents(args.collection, texts)
+        if embedding_archive is not None:
+            await loop.run_in_executor(None, lambda: embedding_archive.write_block(args.collection, archived_points, projection=projection))
+        write_checkpoint(checkpoint_path, talk_ids)
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        pending = set()
+        queued = iter(talks)
+
+        def submit_next() -> bool:
+            try:
+                _, talk = next(queued)
+            except StopIteration:
+                return False
+            pending.add(loop.run_in_executor(pool, _process_talk, talk))
+            return True
+
+        # bounded in-flight work keeps memory flat on large corpora
+        for _ in range(args.workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                talk, chunks, embeddings = future.result()
+                submit_next()
+
+                sparse_vectors = [None] * len(chunks)
+                if sparse_vectorizer is not None and chunks:
+                    sparse_vectors = await sparse_vectorizer.encode_documents(args.collection, chunks)
+
+                for i, (vect, sparse_vect, text_chunk) in enumerate(zip(embeddings, sparse_vectors, chunks)):
+                    vector = {settings.DENSE_VECTOR_NAME: vect}
+                    if sparse_vect is not None:
+                        vector[settings.SPARSE_VECTOR_NAME] = sparse_vect
+                    batch.append(PointStruct(
+                        id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{talk.talk_id}:{i}")),
+                        vector=vector,
+                        payload={
+                            "text": text_chunk,
+                            "source": sources[talk.talk_id],
+                            "document": talk.talk_id,
+                            "title": talk.title,
+                            "chunk_index": i,
+                        },
+                    ))
+                batch_talks.append(talk.talk_id)
+
+                throughput.docs += 1
+                throughput.chunks += len(chunks)
+                throughput.vectors += len(chunks) * (2 if sparse_vectorizer is not None else 1)
+
+                if len(batch) >= args.batch_size:
+                    if upload is not None:
+                        await upload
+                    upload = asyncio.ensure_future(flush(batch, batch_talks))
+                    batch, batch_talks = [], []
+
+            if time.monotonic() - last_report >= args.report_interval:
+                print(throughput.report())
+                last_report = time.monotonic()
+
+    if upload is not None:
+        await upload
+    if batch_talks:
+        await flush(batch, batch_talks)
+
+    print(throughput.report(prefix="done: "))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import transcripts into Qdrant")
+    parser.add_argument("source", help="transcript file or directory of .txt files")
+    parser.add_argument("--collection", default=settings.VECTOR_DB_COLLECTION_NAME)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_IMPORT_BATCH_SIZE, help="points per upsert")
+    parser.add_argument("--checkpoint", default=".bulk_import.checkpoint")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--no-sparse", action="store_true", help="skip BM25 sparse vectors")
+    parser.add_argument("--no-small", action="store_true", help="skip the reduced-dimension first-pass vectors")
+    parser.add_argument("--no-text-store", action="store_true", help="keep chunk texts in the payload even with TEXT_STORE_ENABLED")
+    parser.add_argument("--archive", default=settings.EMBEDDING_ARCHIVE_DIR, help="also write the points to an embedding archive in this directory")
+    asyncio.run(bulk_import(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the CPU cost of serialization on the chunk, chat and response paths.
+
+Each case runs the stdlib/pydantic JSON path the app used before and the
+orjson/msgpack path it uses now on the same data, and reports process CPU
+time per operation and the encoded size:
+
+- session: load and store of the upload session metadata, as every chunk
+  request does, with --chunks chunks already recorded
+- sse: parsing one upstream SSE delta and formatting the delta sent to the
+  client, per streamed token
+- response: rendering a SuccessfulMessage the way FastAPI does, with the
+  default JSONResponse and with ORJSONResponse
+
+Run from new_backend/:
+    python -m scripts.measure_serialization --chunks 200 --iterations 2000
+"""
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from typing import Callable
+import argparse
+import json
+import time
+
+from app.models.messages import SuccessfulMessage
+from app.models.uploading import ChunkedUploadMetadata, ChunkDataInfo
+from app.utils.serialization import pack_model, unpack_model
+from app.utils.sse import extract_delta, format_sse, format_sse_delta
+
+
+def cpu_per_op(function: Callable[[], object], iterations: int) -> float:
+    function()
+    start = time.process_time()
+    for _ in range(iterations):
+        function()
+    return (time.process_time() - start) / iterations
+
+
+def session_metadata(chunks: int) -> ChunkedUploadMetadata:
+    chunk_size = 1024 * 1024
+    return ChunkedUploadMetadata(
+        file_name="talk_transcript.txt",
+        file_size=chunks * chunk_size,
+        chunk_size=chunk_size,
+        total_chunks=chunks,
+        content_type="text/plain",
+        chunk_metadata=[
+            ChunkDataInfo(chunk_index=i, file_path=f"/tmp/chunks/talk_transcript_0d4f/chunk_{i}.txt", size=chunk_size)
+            for i in range(chunks)
+        ],
+        received_bytes=chunks * chunk_size,
+        started_at=time.time(),
+    )
+
+
+def stdlib_delta(data: str) -> str | None:
+    choices = json.loads(data).get("choices")
+    delta = choices[0].get("delta") if choices else None
+    return delta.get("content") if delta else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU time of the JSON and orjson/msgpack serialization paths")
+    parser.add_argument("--chunks", type=int, default=200, help="chunks recorded in the session metadata")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    metadata = session_metadata(args.chunks)
+    as_json, as_msgpack = metadata.json(), pack_model(metadata)
+    sse_line = json.dumps({"id": "gen-1", "model": "openai/gpt-4o-mini", "choices": [{"index": 0, "delta": {"content": " token"}}]})
+    message = SuccessfulMessage(detail="Chunk uploaded", payload={"chunk_index": 17, "received": 18, "total": args.chunks})
+
+    cases = [
+        ("session", "json",
+         lambda: ChunkedUploadMetadata.parse_raw(as_json).json(), len(as_json.encode("utf-8"))),
+        ("session", "msgpack",
+         lambda: pack_model(unpack_model(ChunkedUploadMetadata, as_msgpack)), len(as_msgpack)),
+        ("sse", "json",
+         lambda: format_sse(json.dumps({"choices": [{"index": 0, "delta": {"content": stdlib_delta(sse_line)}}]}, ensure_ascii=False)), None),
+        ("sse", "orjson",
+         lambda: format_sse_delta(extract_delta(sse_line) or ""), None),
+        ("response", "json",
+         lambda: JSONResponse(jsonable_encoder(message)).body, len(JSONResponse(jsonable_encoder(message)).body)),
+        ("response", "orjson",
+         lambda: ORJSONResponse(jsonable_encoder(message)).body, len(ORJSONResponse(jsonable_encoder(message)).body)),
+    ]
+
+    print(f"{'path':<10} {'codec':<8} {'us/op':>10} {'bytes':>10}")
+    baseline = {}
+    for path, codec, function, size in cases:
+        seconds = cpu_per_op(function, args.iterations)
+        saving = f"  {1 - seconds / baseline[path]:.0%} less CPU than json" if path in baseline else ""
+        baseline.setdefault(path, seconds)
+        print(f"{path:<10} {codec:<8} {seconds * 1e6:>10.1f} {size if size is not None else '-':>10}{saving}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure recall and latency of the small first-pass vector against exact search.
+
+For every query the exact top k on the full dense vector is the ground truth.
+It is compared with the small vector alone and with the two-stage search the
+app runs (first pass on the small vector, top --rescore-limit candidates
+rescored with the full vector). Queries come from a file, one per line, or
+are sampled from the collection's own chunk texts.
+
+Run from new_backend/:
+    python -m scripts.measure_small_vector_recall talks_transcripts -k 10 --rescore-limit 100
+"""
+from qdrant_client.http.models import Prefetch, SearchParams
+from pathlib import Path
+import numpy as np
+import argparse
+import time
+
+from config.config import settings
+from app.clients.qdrant_client import QuadrantClient
+from app.utils.file_processing_pipeline import FileProcessingPipeline
+from app.utils.text_store import TextStore
+from scripts.restore_archive import load_projection
+
+
+def load_queries(qdrant_client, args: argparse.Namespace) -> list[str]:
+    if args.queries:
+        return [line.strip() for line in Path(args.queries).read_text(encoding="utf-8").splitlines() if line.strip()]
+    records, _ = qdrant_client.scroll(collection_name=args.collection, limit=args.sample, with_payload=True)
+    TextStore().hydrate(args.collection, [record.payload for record in records])
+    return [record.payload["text"] for record in records if record.payload and record.payload.get("text")]
+
+
+def timed_ids(call) -> tuple[list, float]:
+    start = time.perf_counter()
+    response = call()
+    return [point.id for point in response.points], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall of the reduced-dimension first pass")
+    parser.add_argument("collection", nargs="?", default=settings.VECTOR_DB_COLLECTION_NAME)
+    parser.add_argument("--queries", help="file with one query per line (default: sample chunk texts)")
+    parser.add_argument("--sample", type=int, default=200, help="chunk texts sampled as queries without --queries")
+    parser.add_argument("-k", type=int, default=settings.SEARCH_LIMIT, help="results compared per query")
+    parser.add_argument("--rescore-limit", type=int, default=settings.SEARCH_RESCORE_LIMIT, help="first-pass candidates rescored with the full vector")
+    args = parser.parse_args()
+
+    projection = load_projection(args.collection)
+    if projection is None:
+        parser.error(f"{args.collection} has no saved projection, ingest it with SMALL_VECTORS_ENABLED")
+
+    qdrant_client = QuadrantClient().client
+    queries = load_queries(qdrant_client, args)
+    dense_queries = FileProcessingPipeline()._embed_chunks(queries)
+    small_queries = projection.project(dense_queries)
+    print(f"{len(queries)} queries, {projection.method} projection {dense_queries.shape[1]} -> {projection.dimension} dimensions")
+
+    results = {"exact": [], "small only": [], "two-stage": []}
+    recalls = {"small only": [], "two-stage": []}
+    for dense, small in zip(dense_queries.tolist(), small_queries.tolist()):
+        exact, seconds = timed_ids(lambda: qdrant_client.query_points(
+            collection_name=args.collection, query=dense, using=settings.DENSE_VECTOR_NAME,
+            limit=args.k, search_params=SearchParams(exact=True),
+        ))
+        results["exact"].append(seconds)
+
+        first_pass, seconds = timed_ids(lambda: qdrant_client.query_points(
+            collection_name=args.collection, query=small, using=settings.SMALL_VECTOR_NAME, limit=args.k,
+        ))
+        results["small only"].append(seconds)
+        recalls["small only"].append(len(set(first_pass) & set(exact)) / max(len(exact), 1))
+
+        rescored, seconds = timed_ids(lambda: qdrant_client.query_points(
+            collection_name=args.collection,
+            prefetch=Prefetch(query=small, using=settings.SMALL_VECTOR_NAME, limit=max(args.rescore_limit, args.k)),
+            query=dense, using=settings.DENSE_VECTOR_NAME, limit=args.k,
+        ))
+        results["two-stage"].append(seconds)
+        recalls["two-stage"].append(len(set(rescored) & set(exact)) / max(len(exact), 1))
+
+    print(f"{'search':>12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, seconds in results.items():
+        recall = f"{np.mean(recalls[name]):.3f}" if name in recalls else "1.000"
+        p50, p95 = np.percentile(np.asarray(seconds) * 1000, [50, 95])
+        print(f"{name:>12} {recall:>10} {p50:8.2f} {p95:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
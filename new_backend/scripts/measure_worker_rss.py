@@ -0,0 +1,123 @@
+"""
+Measure the memory of gunicorn workers with and without the preloaded model.
+
+Starts gunicorn once per mode, waits until every worker has settled and
+reads RSS, PSS (shared pages divided among the processes mapping them) and
+USS (pages private to the worker) from /proc/<pid>/smaps_rollup. RSS counts
+shared pages in full for every worker, PSS and USS show what forking after
+the preload actually saves. Linux only.
+
+Run from new_backend/ (Redis and Qdrant must be reachable for the app's lifespan):
+    python -m scripts.measure_worker_rss --workers 4
+"""
+from pathlib import Path
+import urllib.request
+import subprocess
+import argparse
+import signal
+import time
+import os
+import sys
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields after the command name: state, ppid, ...
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def _memory(pid: int) -> dict:
+    usage = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        usage[key] = int(value.split()[0]) * 1024
+    return {
+        "rss": usage["Rss"],
+        "pss": usage["Pss"],
+        "uss": usage["Private_Clean"] + usage["Private_Dirty"],
+    }
+
+
+def _wait_until_settled(master: subprocess.Popen, args: argparse.Namespace) -> list[int]:
+    deadline = time.monotonic() + args.startup_timeout
+    previous = None
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {master.returncode}")
+        workers = _children(master.pid)
+        if len(workers) == args.workers:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{args.port}/", timeout=5).read()
+                for _ in range(args.requests):
+                    urllib.request.urlopen(f"http://127.0.0.1:{args.port}{args.path}", timeout=30).read()
+            except OSError:
+                pass
+            else:
+                # the model is loaded in each worker's lifespan without preloading, wait until RSS stops growing
+                current = [_memory(pid)["rss"] for pid in workers]
+                if previous is not None and all(abs(a - b) < 1024 * 1024 for a, b in zip(current, previous)):
+                    return workers
+                previous = current
+        time.sleep(args.interval)
+    raise TimeoutError(f"workers did not settle within {args.startup_timeout}s")
+
+
+def measure(preload: bool, args: argparse.Namespace) -> dict:
+    env = {**os.environ, "SERVER_PRELOAD_MODEL": str(preload).lower(), "SERVER_WORKERS": str(args.workers), "SERVER_BIND": f"127.0.0.1:{args.port}"}
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "app.server:app"], env=env)
+    try:
+        workers = _wait_until_settled(master, args)
+        result = {"master": _memory(master.pid), "workers": {pid: _memory(pid) for pid in workers}}
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+    return result
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:9.1f}"
+
+
+def report(name: str, result: dict) -> dict:
+    print(f"\n{name}")
+    print(f"{'process':>12} {'RSS MiB':>9} {'PSS MiB':>9} {'USS MiB':>9}")
+    print(f"{'master':>12} {_mib(result['master']['rss'])} {_mib(result['master']['pss'])} {_mib(result['master']['uss'])}")
+    for pid, usage in result["workers"].items():
+        print(f"{pid:>12} {_mib(usage['rss'])} {_mib(usage['pss'])} {_mib(usage['uss'])}")
+    processes = [result["master"], *result["workers"].values()]
+    totals = {key: sum(usage[key] for usage in processes) for key in ("rss", "pss", "uss")}
+    per_worker = {key: sum(usage[key] for usage in result["workers"].values()) / len(result["workers"]) for key in ("rss", "pss", "uss")}
+    print(f"{'worker mean':>12} {_mib(per_worker['rss'])} {_mib(per_worker['pss'])} {_mib(per_worker['uss'])}")
+    print(f"{'total':>12} {_mib(totals['rss'])} {_mib(totals['pss'])} {_mib(totals['uss'])}")
+    return {"per_worker": per_worker, "total_pss": totals["pss"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/", help="endpoint hit before measuring, e.g. a search to run the model in every worker")
+    parser.add_argument("--requests", type=int, default=0, help="requests sent to --path before measuring")
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    separate = report("model loaded per worker", measure(False, args))
+    shared = report("model preloaded in the master", measure(True, args))
+
+    print(
+        f"\nper worker PSS {_mib(separate['per_worker']['pss']).strip()} -> {_mib(shared['per_worker']['pss']).strip()} MiB, "
+        f"USS {_mib(separate['per_worker']['uss']).strip()} -> {_mib(shared['per_worker']['uss']).strip()} MiB, "
+        f"total PSS {_mib(separate['total_pss']).strip()} -> {_mib(shared['total_pss']).strip()} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
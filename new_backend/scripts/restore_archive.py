@@ -0,0 +1,102 @@
+"""
+Restore collections from an embedding archive into an empty Qdrant.
+
+Vectors and payloads are read straight from the archive's memory-mapped blocks
+and uploaded in large batches, so nothing is re-embedded. The archive must have
+been written with the configured SENTENCE_TRANSFORMER_MODEL_NAME. Small vectors
+are projected again with the projection archived with the collection, which is
+also saved to the projection store for the collection's queries.
+
+Run from new_backend/:
+    python -m scripts.restore_archive /data/embedding_archive --parallel 4
+"""
+from itertools import chain
+import argparse
+import asyncio
+import time
+
+from config.config import settings
+from app.clients.qdrant_client import QuadrantClient
+from app.clients.redis_client import RedisClient
+from app.utils.embedding_archive import EmbeddingArchive
+from app.utils.vector_projection import ProjectionStore, VectorProjection
+
+
+def load_projection(archive: EmbeddingArchive, collection_name: str) -> VectorProjection | None:
+    archived = archive.read_projection(collection_name)
+
+    async def load():
+        redis_client = RedisClient().client
+        try:
+            store = ProjectionStore(redis_client)
+            if archived is not None:
+                await store.save(collection_name, archived)
+                return archived
+            # archives written before projections were archived with the collection
+            return await store.get(collection_name) if settings.SMALL_VECTORS_ENABLED else None
+        finally:
+            await redis_client.aclose()
+
+    return asyncio.run(load())
+
+
+def restore_collection(archive: EmbeddingArchive, collection_name: str, args: argparse.Namespace):
+    qdrant_client = QuadrantClient().client
+    manifest = archive.read_manifest(collection_name)
+    if manifest is None:
+        raise ValueError(f"No archive for {collection_name}")
+
+    # the archive holds full vectors only, small ones are projected again with the collection's saved projection
+    projection = load_projection(archive, collection_name)
+
+    if qdrant_client.collection_exists(collection_name):
+        if qdrant_client.count(collection_name).count and not args.force:
+            raise ValueError(f"Collection {collection_name} is not empty, pass --force to restore into it anyway")
+    else:
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            **QuadrantClient.collection_config(
+                manifest["dimension"],
+                sparse=all(b["sparse"] for b in manifest["blocks"]),
+                small_dimension=projection.dimension if projection is not None else None,
+            ),
+        )
+
+    batches = archive.iter_points(collection_name, batch_size=args.batch_size)
+    if projection is not None:
+        batches = (projection.attach(batch) for batch in batches)
+
+    total = sum(block["count"] for block in manifest["blocks"])
+    start = time.monotonic()
+    qdrant_client.upload_points(
+        collection_name=collection_name,
+        points=chain.from_iterable(batches),
+        batch_size=args.batch_size,
+        parallel=args.parallel,
+        wait=True,
+    )
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(f"{collection_name}: {total} points in {elapsed:.1f}s ({total / elapsed:.0f} points/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore Qdrant collections from an embedding archive")
+    parser.add_argument("archive", nargs="?", default=settings.EMBEDDING_ARCHIVE_DIR, help="archive root directory")
+    parser.add_argument("--collection", action="append", help="collection to restore, repeatable (default: all)")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_IMPORT_BATCH_SIZE, help="points per upload request")
+    parser.add_argument("--parallel", type=int, default=1, help="concurrent upload processes")
+    parser.add_argument("--force", action="store_true", help="restore into collections that already contain points")
+    args = parser.parse_args()
+    if not args.archive:
+        parser.error("no archive directory given and EMBEDDING_ARCHIVE_DIR is not set")
+
+    archive = EmbeddingArchive(args.archive)
+    collections = args.collection or archive.collections()
+    if not collections:
+        print(f"No collections archived for {settings.SENTENCE_TRANSFORMER_MODEL_NAME} in {args.archive}")
+    for collection_name in collections:
+        restore_collection(archive, collection_name, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Local stand-in for an OpenAI compatible chat completions endpoint (OpenRouter).
+
+Streams `tokens` deltas as SSE frames after `first_token_delay` seconds, at
+`token_rate` tokens per second, and ends with [DONE], which is all the
+backend's ChatController reads. Every request is counted so the load report
+can show what reached upstream past the response cache.
+
+Run on its own:
+    python -m tests.load.fake_llm --port 8100 --token-rate 50 --first-token-delay 0.3
+"""
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+import argparse
+import asyncio
+import json
+import time
+
+
+def create_fake_llm(token_rate: float = 50.0, first_token_delay: float = 0.3, tokens: int = 64) -> Starlette:
+    stats = {"requests": 0, "active": 0}
+
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        max_tokens = min(payload.get("max_tokens") or tokens, tokens)
+
+        async def stream():
+            stats["active"] += 1
+            try:
+                await asyncio.sleep(first_token_delay)
+                start = time.monotonic()
+                for i in range(max_tokens):
+                    # paced against the start time, so slow consumers do not slow the rate down further
+                    delay = start + i / token_rate - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    frame = {"id": "fake", "model": payload.get("model"), "choices": [{"index": 0, "delta": {"content": f"token{i} "}}]}
+                    yield f"data: {json.dumps(frame)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["active"] -= 1
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    app = Starlette(routes=[
+        Route("/api/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    ])
+    app.state.stats = stats
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI compatible SSE server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="tokens per second per stream")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per response")
+    args = parser.parse_args()
+    uvicorn.run(create_fake_llm(args.token_rate, args.first_token_delay, args.tokens), host="127.0.0.1", port=args.port, log_level="warning")
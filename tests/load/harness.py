@@ -0,0 +1,332 @@
+"""
+Load test of the new_backend app with local stand-ins for its upstreams.
+
+The real FastAPI app is served by uvicorn in a thread of this process with
+the in-memory local vector store instead of Qdrant, fakeredis (or the Redis
+given with --redis-url) and the fake SSE server of tests/load/fake_llm.py
+instead of OpenRouter. Virtual users then run a mixed workload until
+--duration has passed:
+
+    chat     streamed /api/v1/chat/completions with a unique question each
+    upload   chunked upload: init, chunks, complete
+    status   /api/upload/status polls of the uploads in progress
+
+The report lists per endpoint the requests, errors, throughput and latency
+percentiles (time to first byte for chats as well), and the event-loop lag
+of the app's loop, sampled every --lag-interval and attributed to every
+endpoint with a request in flight at the time.
+
+Run from the repository root:
+    python -m tests.load.harness --duration 60 --chat-users 20 --upload-users 2 --status-users 4
+"""
+from collections import defaultdict
+from pathlib import Path
+import threading
+import tempfile
+import argparse
+import asyncio
+import socket
+import random
+import time
+import json
+import math
+import uuid
+import sys
+import os
+
+import httpx
+import uvicorn
+
+
+NEW_BACKEND = Path(__file__).resolve().parents[2] / "new_backend"
+TEXT = "The speaker walks through how the idea started, what went wrong and what the audience can take home. "
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class LoopProbe:
+    """
+    ASGI wrapper that knows which endpoints are in flight, and the lag monitor
+    that runs in the served app's own event loop.
+    """
+
+    def __init__(self, app, interval: float) -> None:
+        self.app = app
+        self.interval = interval
+        self.in_flight: dict[int, dict] = {}
+        self.lag: dict[str, list] = defaultdict(list)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.in_flight[id(scope)] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight.pop(id(scope), None)
+
+    @staticmethod
+    def endpoint(scope: dict) -> str:
+        # the router stores the matched route in the scope as soon as it has routed the request
+        route = scope.get("route")
+        return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+    async def monitor(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.lag["(all)"].append(lag)
+            for endpoint in {self.endpoint(scope) for scope in list(self.in_flight.values())}:
+                self.lag[endpoint].append(lag)
+
+
+class ServerThread(threading.Thread):
+    def __init__(self, app, port: int, probe: LoopProbe | None = None) -> None:
+        super().__init__(daemon=True)
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self.probe = probe
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        monitor = asyncio.create_task(self.probe.monitor()) if self.probe is not None else None
+        try:
+            await self.server.serve()
+        finally:
+            if monitor is not None:
+                monitor.cancel()
+
+    def start_and_wait(self, timeout: float):
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("server did not start")
+            time.sleep(0.1)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=30)
+
+
+def configure_backend(args: argparse.Namespace, llm_port: int, chunk_dir: str):
+    # settings are read once on import, the environment must be in place before the app is imported
+    os.environ.update({
+        "LLM_URL": f"http://127.0.0.1:{llm_port}/api/v1/chat/completions",
+        "LLM_SERVICE_API_KEY": "load-test",
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "VECTOR_STORE_BACKEND": "local",
+        "CHUNK_STORE_DIR": chunk_dir,
+        "RESPONSE_CACHE_ENABLED": str(not args.no_cache).lower(),
+    })
+    if args.redis_url:
+        host = httpx.URL(args.redis_url).host
+        os.environ["REDIS_HOST"] = host
+    sys.path.insert(0, str(NEW_BACKEND))
+
+    if not args.redis_url:
+        import fakeredis
+        from functools import partial
+        from app.clients import redis_client
+
+        # one in-memory server shared by every client the app creates
+        redis_client.redis_async.Redis = partial(fakeredis.FakeAsyncRedis, server=fakeredis.FakeServer())
+
+    from app.server import create_app
+    return create_app()
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latency: dict[str, list] = defaultdict(list)
+        self.first_byte: dict[str, list] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool, first_byte: float | None = None):
+        if not ok:
+            self.errors[endpoint] += 1
+            return
+        self.latency[endpoint].append(seconds)
+        if first_byte is not None:
+            self.first_byte[endpoint].append(first_byte)
+
+    async def timed(self, endpoint: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.record(endpoint, time.perf_counter() - start, ok=False)
+            return None
+        self.record(endpoint, time.perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+
+async def chat_user(client: httpx.AsyncClient, recorder: Recorder, deadline: float, args: argparse.Namespace):
+    endpoint = "POST /api/v1/chat/completions"
+    while time.monotonic() < deadline:
+        payload = {"model": "fake/model", "messages": [{"role": "user", "content": f"What was talk {uuid.uuid4()} about?"}]}
+        start = time.perf_counter()
+        first_byte = None
+        try:
+            async with client.stream("POST", "/api/v1/chat/completions", json=payload) as response:
+                async for _ in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+                ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        recorder.record(endpoint, time.perf_counter() - start, ok, first_byte)
+        await asyncio.sleep(random.uniform(0, args.think_time))
+
+
+async def upload_user(client: httpx.AsyncClient, recorder: Recorder, deadline: float, uploads: set, args: argparse.Namespace):
+    content = (TEXT * math.ceil(args.upload_size / len(TEXT)))[:args.upload_size].encode()
+    total_chunks = math.ceil(len(content) / args.chunk_size)
+    while time.monotonic() < deadline:
+        init = {
+            "file_name": f"load_{uuid.uuid4().hex}.txt",
+            "file_size": len(content),
+            "chunk_size": args.chunk_size,
+            "total_chunks": total_chunks,
+            "content_type": "text/plain",
+        }
+        response = await recorder.timed("POST /api/upload/init", client.post("/api/upload/init", json=init))
+        if response is None or response.status_code >= 400:
+            await asyncio.sleep(1)
+            continue
+        redis_uuid = response.json()["payload"]["redis_uuid"]
+        uploads.add(redis_uuid)
+        try:
+            for i in range(total_chunks):
+                chunk = content[i * args.chunk_size:(i + 1) * args.chunk_size]
+                await recorder.timed(
+                    "PUT /api/upload/{redis_uuid}/chunk/{chunk_index}",
+                    client.put(f"/api/upload/{redis_uuid}/chunk/{i}", content=chunk),
+                )
+            await recorder.timed("POST /api/upload/complete", client.post("/api/upload/complete", json={"redis_uuid": redis_uuid}))
+        finally:
+            uploads.discard(redis_uuid)
+
+
+async def status_user(client: httpx.AsyncClient, recorder: Recorder, deadline: float, uploads: set, args: argparse.Namespace):
+    while time.monotonic() < deadline:
+        if uploads:
+            redis_uuid = random.choice(list(uploads))
+            await recorder.timed("POST /api/upload/status", client.post("/api/upload/status", json={"redis_uuid": redis_uuid}))
+        await asyncio.sleep(args.poll_interval)
+
+
+async def drive(base_url: str, args: argparse.Namespace) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    uploads: set = set()
+    limits = httpx.Limits(max_connections=args.chat_users + args.upload_users + args.status_users + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(chat_user(client, recorder, deadline, args) for _ in range(args.chat_users)),
+            *(upload_user(client, recorder, deadline, uploads, args) for _ in range(args.upload_users)),
+            *(status_user(client, recorder, deadline, uploads, args) for _ in range(args.status_users)),
+        )
+        return recorder, time.monotonic() - start
+
+
+def report(recorder: Recorder, probe: LoopProbe, elapsed: float, upstream: dict) -> dict:
+    endpoints = sorted(set(recorder.latency) | set(recorder.errors))
+    result = {"elapsed_seconds": elapsed, "upstream_requests": upstream["requests"], "endpoints": {}}
+
+    print(f"\n{elapsed:.1f}s, {upstream['requests']} upstream LLM requests")
+    print(f"{'endpoint':<48} {'ok':>6} {'err':>5} {'rps':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'lag p99':>8} {'lag max':>8}")
+    for endpoint in endpoints:
+        latency = recorder.latency.get(endpoint, [])
+        lag = probe.lag.get(endpoint, [])
+        row = {
+            "ok": len(latency),
+            "errors": recorder.errors.get(endpoint, 0),
+            "rps": len(latency) / elapsed,
+            **{f"p{q}_ms": percentile(latency, q) * 1000 for q in (50, 90, 99)},
+            "max_ms": max(latency, default=float("nan")) * 1000,
+            "loop_lag_p99_ms": percentile(lag, 99) * 1000,
+            "loop_lag_max_ms": max(lag, default=float("nan")) * 1000,
+        }
+        if endpoint in recorder.first_byte:
+            row.update({f"first_byte_p{q}_ms": percentile(recorder.first_byte[endpoint], q) * 1000 for q in (50, 90, 99)})
+        result["endpoints"][endpoint] = row
+        print(
+            f"{endpoint:<48} {row['ok']:>6} {row['errors']:>5} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} "
+            f"{row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {row['loop_lag_p99_ms']:>8.1f} {row['loop_lag_max_ms']:>8.1f}"
+        )
+        if endpoint in recorder.first_byte:
+            print(f"{'  first byte':<48} {'':>6} {'':>5} {'':>7} {row['first_byte_p50_ms']:>8.1f} {row['first_byte_p90_ms']:>8.1f} {row['first_byte_p99_ms']:>8.1f}")
+
+    lag = probe.lag.get("(all)", [])
+    result["loop_lag"] = {f"p{q}_ms": percentile(lag, q) * 1000 for q in (50, 90, 99)}
+    result["loop_lag"]["max_ms"] = max(lag, default=float("nan")) * 1000
+    print(f"\nevent-loop lag over the run: p50 {result['loop_lag']['p50_ms']:.1f} ms, p99 {result['loop_lag']['p99_ms']:.1f} ms, max {result['loop_lag']['max_ms']:.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--chat-users", type=int, default=10)
+    parser.add_argument("--upload-users", type=int, default=1)
+    parser.add_argument("--status-users", type=int, default=2)
+    parser.add_argument("--think-time", type=float, default=0.5, help="max random pause between a chat user's requests")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between a status user's polls")
+    parser.add_argument("--upload-size", type=int, default=64 * 1024, help="bytes per uploaded file")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="fake LLM tokens per second per stream")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="fake LLM seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=64, help="fake LLM tokens per response")
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="LLM_MAX_CONCURRENCY of the app")
+    parser.add_argument("--no-cache", action="store_true", help="disable the app's response cache")
+    parser.add_argument("--redis-url", help="use this Redis instead of fakeredis, e.g. redis://localhost:6379")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="seconds between event-loop lag samples")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    if not args.redis_url:
+        try:
+            import fakeredis  # noqa: F401
+        except ImportError:
+            parser.error("fakeredis is not installed, install it or pass --redis-url")
+
+    from tests.load.fake_llm import create_fake_llm
+
+    llm_port, app_port = free_port(), free_port()
+    fake_llm = create_fake_llm(args.token_rate, args.first_token_delay, args.tokens)
+    with tempfile.TemporaryDirectory() as chunk_dir:
+        probe = LoopProbe(configure_backend(args, llm_port, chunk_dir), args.lag_interval)
+        llm_server = ServerThread(fake_llm, llm_port)
+        app_server = ServerThread(probe, app_port, probe=probe)
+        llm_server.start_and_wait(timeout=30)
+        # the lifespan loads the embedding model before the app accepts requests
+        app_server.start_and_wait(timeout=600)
+        try:
+            recorder, elapsed = asyncio.run(drive(f"http://127.0.0.1:{app_port}", args))
+        finally:
+            app_server.stop()
+            llm_server.stop()
+
+    result = report(recorder, probe, elapsed, fake_llm.state.stats)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import os
 import math
 import time
 import base64
+import gzip
 import asyncio
 import aiohttp
 from concurrent.futures import ThreadPoolExecutor
@@ -235,6 +236,53 @@ async def test_unuploaded_chunks():
                 return
             print("Test passed: unuploaded chunk indexes are sent correctly")
 
+def test_compressed_chunked_upload():
+    # chunks are gzip compressed and sent as raw request bodies
+    file_size = len(CONTENT)
+    total_chunks = math.ceil(file_size / CHUNK_SIZE)
+
+    init_payload = {
+        "file_name": FILE_NAME,
+        "file_size": file_size,
+        "chunk_size": CHUNK_SIZE,
+        "total_chunks": total_chunks,
+        "content_type": "text/plain",
+        "accept_encoding": ["gzip"]
+    }
+    resp = requests.post(f"{BASE_URL}/upload/init", json=init_payload)
+    if resp.status_code != 200:
+        print(f"Init failed: {resp.text}")
+        return
+
+    payload = resp.json()["payload"]
+    redis_uuid = payload["redis_uuid"]
+    if payload["encoding"] != "gzip":
+        print(f"Error: server negotiated {payload['encoding']} instead of gzip")
+        return
+
+    sent = 0
+    with requests.Session() as session:
+        for i in range(total_chunks):
+            chunk_data = gzip.compress(CONTENT[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE].encode())
+            sent += len(chunk_data)
+            resp = session.put(f"{BASE_URL}/upload/{redis_uuid}/chunk/{i}", data=chunk_data)
+            if resp.status_code != 200:
+                print(f"Chunk {i} upload failed: {resp.status_code} - {resp.text}")
+                return
+    print(f"Sent {sent} compressed bytes for {file_size} bytes of text")
+
+    # a chunk that decompresses past the declared chunk size is refused
+    resp = requests.put(f"{BASE_URL}/upload/{redis_uuid}/chunk/0", data=gzip.compress(b"a" * (CHUNK_SIZE * 100)))
+    if resp.status_code != 413:
+        print(f"Error: oversized chunk answered {resp.status_code} instead of 413")
+        return
+
+    resp = requests.post(f"{BASE_URL}/upload/complete", json={"redis_uuid": redis_uuid})
+    if resp.status_code != 200:
+        print(f"Completion failed: {resp.status_code} - {resp.text}")
+    else:
+        print("Compressed upload completed successfully!")
+
 if __name__ == "__main__":
     # Run synchronous version
     # test_chunked_upload()
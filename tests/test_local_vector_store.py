@@ -0,0 +1,156 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("qdrant_client")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "new_backend"))
+
+from qdrant_client.http.models import Distance, Fusion, FusionQuery, PointIdsList, PointStruct, Prefetch, SparseVector, SparseVectorParams, VectorParams
+from app.clients.local_vector_store import LocalVectorStore, RRF_K
+
+COLLECTION = "talks"
+
+# unit vectors along the axes, point i is nearest to axis i
+DENSE = [
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.6, 0.8, 0.0, 0.0],
+]
+SPARSE = [
+    SparseVector(indices=[1, 2], values=[1.0, 0.5]),
+    SparseVector(indices=[2], values=[2.0]),
+    SparseVector(indices=[3], values=[1.0]),
+    SparseVector(indices=[1], values=[0.2]),
+]
+
+
+def make_store(path=None) -> LocalVectorStore:
+    store = LocalVectorStore(str(path) if path else None)
+    store.create_collection(
+        COLLECTION,
+        vectors_config={"dense": VectorParams(size=4, distance=Distance.COSINE)},
+        sparse_vectors_config={"sparse": SparseVectorParams()},
+    )
+    store.upsert(COLLECTION, [
+        PointStruct(id=i, vector={"dense": dense, "sparse": sparse}, payload={"text": f"chunk {i}"})
+        for i, (dense, sparse) in enumerate(zip(DENSE, SPARSE))
+    ])
+    return store
+
+
+def ids(response):
+    return [point.id for point in response.points]
+
+
+def test_dense_query_ranks_by_cosine():
+    store = make_store()
+
+    response = store.query_points(COLLECTION, query=[1.0, 0.1, 0.0, 0.0], using="dense", limit=2)
+
+    assert ids(response) == [0, 3]
+    assert response.points[0].score == pytest.approx(1.0 / np.linalg.norm([1.0, 0.1]))
+    assert response.points[0].payload == {"text": "chunk 0"}
+
+
+def test_sparse_query_scores_dot_product():
+    store = make_store()
+
+    response = store.query_points(COLLECTION, query=SparseVector(indices=[1, 2], values=[1.0, 1.0]), using="sparse", limit=10)
+
+    assert ids(response) == [1, 0, 3]
+    assert [point.score for point in response.points] == pytest.approx([2.0, 1.5, 0.2])
+
+
+def test_prefetch_restricts_dense_rescoring_to_candidates():
+    store = make_store()
+
+    response = store.query_points(
+        COLLECTION,
+        prefetch=Prefetch(query=SparseVector(indices=[3], values=[1.0]), using="sparse", limit=10),
+        query=[1.0, 0.0, 0.0, 0.0],
+        using="dense",
+        limit=10,
+    )
+
+    # only point 2 carries the term, the dense query alone would rank it last
+    assert ids(response) == [2]
+
+
+def test_rrf_fuses_prefetch_ranks():
+    store = make_store()
+
+    response = store.query_points(
+        COLLECTION,
+        prefetch=[
+            Prefetch(query=SparseVector(indices=[2], values=[1.0]), using="sparse", limit=10),
+            Prefetch(query=[0.0, 1.0, 0.0, 0.0], using="dense", limit=2),
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=10,
+    )
+
+    # sparse ranks 1, 0; dense ranks 1, 3
+    assert ids(response) == [1, 0, 3]
+    assert response.points[0].score == pytest.approx(2.0 / (RRF_K + 1))
+    assert response.points[1].score == pytest.approx(response.points[2].score)
+
+
+def test_fusion_without_prefetch_is_rejected():
+    store = make_store()
+
+    with pytest.raises(ValueError):
+        store.query_points(COLLECTION, query=FusionQuery(fusion=Fusion.RRF), limit=10)
+
+
+def test_persisted_log_is_replayed(tmp_path):
+    store = make_store(tmp_path)
+    # an update of an existing point is replayed in place, not appended
+    store.upsert(COLLECTION, [PointStruct(id=0, vector={"dense": [0.0, 0.0, 0.0, 1.0], "sparse": SparseVector(indices=[4], values=[1.0])}, payload={"text": "updated"})])
+    store.close()
+
+    reloaded = LocalVectorStore(str(tmp_path))
+
+    assert reloaded.count(COLLECTION).count == len(DENSE)
+    dense = reloaded.query_points(COLLECTION, query=[0.0, 0.0, 0.0, 1.0], using="dense", limit=1)
+    assert ids(dense) == [0]
+    assert dense.points[0].payload == {"text": "updated"}
+    assert ids(reloaded.query_points(COLLECTION, query=SparseVector(indices=[1], values=[1.0]), using="sparse", limit=10)) == [3]
+    assert ids(reloaded.query_points(COLLECTION, query=SparseVector(indices=[4], values=[1.0]), using="sparse", limit=10)) == [0]
+
+
+def test_delete_collection_removes_its_files(tmp_path):
+    store = make_store(tmp_path)
+
+    assert store.delete_collection(COLLECTION) is True
+    assert not store.collection_exists(COLLECTION)
+    assert not (tmp_path / COLLECTION).exists()
+    assert store.delete_collection(COLLECTION) is False
+    assert COLLECTION not in [c.name for c in LocalVectorStore(str(tmp_path)).get_collections().collections]
+
+
+def test_unsupported_arguments_are_rejected():
+    store = make_store()
+
+    with pytest.raises(ValueError):
+        store.query_points(COLLECTION, query=[1.0, 0.0, 0.0, 0.0], using="dense", limit=2, score_threshold=0.5)
+    with pytest.raises(ValueError):
+        store.upsert(COLLECTION, [], ordering="strong")
+
+
+def test_deleted_points_are_not_returned(tmp_path):
+    store = make_store(tmp_path)
+
+    store.delete(COLLECTION, points_selector=PointIdsList(points=[0]))
+
+    assert store.count(COLLECTION).count == len(DENSE) - 1
+    assert ids(store.query_points(COLLECTION, query=[1.0, 0.0, 0.0, 0.0], using="dense", limit=1)) == [3]
+    assert ids(store.query_points(COLLECTION, query=SparseVector(indices=[1], values=[1.0]), using="sparse", limit=10)) == [3]
+    store.close()
+
+    reloaded = LocalVectorStore(str(tmp_path))
+    assert reloaded.count(COLLECTION).count == len(DENSE) - 1
+    assert 0 not in [record.id for record in reloaded.scroll(COLLECTION, limit=10)[0]]